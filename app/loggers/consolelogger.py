@@ -4,8 +4,11 @@ from app.models.logging_model import LoggingModel
 class ConsoleLogger(LoggerBase):
 
     async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
         print("Logging Data:")
-        print(data.model_dump_json())
+        print(payload)
 
     def provider(self):
         return "ConsoleLogger"
\ No newline at end of file
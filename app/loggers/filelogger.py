@@ -10,8 +10,11 @@ class LineOrientedJsonFileLogger(LoggerBase):
             self._filespec = params.get("filespec", self._filespec)
 
     async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
         with open(self._filespec, "a") as log_file:
-            log_file.write(data.model_dump_json() + "\n")
+            log_file.write(payload + "\n")
 
     def provider(self):
         return "jsonfile"
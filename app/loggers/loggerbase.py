@@ -12,5 +12,20 @@ class LoggerBase(ABC):
     def provider(self):
         pass
 
+    async def log_json(self, data: LoggingModel, payload: str):
+        """Log a record that was already serialized with data.model_dump_json().
+        Loggers that write JSON override this so fan-out can share one serialization."""
+        await self.log(data)
+
+    async def log_many(self, records: List[LoggingModel]):
+        """Log a batch of records, e.g. replayed from a spool. Records may repeat ones already
+        logged; loggers keyed on request_id should store them once."""
+        for data in records:
+            await self.log(data)
+
+    async def close(self):
+        """Flush any buffered records and release resources. Unbuffered loggers have nothing to do."""
+        pass
+
 if __name__=='__main__':
     pass
\ No newline at end of file
@@ -5,6 +5,15 @@ class LoggerFactory:
 
     @staticmethod
     def create(logger_type: str, params: dict = None) -> LoggerBase:
+        """Create a logger; with spool_path in params it falls back to a disk spool when the sink fails."""
+        target = LoggerFactory._create(logger_type, params)
+        if params and params.get("spool_path"):
+            from .spoollogger import SpoolingLogger
+            return SpoolingLogger(target, params)
+        return target
+
+    @staticmethod
+    def _create(logger_type: str, params: dict = None) -> LoggerBase:
         if logger_type == "console":
             from .consolelogger import ConsoleLogger
             return ConsoleLogger(params)
@@ -25,6 +34,18 @@ class LoggerFactory:
             from .pathlogger import PathJsonFileLogger
             return PathJsonFileLogger(params)
 
+        if logger_type == "parquet":
+            from .parquetlogger import ParquetLogger
+            return ParquetLogger(params)
+
+        if logger_type == "sqlite":
+            from .sqlitelogger import SqliteLogger
+            return SqliteLogger(params)
+
+        if logger_type == "multi":
+            from .multilogger import MultiLogger
+            return MultiLogger(params)
+
         raise ValueError(f"Unknown logger type: {logger_type}")
     
 
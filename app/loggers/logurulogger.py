@@ -10,8 +10,11 @@ class LoguruLogger(LoggerBase):
         
 
     async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
         logger.info("Logging Data:")
-        logger.info(data.model_dump_json())
+        logger.info(payload)
 
     def provider(self):
         return "loguru"
@@ -1,8 +1,13 @@
-
+import json
+from typing import List
 from .loggerbase import LoggerBase
 from app.models.logging_model import LoggingModel
 
 from pymongo.asynchronous.mongo_client import AsyncMongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Server error code for a duplicate _id
+_DUPLICATE_KEY = 11000
 
 class MongoDbLogger(LoggerBase):
 
@@ -17,11 +22,39 @@ class MongoDbLogger(LoggerBase):
         self._db = AsyncMongoClient(self._connection_string)
 
     async def log(self, data: LoggingModel):
+        mongo_data = data.model_dump(mode="json")
+        await self._insert(data, mongo_data)
+
+    async def log_json(self, data: LoggingModel, payload: str):
+        await self._insert(data, json.loads(payload))
+
+    async def _insert(self, data: LoggingModel, mongo_data: dict):
         db = self._db[self._database]
         collection = db[self._collection]
-        mongo_data = data.model_dump(mode="json")
         mongo_data["_id"] = str(data.request_id)
-        await collection.insert_one(mongo_data)
+        try:
+            await collection.insert_one(mongo_data)
+        except DuplicateKeyError:
+            # Already stored, e.g. replayed from a spool after a partial batch
+            pass
+
+    async def log_many(self, records: List[LoggingModel]):
+        documents = []
+        for data in records:
+            mongo_data = data.model_dump(mode="json")
+            mongo_data["_id"] = str(data.request_id)
+            documents.append(mongo_data)
+        collection = self._db[self._database][self._collection]
+        try:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != _DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            if e.details.get("writeConcernErrors"):
+                raise
+
+    async def close(self):
+        await self._db.close()
 
     def provider(self):
         return "mongodb"
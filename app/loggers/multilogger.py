@@ -0,0 +1,116 @@
+import asyncio
+from typing import List
+from loguru import logger
+from .loggerbase import LoggerBase
+from app.models.logging_model import LoggingModel
+
+class _Sink:
+    """One fan-out target with its own queue, worker task and timeout."""
+
+    def __init__(self, target: LoggerBase, queue_size: int, timeout: float):
+        self.target = target
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.timeout = timeout
+        self.task: asyncio.Task | None = None
+        # Record being written, so a write cut off at close is counted
+        self.writing: LoggingModel | None = None
+        self.dropped = 0
+        self.failed = 0
+
+
+class MultiLogger(LoggerBase):
+    """
+    Fan-out logger writing every record to several sinks.
+
+    The record is serialized once and the same JSON is handed to each sink.
+    Each sink is drained by its own worker task with a per-write timeout, so
+    a slow or failing sink never delays the request or the other sinks. When
+    a sink's queue is full new records for that sink are dropped and counted.
+    close() drains all sinks at once for up to close_timeout seconds in total;
+    records a dead sink still holds after that are dropped and counted, so
+    shutdown is not held up by queue_size writes each waiting for its timeout.
+
+    params:
+        sinks: list of {logger_type, logger_params, queue_size, timeout}
+        close_timeout: seconds close() waits for the queues to drain, default 10
+    """
+
+    _STOP = object()
+
+    def __init__(self, params: dict = None):
+        from .loggerfactory import LoggerFactory
+
+        self._sinks: List[_Sink] = []
+        for sink in (params or {}).get("sinks", []):
+            self._sinks.append(_Sink(
+                LoggerFactory.create(sink["logger_type"], sink.get("logger_params", {})),
+                queue_size=int(sink.get("queue_size", 1000)),
+                timeout=float(sink.get("timeout", 5.0)),
+            ))
+        if not self._sinks:
+            raise ValueError("multi logger requires at least one entry in sinks")
+        self._close_timeout = float((params or {}).get("close_timeout", 10.0))
+
+    async def log(self, data: LoggingModel):
+        payload = data.model_dump_json()
+        for sink in self._sinks:
+            if sink.task is None:
+                sink.task = asyncio.create_task(self._drain(sink))
+            try:
+                sink.queue.put_nowait((data, payload))
+            except asyncio.QueueFull:
+                sink.dropped += 1
+                logger.warning(f"MultiLogger queue full for {sink.target.provider()}, dropped {sink.dropped} records")
+
+    async def close(self):
+        draining = [sink for sink in self._sinks if sink.task is not None]
+        if draining:
+            finishing = [asyncio.create_task(self._finish(sink)) for sink in draining]
+            _, unfinished = await asyncio.wait(finishing, timeout=self._close_timeout)
+            for task in unfinished:
+                task.cancel()
+            for sink in draining:
+                await self._abandon(sink)
+        for sink in self._sinks:
+            await sink.target.close()
+
+    def provider(self):
+        return "multi"
+
+    def sinks(self) -> List[LoggerBase]:
+        return [sink.target for sink in self._sinks]
+
+    async def _finish(self, sink: _Sink):
+        await sink.queue.put(self._STOP)
+        await sink.task
+
+    async def _abandon(self, sink: _Sink):
+        """Stop a sink's worker if it outlived the close deadline and count what it never wrote."""
+        if not sink.task.done():
+            sink.task.cancel()
+            try:
+                await sink.task
+            except asyncio.CancelledError:
+                pass
+        left = 1 if sink.writing is not None else 0
+        while not sink.queue.empty():
+            if sink.queue.get_nowait() is not self._STOP:
+                left += 1
+        if left:
+            sink.dropped += left
+            logger.warning(f"MultiLogger closed {sink.target.provider()} after {self._close_timeout}s, "
+                           f"dropped {left} unwritten records")
+
+    async def _drain(self, sink: _Sink):
+        while True:
+            item = await sink.queue.get()
+            if item is self._STOP:
+                return
+            data, payload = item
+            sink.writing = data
+            try:
+                await asyncio.wait_for(sink.target.log_json(data, payload), timeout=sink.timeout)
+            except Exception as e:
+                sink.failed += 1
+                logger.warning(f"MultiLogger sink {sink.target.provider()} failed for {data.request_id}: {e!r}")
+            sink.writing = None
@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+from loguru import logger
+from .loggerbase import LoggerBase
+from app.models.logging_model import LoggingModel
+from app.models.log_query_model import parse_timestamp
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# endpoint and date are hive partition directories, so they are not stored in the files
+SCHEMA = pa.schema([
+    ("request_id", pa.string()),
+    ("provider", pa.string()),
+    ("model", pa.string()),
+    ("session_id", pa.string()),
+    ("user_id", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("role", pa.string()),
+    ("message", pa.string()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("total_tokens", pa.int64()),
+    ("cached_tokens", pa.int64()),
+    ("trimmed_tokens", pa.int64()),
+    ("cache", pa.string()),
+    ("content_filter", pa.string()),
+])
+
+
+def to_row(data: LoggingModel) -> Dict:
+    """Flatten a LoggingModel into a row matching SCHEMA."""
+    try:
+        timestamp = datetime.datetime.fromtimestamp(parse_timestamp(data.timestamp), tz=datetime.timezone.utc)
+    except ValueError:
+        timestamp = None
+    usage = data.usage
+    return {
+        "request_id": str(data.request_id),
+        "provider": data.provider,
+        "model": data.model,
+        "session_id": str(data.session_id),
+        "user_id": data.user_id,
+        "timestamp": timestamp,
+        "role": data.role.value,
+        "message": data.message,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+        "total_tokens": usage.total_tokens if usage else None,
+        "cached_tokens": usage.cached_tokens if usage else None,
+        "trimmed_tokens": data.trimmed_tokens,
+        "cache": data.cache,
+        "content_filter": data.content_filter,
+    }
+
+
+def partition_of(row: Dict, endpoint: str) -> Tuple[str, str]:
+    timestamp = row["timestamp"] or datetime.datetime.now(datetime.timezone.utc)
+    return endpoint, timestamp.date().isoformat()
+
+
+class PartitionedParquetWriter:
+    """
+    Writes rows into <root>/endpoint=<endpoint>/date=<YYYY-MM-DD>/part-*.parquet.
+
+    Rows are buffered per partition and written as one row group once
+    row_group_size rows are pending. Across all partitions at most
+    max_buffered_rows are held: past that the largest buffer is written early,
+    so many partitions with few rows each cannot keep the input in memory. A
+    file is closed after rows_per_file rows, and at most max_open_files writers
+    are kept open (least recently used is closed first, after writing its
+    buffer). This class is synchronous; callers on the event loop should run it
+    in a thread.
+    """
+
+    def __init__(self, root: str, row_group_size: int = 1000, rows_per_file: int = 100_000,
+                 max_open_files: int = 64, compression: str = "zstd", max_buffered_rows: int | None = None):
+        self._root = Path(root)
+        self._row_group_size = row_group_size
+        self._rows_per_file = rows_per_file
+        self._max_open_files = max_open_files
+        self._compression = compression
+        self._max_buffered_rows = max_buffered_rows or 10 * row_group_size
+        self._buffers: Dict[Tuple[str, str], List[Dict]] = {}
+        self._buffered = 0
+        # partition -> (writer, rows written, monotonic time opened)
+        self._writers: "OrderedDict[Tuple[str, str], Tuple[pq.ParquetWriter, int, float]]" = OrderedDict()
+
+    def add(self, partition: Tuple[str, str], row: Dict) -> Tuple[str, str] | None:
+        """
+        Buffer a row.
+
+        Returns:
+            The partition to write with write_row_group() now: this one once it
+            holds a full row group, the largest one once max_buffered_rows are
+            buffered in total, otherwise None
+        """
+        buffer = self._buffers.setdefault(partition, [])
+        buffer.append(row)
+        self._buffered += 1
+        if len(buffer) >= self._row_group_size:
+            return partition
+        if self._buffered >= self._max_buffered_rows:
+            return max(self._buffers, key=lambda key: len(self._buffers[key]))
+        return None
+
+    def flush(self):
+        """Write every pending row group and close all files so they are readable."""
+        self.write_pending()
+        for partition in list(self._writers):
+            self._close_writer(partition)
+
+    def write_pending(self):
+        """Write every partition's buffer as a row group, keeping the files open."""
+        for partition in list(self._buffers):
+            self.write_row_group(partition)
+
+    def close_older_than(self, age: float):
+        """Close the files opened more than age seconds ago so they become readable."""
+        now = time.monotonic()
+        for partition, (_, _, opened) in list(self._writers.items()):
+            if now - opened >= age:
+                self._close_writer(partition)
+
+    def pending(self) -> int:
+        return self._buffered
+
+    def write_row_group(self, partition: Tuple[str, str]):
+        rows = self._buffers.pop(partition, None)
+        if not rows:
+            return
+        self._buffered -= len(rows)
+        writer, written, opened = self._open_writer(partition)
+        writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA), row_group_size=self._row_group_size)
+        written += len(rows)
+        self._writers[partition] = (writer, written, opened)
+        if written >= self._rows_per_file:
+            self._close_writer(partition)
+
+    def _open_writer(self, partition: Tuple[str, str]):
+        if partition in self._writers:
+            self._writers.move_to_end(partition)
+            return self._writers[partition]
+        while len(self._writers) >= self._max_open_files:
+            self._close_writer(next(iter(self._writers)))
+        endpoint, date = partition
+        folder = self._root / f"endpoint={quote(endpoint, safe='')}" / f"date={date}"
+        folder.mkdir(parents=True, exist_ok=True)
+        # Time-prefixed names keep files within a day in write order
+        filename = f"part-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}.parquet"
+        writer = pq.ParquetWriter(folder / filename, SCHEMA, compression=self._compression)
+        self._writers[partition] = (writer, 0, time.monotonic())
+        return self._writers[partition]
+
+    def _close_writer(self, partition: Tuple[str, str]):
+        writer, _, _ = self._writers.pop(partition)
+        # An evicted partition's buffer goes into the file it is closing, not back into memory
+        rows = self._buffers.pop(partition, None)
+        if rows:
+            self._buffered -= len(rows)
+            writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA), row_group_size=self._row_group_size)
+        writer.close()
+
+
+class ParquetLogger(LoggerBase):
+    """
+    Columnar logger writing partitioned Parquet files for offline analysis.
+
+    Records are buffered and written in row groups of batch_size. Every
+    flush_interval seconds a background task writes whatever is pending as a
+    row group, also while no records arrive, but keeps the files open: a
+    Parquet file is only readable once closed, and closing on that timer would
+    leave one small file per partition per minute. Files are closed when they
+    reach rows_per_file, once they have been open for file_interval seconds,
+    and on close(), so the newest records reach readers up to file_interval
+    late. A shorter file_interval gives fresher data and more, smaller files.
+    """
+
+    def __init__(self, params: dict = None):
+        self._path = "parquet_logs"
+        self._batch_size = 1000
+        self._rows_per_file = 100_000
+        self._flush_interval = 60.0
+        self._file_interval = 3600.0
+        self._compression = "zstd"
+        if params:
+            self._path = params.get("path", self._path)
+            self._batch_size = int(params.get("batch_size", self._batch_size))
+            self._rows_per_file = int(params.get("rows_per_file", self._rows_per_file))
+            self._flush_interval = float(params.get("flush_interval", self._flush_interval))
+            self._file_interval = float(params.get("file_interval", self._file_interval))
+            self._compression = params.get("compression", self._compression)
+        self._writer = PartitionedParquetWriter(
+            self._path,
+            row_group_size=self._batch_size,
+            rows_per_file=self._rows_per_file,
+            compression=self._compression
+        )
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        try:
+            self._start_flushing()
+        except RuntimeError:
+            # No running loop yet; the first record starts it
+            pass
+
+    async def log(self, data: LoggingModel):
+        row = to_row(data)
+        partition = partition_of(row, data.endpoint)
+        self._start_flushing()
+        async with self._lock:
+            ready = self._writer.add(partition, row)
+            if ready is not None:
+                await asyncio.to_thread(self._writer.write_row_group, ready)
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        async with self._lock:
+            await asyncio.to_thread(self._writer.flush)
+
+    def provider(self):
+        return "parquet"
+
+    def path(self):
+        return self._path
+
+    def _start_flushing(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            async with self._lock:
+                try:
+                    if self._writer.pending():
+                        await asyncio.to_thread(self._writer.write_pending)
+                    await asyncio.to_thread(self._writer.close_older_than, self._file_interval)
+                except Exception as e:
+                    logger.error(f"Parquet flush to {self._path} failed: {e!r}")
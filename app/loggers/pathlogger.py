@@ -14,10 +14,13 @@ class PathJsonFileLogger(LoggerBase):
 
 
     async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
         filename = f"{data.request_id}.json"
         full_path = Path(self._path) / filename
         with open(full_path, "w") as log_file:
-            log_file.write(data.model_dump_json())
+            log_file.write(payload)
 
     def provider(self):
         return "path"
@@ -0,0 +1,304 @@
+import asyncio
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import List, Tuple
+
+from loguru import logger
+from pydantic import ValidationError
+from .loggerbase import LoggerBase
+from app.models.logging_model import LoggingModel
+from app.services.metrics import registry
+
+spool_records = registry.counter(
+    "log_spool_records_total",
+    "Log records by spool outcome: spooled (sink unavailable), replayed (delivered from the spool) "
+    "or dropped (spool full or record unreadable)",
+    ("spool", "outcome"),
+)
+spool_bytes = registry.gauge("log_spool_bytes", "Bytes of log records waiting in the spool", ("spool",))
+
+# Record frame: payload length and crc32 of the payload, little endian
+_HEADER = struct.Struct("<II")
+_SUFFIX = ".seg"
+
+# (segment number, byte offset) of a record in the spool
+Position = Tuple[int, int]
+
+
+class SegmentSpool:
+    """
+    Append-only record log split into numbered segment files.
+
+    Each record is framed as length, crc32 and payload, written with one
+    unbuffered write. A checkpoint file holds the position of the first
+    record not yet delivered and is replaced atomically after each delivered
+    batch; segments before it are deleted. Every process appends to a new
+    segment, so a record torn by a crash is always the last of its segment
+    and the reader moves on to the next. The previous run's last segment is
+    cut back to its last whole record on open, as nothing will complete it.
+    Appends are refused beyond max_bytes, so disk use is bounded.
+    """
+
+    def __init__(self, path: str, segment_bytes: int = 8 << 20, max_bytes: int = 1 << 30):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._segment_bytes = segment_bytes
+        self._max_bytes = max_bytes
+        self._checkpoint = self.path / "checkpoint"
+        segments = self._segments()
+        self._last = segments[-1] if segments else 0
+        self._fd: int | None = None
+        self.position = self._load_checkpoint()
+        self._end: Position = (self._last, self._seal(self._last) if segments else 0)
+        self.size = self._measure(self.position)
+
+    def empty(self) -> bool:
+        return self.position >= self._end
+
+    def append(self, payload: bytes) -> bool:
+        """Append a record; False when the spool is full."""
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if self.size + len(record) > self._max_bytes:
+            return False
+        if self._fd is None or self._end[1] >= self._segment_bytes:
+            self._rotate()
+        os.write(self._fd, record)
+        self._end = (self._end[0], self._end[1] + len(record))
+        self.size += len(record)
+        return True
+
+    def read_batch(self, limit: int) -> Tuple[List[bytes], Position]:
+        """
+        Read up to limit records from the checkpoint on. Returns them and the
+        position after them, to commit once they are delivered. Called from a
+        worker thread; appends may continue meanwhile.
+        """
+        records: List[bytes] = []
+        segment, offset = self.position
+        end = self._end
+        for number in self._segments():
+            if number < segment:
+                continue
+            if number > segment:
+                segment, offset = number, 0
+            with open(self.path / self._name(number), "rb") as f:
+                f.seek(offset)
+                while len(records) < limit and (segment, offset) < end:
+                    header = f.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    length, crc = _HEADER.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        if number == end[0]:
+                            # Still being written by this process; read it on the next pass
+                            break
+                        logger.warning(f"Log spool {self.path}: corrupt record in segment {number} at {offset}, "
+                                       f"skipping the rest of the segment")
+                        spool_records.inc(spool=str(self.path), outcome="dropped")
+                        break
+                    records.append(payload)
+                    offset += _HEADER.size + length
+            if len(records) >= limit or number >= end[0]:
+                break
+        return records, (segment, offset)
+
+    def commit(self, position: Position):
+        """Record that everything before position was delivered and delete finished segments."""
+        temp = self._checkpoint.with_suffix(".tmp")
+        temp.write_text(f"{position[0]} {position[1]}\n")
+        os.replace(temp, self._checkpoint)
+        for number in self._segments():
+            if number >= position[0]:
+                break
+            (self.path / self._name(number)).unlink(missing_ok=True)
+        self.position = max(self.position, position)
+        self.size = self._measure(self.position)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _rotate(self):
+        self.close()
+        self._last += 1
+        self._fd = os.open(self.path / self._name(self._last), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._end = (self._last, 0)
+
+    def _seal(self, number: int) -> int:
+        """Truncate a torn record at the end of a segment left by an earlier process; returns its size."""
+        path = self.path / self._name(number)
+        offset = self.position[1] if self.position[0] == number else 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                offset += _HEADER.size + length
+        size = path.stat().st_size
+        if offset < size:
+            logger.warning(f"Log spool {self.path}: dropping {size - offset} bytes of a torn record in segment {number}")
+            spool_records.inc(spool=str(self.path), outcome="dropped")
+            os.truncate(path, offset)
+        return offset
+
+    def _segments(self) -> List[int]:
+        return sorted(int(p.stem) for p in self.path.glob(f"*{_SUFFIX}") if p.stem.isdigit())
+
+    def _measure(self, position: Position) -> int:
+        size = 0
+        for number in self._segments():
+            if number >= position[0]:
+                try:
+                    size += (self.path / self._name(number)).stat().st_size
+                except FileNotFoundError:
+                    pass
+        return max(0, size - position[1])
+
+    def _load_checkpoint(self) -> Position:
+        try:
+            segment, offset = self._checkpoint.read_text().split()
+            return int(segment), int(offset)
+        except (OSError, ValueError):
+            segments = self._segments()
+            return (segments[0] if segments else 0), 0
+
+    @staticmethod
+    def _name(number: int) -> str:
+        return f"{number:012d}{_SUFFIX}"
+
+
+class SpoolingLogger(LoggerBase):
+    """
+    Wraps a sink logger with a durable on-disk spool for when the sink is down.
+
+    Records go straight to the sink while it works. The first write that
+    fails or exceeds spool_timeout is appended to the spool instead, and so is
+    every record after it, without touching the sink, so requests do not wait
+    on an unavailable sink. A background task replays the spool in batches of
+    spool_batch_size through log_many(), backing off while the sink keeps
+    failing, and switches back to direct writes once it has caught up.
+    Records left in the spool by a previous process are replayed on start.
+
+    Delivery is keyed on request_id: a batch interrupted by a crash is sent
+    again, and sinks that store by request_id (mongodb, path, sqlite) ignore
+    the repeat, so each record is stored exactly once.
+
+    params (besides the sink's own):
+        spool_path: spool folder, enables spooling
+        spool_timeout: seconds a direct write may take, default 2
+        spool_batch_size: records per replay batch, default 500
+        spool_segment_bytes: segment file size, default 8 MiB
+        spool_max_bytes: disk budget; records beyond it are dropped, default 1 GiB
+    """
+
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, target: LoggerBase, params: dict):
+        self._target = target
+        self._spool = SegmentSpool(
+            params["spool_path"],
+            segment_bytes=int(params.get("spool_segment_bytes", 8 << 20)),
+            max_bytes=int(params.get("spool_max_bytes", 1 << 30)),
+        )
+        self._name = str(self._spool.path)
+        self._timeout = float(params.get("spool_timeout", 2.0))
+        self._batch_size = int(params.get("spool_batch_size", 500))
+        self._retry = float(params.get("spool_retry_seconds", 1.0))
+        self._replay_task: asyncio.Task | None = None
+        spool_bytes.set_function(lambda: self._spool.size, spool=self._name)
+
+        self._spooling = not self._spool.empty()
+        if self._spooling:
+            try:
+                self._start_replay()
+            except RuntimeError:
+                # No running loop yet; the next record starts it
+                pass
+
+    async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
+        if not self._spooling:
+            try:
+                await asyncio.wait_for(self._target.log_json(data, payload), timeout=self._timeout)
+                return
+            except Exception as e:
+                logger.warning(f"Log sink {self._target.provider()} failed, spooling to {self._name}: {e!r}")
+                self._spooling = True
+
+        if self._spool.append(payload.encode("utf-8")):
+            spool_records.inc(spool=self._name, outcome="spooled")
+        else:
+            spool_records.inc(spool=self._name, outcome="dropped")
+            logger.warning(f"Log spool {self._name} is full, dropped {data.request_id}")
+        self._start_replay()
+
+    async def close(self):
+        """Stop replaying; anything not yet delivered stays on disk for the next start."""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+        self._spool.close()
+        await self._target.close()
+
+    def provider(self):
+        return self._target.provider()
+
+    @property
+    def target(self) -> LoggerBase:
+        return self._target
+
+    @property
+    def spooling(self) -> bool:
+        return self._spooling
+
+    def _start_replay(self):
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.get_running_loop().create_task(self._replay())
+
+    async def _replay(self):
+        delay = self._retry
+        while True:
+            payloads, position = await asyncio.to_thread(self._spool.read_batch, self._batch_size)
+            records = []
+            for payload in payloads:
+                try:
+                    records.append(LoggingModel.model_validate_json(payload))
+                except ValidationError as e:
+                    spool_records.inc(spool=self._name, outcome="dropped")
+                    logger.warning(f"Log spool {self._name}: unreadable record dropped: {e}")
+
+            if records:
+                try:
+                    await asyncio.wait_for(self._target.log_many(records), timeout=self._timeout * 10)
+                except Exception as e:
+                    logger.warning(f"Log sink {self._target.provider()} still failing, retrying in {delay:g}s: {e!r}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.MAX_BACKOFF)
+                    continue
+                delay = self._retry
+                spool_records.inc(len(records), spool=self._name, outcome="replayed")
+
+            if position != self._spool.position:
+                await asyncio.to_thread(self._spool.commit, position)
+            # No await between this check and the switch, so no record can slip in between
+            if self._spool.empty():
+                self._spooling = False
+                logger.info(f"Log spool {self._name} replayed, writing to {self._target.provider()} again")
+                return
+            if not payloads:
+                # Caught up with records still being appended
+                await asyncio.sleep(self._retry)
@@ -0,0 +1,164 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from loguru import logger
+from .loggerbase import LoggerBase
+from app.models.logging_model import LoggingModel
+from app.models.log_query_model import parse_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    request_id TEXT PRIMARY KEY,
+    provider TEXT,
+    model TEXT,
+    endpoint TEXT,
+    session_id TEXT,
+    user_id TEXT,
+    timestamp TEXT,
+    ts REAL,
+    role TEXT,
+    message TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    record TEXT
+);
+CREATE INDEX IF NOT EXISTS logs_ts ON logs (ts);
+CREATE INDEX IF NOT EXISTS logs_endpoint_ts ON logs (endpoint, ts);
+CREATE INDEX IF NOT EXISTS logs_user_id_ts ON logs (user_id, ts);
+CREATE INDEX IF NOT EXISTS logs_session_id_ts ON logs (session_id, ts);
+"""
+
+INSERT = "INSERT OR IGNORE INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def connect(filespec: str) -> sqlite3.Connection:
+    """Open a connection in WAL mode so readers never block the writer."""
+    connection = sqlite3.connect(filespec, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=5000")
+    return connection
+
+
+def to_row(data: LoggingModel, record: str) -> tuple:
+    try:
+        ts = parse_timestamp(data.timestamp)
+    except ValueError:
+        ts = time.time()
+    usage = data.usage
+    return (
+        str(data.request_id),
+        data.provider,
+        data.model,
+        data.endpoint,
+        str(data.session_id),
+        data.user_id,
+        data.timestamp,
+        ts,
+        data.role.value,
+        data.message,
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None,
+        usage.total_tokens if usage else None,
+        record,
+    )
+
+
+class SqliteLogger(LoggerBase):
+    """
+    Single-host queryable logger backed by SQLite.
+
+    log() only enqueues the row; a dedicated writer thread drains the queue and
+    inserts up to batch_size rows per transaction. When retention_days is set,
+    rows older than that are pruned every prune_interval seconds.
+    """
+
+    _STOP = object()
+
+    def __init__(self, params: dict = None):
+        self._filespec = "applog.db"
+        self._batch_size = 500
+        self._flush_interval = 1.0
+        self._queue_size = 100_000
+        self._retention_days = 0.0
+        self._prune_interval = 3600.0
+        if params:
+            self._filespec = params.get("filespec", self._filespec)
+            self._batch_size = int(params.get("batch_size", self._batch_size))
+            self._flush_interval = float(params.get("flush_interval", self._flush_interval))
+            self._queue_size = int(params.get("queue_size", self._queue_size))
+            self._retention_days = float(params.get("retention_days", self._retention_days))
+            self._prune_interval = float(params.get("prune_interval", self._prune_interval))
+
+        connection = connect(self._filespec)
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._queue: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        self._thread = threading.Thread(target=self._writer, name=f"sqlitelogger-{self._filespec}", daemon=True)
+        self._thread.start()
+
+    async def log(self, data: LoggingModel):
+        await self.log_json(data, data.model_dump_json())
+
+    async def log_json(self, data: LoggingModel, payload: str):
+        row = to_row(data, payload)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Writer is behind, apply backpressure without blocking the event loop
+            await asyncio.to_thread(self._queue.put, row)
+
+    async def close(self):
+        if self._thread.is_alive():
+            await asyncio.to_thread(self._queue.put, self._STOP)
+            await asyncio.to_thread(self._thread.join)
+
+    def provider(self):
+        return "sqlite"
+
+    def filespec(self):
+        return self._filespec
+
+    def prune(self, connection: sqlite3.Connection) -> int:
+        """Delete rows older than the retention window, returns the number removed."""
+        if self._retention_days <= 0:
+            return 0
+        cutoff = time.time() - self._retention_days * 86400
+        with connection:
+            return connection.execute("DELETE FROM logs WHERE ts < ?", (cutoff,)).rowcount
+
+    def _writer(self):
+        connection = connect(self._filespec)
+        last_prune = time.monotonic() - self._prune_interval
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+                while item is not self._STOP:
+                    batch.append(item)
+                    if len(batch) >= self._batch_size:
+                        break
+                    item = self._queue.get_nowait()
+                stopping = item is self._STOP
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(INSERT, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"SqliteLogger dropped {len(batch)} records: {e}")
+
+            if time.monotonic() - last_prune >= self._prune_interval:
+                try:
+                    self.prune(connection)
+                except sqlite3.Error as e:
+                    logger.error(f"SqliteLogger prune failed: {e}")
+                last_prune = time.monotonic()
+        connection.close()
@@ -1,7 +1,166 @@
+import glob
+import hashlib
+import os
 from enum import Enum
-from typing import List, Dict 
-from pydantic import BaseModel, Field
-from pydantic_yaml import to_yaml_str, parse_yaml_raw_as
+from pathlib import Path
+from typing import Any, List, Dict, Literal
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from app.models import chat_request_model
+from app.models.chat_request_model import ReasoningEffort
+
+class SimilarityCacheModel(BaseModel):
+    threshold: float = Field(0.85, gt=0.0, le=1.0, description="Minimum estimated Jaccard similarity to serve a cached answer")
+    max_entries: int = Field(10000, ge=1, description="Entries kept before least recently used eviction")
+    ttl_seconds: float | None = Field(None, gt=0, description="Entry lifetime, unlimited when omitted")
+    max_temperature: float = Field(0.3, ge=0.0, le=2.0, description="Cache is only used when the configuration temperature is at or below this")
+    num_perm: int = Field(64, ge=8, description="MinHash signature length")
+    bands: int = Field(16, ge=1, description="LSH bands, must divide num_perm")
+    shingle_size: int = Field(4, ge=1, description="Character shingle length")
+
+    @model_validator(mode="after")
+    def check_bands(self):
+        if self.num_perm % self.bands:
+            raise ValueError("similarity_cache.num_perm must be a multiple of similarity_cache.bands")
+        return self
+
+class SseCoalesceModel(BaseModel):
+    max_bytes: int = Field(16384, ge=1, description="Write a batch of events once it reaches this many bytes")
+    max_delay_ms: float = Field(20, ge=0, description="Longest time an event waits for others before it is written")
+
+class EmbeddingsModel(BaseModel):
+    model: str = Field(..., description="Embedding model identifier")
+    max_batch_size: int = Field(64, ge=1, description="Send a batch upstream once it holds this many inputs")
+    max_wait_ms: float = Field(5, ge=0, description="Longest time an input waits for others to join its batch")
+    cache_entries: int = Field(4096, ge=0, description="Embeddings of exact inputs kept for reuse, 0 disables the cache")
+
+class ContentFilterModel(BaseModel):
+    patterns: List[str] = Field(default_factory=list, description="Blocked words and phrases, matched case-insensitively")
+    patterns_file: str | None = Field(None, description="File with more patterns, one per line")
+    whole_words: bool = Field(True, description="Only match patterns that are not part of a longer word")
+    replacement: str = Field("[redacted]", description="Text that replaces a match when redacting")
+    input_action: Literal["block", "redact", "allow"] = Field("block", description="What to do when a request message matches")
+    output_action: Literal["redact", "terminate"] = Field("redact", description="What to do when the response matches")
+
+    @model_validator(mode="after")
+    def check_patterns(self):
+        if not self.patterns and not self.patterns_file:
+            raise ValueError("content_filter needs patterns or a patterns_file")
+        if self.patterns_file and not Path(self.patterns_file).is_file():
+            raise ValueError(f"content_filter.patterns_file {self.patterns_file} does not exist")
+        return self
+
+class PromptCachingModel(BaseModel):
+    system_prompt: bool = Field(True, description="Mark the system prompt as a cacheable prefix")
+    history: bool = Field(False, description="Also mark the end of the conversation, so the next turn reuses all of it")
+    min_tokens: int = Field(1024, ge=0, description="Only mark prefixes of at least this many estimated tokens; providers do not cache shorter ones")
+    ttl: Literal["5m", "1h"] | None = Field(None, description="Cache lifetime requested from providers that support one, their default when omitted")
+
+ParameterMode = Literal["honor", "clamp", "override"]
+
+class RangeRuleModel(BaseModel):
+    mode: ParameterMode = Field("override", description="Use the client's value (honor), limit it to min..max (clamp) or always send value (override)")
+    value: float | None = Field(None, description="Sent when the client omits the parameter, and always with override")
+    min: float | None = Field(None, description="Lowest value sent with clamp")
+    max: float | None = Field(None, description="Highest value sent with clamp")
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.mode == "clamp" and self.min is None and self.max is None:
+            raise ValueError("clamp needs min or max")
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise ValueError("min must not be above max")
+        return self
+
+    def apply(self, requested, fallback=None):
+        """Value to send upstream, None to leave the parameter out."""
+        value = self.value if self.value is not None else fallback
+        if self.mode != "override" and requested is not None:
+            value = requested
+        if self.mode == "clamp":
+            if value is None:
+                # A cap applies even when the client sets nothing
+                return self.max
+            if self.min is not None:
+                value = max(value, self.min)
+            if self.max is not None:
+                value = min(value, self.max)
+        return value
+
+class TokenLimitRuleModel(RangeRuleModel):
+    value: int | None = Field(None, ge=1, description="Sent when the client omits max_tokens, and always with override")
+    min: int | None = Field(None, ge=1, description="Lowest max_tokens sent with clamp")
+    max: int | None = Field(None, ge=1, description="Highest max_tokens sent with clamp; also sent when the client sets none")
+
+class StopRuleModel(BaseModel):
+    mode: Literal["honor", "override"] = Field("override", description="Use the client's stop sequences (honor) or always send value (override)")
+    value: List[str] | None = Field(None, description="Sent when the client omits stop, and always with override")
+
+    def apply(self, requested, fallback=None):
+        if self.mode == "honor" and requested is not None:
+            return requested
+        return self.value
+
+_EFFORTS = list(ReasoningEffort)
+
+class EffortRuleModel(BaseModel):
+    mode: ParameterMode = Field("override", description="Use the client's level (honor), limit it to min..max (clamp) or always send value (override)")
+    value: ReasoningEffort | None = Field(None, description="Sent when the client omits reasoning_effort, and always with override")
+    min: ReasoningEffort | None = Field(None, description="Lowest level sent with clamp")
+    max: ReasoningEffort | None = Field(None, description="Highest level sent with clamp")
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.mode == "clamp" and self.min is None and self.max is None:
+            raise ValueError("clamp needs min or max")
+        if self.min is not None and self.max is not None and _EFFORTS.index(self.min) > _EFFORTS.index(self.max):
+            raise ValueError("min must not be above max")
+        return self
+
+    def apply(self, requested, fallback=None):
+        value = self.value
+        if self.mode != "override" and requested is not None:
+            value = ReasoningEffort(requested)
+        if self.mode == "clamp":
+            if value is None:
+                return self.max.value if self.max is not None else None
+            level = _EFFORTS.index(value)
+            if self.min is not None:
+                level = max(level, _EFFORTS.index(self.min))
+            if self.max is not None:
+                level = min(level, _EFFORTS.index(self.max))
+            value = _EFFORTS[level]
+        return value.value if value is not None else None
+
+class ParameterPolicyModel(BaseModel):
+    max_tokens: TokenLimitRuleModel = Field(default_factory=TokenLimitRuleModel, description="Response length; clamp to cap it")
+    temperature: RangeRuleModel = Field(default_factory=RangeRuleModel, description="Sampling temperature, the configuration's temperature unless set")
+    top_p: RangeRuleModel = Field(default_factory=RangeRuleModel, description="Top-p sampling, the configuration's top_p unless set")
+    stop: StopRuleModel = Field(default_factory=StopRuleModel, description="Stop sequences")
+    reasoning_effort: EffortRuleModel = Field(default_factory=EffortRuleModel, description="Reasoning effort for reasoning models")
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        for name, low, high in (("temperature", 0.0, 2.0), ("top_p", 0.0, 1.0)):
+            rule = getattr(self, name)
+            for key in ("value", "min", "max"):
+                value = getattr(rule, key)
+                if value is not None and not low <= value <= high:
+                    raise ValueError(f"{name}.{key} must be between {low:g} and {high:g}")
+        return self
+
+    def apply(self, requested: Dict[str, Any], config: "AIConfigurationModel") -> Dict[str, Any]:
+        """
+        Payload parameters for a request: the client's requested values
+        (ChatRequest.policy_parameters()) honored, clamped or overridden.
+        Parameters that resolve to None are left out.
+        """
+        fallbacks = {"temperature": config.temperature, "top_p": config.top_p}
+        parameters = {}
+        for name in type(self).model_fields:
+            value = getattr(self, name).apply(requested.get(name), fallbacks.get(name))
+            if value is not None:
+                parameters[name] = value
+        return parameters
 
 class AIConfigurationModel(BaseModel):
     api_key: str = Field(..., description="API key for the AI service")
@@ -12,7 +171,15 @@ class AIConfigurationModel(BaseModel):
     top_p : float = Field(1.0, ge=0.0, le=1.0, description="Top-p sampling parameter")
     system_prompt: str = Field(..., description="Default system prompt")
     logger_type: str = Field(default="console", description="Logger type to be used")
-    logger_params: Dict[str, str] = Field(default_factory=dict, description="Parameters for the logger")
+    logger_params: Dict[str, Any] = Field(default_factory=dict, description="Parameters for the logger")
+    max_context_tokens: int | None = Field(None, ge=1, description="Estimated prompt token budget, oldest turns are dropped to fit")
+    similarity_cache: SimilarityCacheModel | None = Field(None, description="Opt-in near-duplicate prompt cache for non-streaming requests")
+    sse_coalesce: SseCoalesceModel | None = Field(None, description="Batch streamed events into fewer writes")
+    response_envelope: bool = Field(False, description="Wrap non-streaming responses in a WrapperResponse with request metadata")
+    embeddings: EmbeddingsModel | None = Field(None, description="Serve /{config}/embeddings with this embedding model")
+    content_filter: ContentFilterModel | None = Field(None, description="Blocklist applied to request messages and responses")
+    prompt_caching: PromptCachingModel | None = Field(None, description="Mark stable prompt prefixes with provider prompt-caching directives")
+    parameters: ParameterPolicyModel = Field(default_factory=ParameterPolicyModel, description="Which client sampling parameters are honored, clamped or overridden")
     # logger info
 
 class AIConfigurationReportingModel(BaseModel):
@@ -25,7 +192,86 @@ class AIConfigurationReportingModel(BaseModel):
 class AIConfigurations(BaseModel):
     configurations: Dict[str, AIConfigurationModel] = Field(default_factory=dict) 
 
+
+# Modules defining the configuration schema; a change to any of them invalidates the cache
+_SCHEMA_SOURCES = (Path(__file__), Path(chat_request_model.__file__))
+
+
+def default_cache_dir() -> Path:
+    """Per-user cache folder, outside the source tree: $XDG_CACHE_HOME or ~/.cache."""
+    base = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "universal-ai-wrapper"
+
+
+def load_configurations(config_path: Path, cache_dir: Path | None = None) -> AIConfigurations:
+    """
+    Load and validate the YAML configuration file.
+
+    The validated result is cached as JSON keyed by a hash of the YAML and of
+    the schema's modules, so later boots skip the YAML parser (and its import)
+    and only run pydantic's JSON validation. The cache holds api keys, so it
+    lives in a per-user folder created owner-only and is written owner-readable
+    only, and older cache files of the same configuration are deleted so stale
+    keys do not pile up. If it cannot be written the YAML is simply parsed
+    every time. CONFIG_CACHE_DIR="" turns the cache off.
+
+    Args:
+        config_path: Path of the YAML configuration
+        cache_dir: Cache folder, defaults to $CONFIG_CACHE_DIR or default_cache_dir()
+
+    Returns:
+        Validated configurations
+    """
+    yaml_content = config_path.read_bytes()
+    if cache_dir is None:
+        setting = os.getenv("CONFIG_CACHE_DIR")
+        if setting == "":
+            from pydantic_yaml import parse_yaml_raw_as
+            return parse_yaml_raw_as(AIConfigurations, yaml_content.decode("utf-8"))
+        cache_dir = Path(setting) if setting else default_cache_dir()
+    digest = hashlib.sha256(yaml_content)
+    digest.update(str(config_path.resolve()).encode("utf-8"))
+    for source in _SCHEMA_SOURCES:
+        digest.update(source.read_bytes())
+    cache_file = cache_dir / f"{config_path.stem}-{digest.hexdigest()[:32]}.json"
+
+    try:
+        return AIConfigurations.model_validate_json(cache_file.read_bytes())
+    except (OSError, ValidationError):
+        pass
+
+    from pydantic_yaml import parse_yaml_raw_as
+    configurations = parse_yaml_raw_as(AIConfigurations, yaml_content.decode("utf-8"))
+
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(configurations.model_dump_json())
+        os.replace(temp_file, cache_file)
+    except OSError:
+        pass
+    else:
+        _remove_stale_caches(cache_file, config_path.stem)
+    return configurations
+
+
+def _remove_stale_caches(cache_file: Path, stem: str):
+    """Delete the other <stem>-<digest>.json files, left by earlier versions of the configuration."""
+    for stale in cache_file.parent.glob(f"{glob.escape(stem)}-*.json"):
+        digest = stale.name[len(stem) + 1:-len(".json")]
+        # Only exact digests, so config-dev.yaml's caches survive config.yaml's cleanup
+        if stale == cache_file or len(digest) != 32 or not all(c in "0123456789abcdef" for c in digest):
+            continue
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+
 if __name__ == "__main__":
+    from pydantic_yaml import to_yaml_str, parse_yaml_raw_as
     with open("app/config.yaml", "r") as f:
         yaml_content = f.read()
     config = parse_yaml_raw_as(AIConfigurations, yaml_content)
@@ -1,6 +1,6 @@
 from enum import Enum
-from typing import List
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+from pydantic import BaseModel, Field, field_validator
 
 '''
 Docstring for app.models.chat_request_model
@@ -27,6 +27,18 @@ class Role(str, Enum):
     assistant = "assistant"
 
 
+class ReasoningEffort(str, Enum):
+    """Reasoning effort levels, from least to most"""
+    minimal = "minimal"
+    low = "low"
+    medium = "medium"
+    high = "high"
+
+
+# Request parameters governed by a configuration's parameter policy
+POLICY_PARAMETERS = ("max_tokens", "temperature", "top_p", "stop", "reasoning_effort")
+
+
 class Message(BaseModel):
     role: Role = Field(..., description="Role of the message sender")
     content: str = Field(..., min_length=1, description="Message text")
@@ -35,9 +47,22 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[Message] = Field(..., min_items=1, description="Conversation messages")
     stream: bool | None = Field(False, description="Whether to stream the response")
-    # Included, but these are ignored, as they are controlled by the wrapper configuration
+    # Ignored, the model is set by the wrapper configuration
     model: str = Field(..., description="Model identifier")
-    top_p : float | None = Field(1.0, ge=0.0, le=1.0, description="Top-p sampling parameter")
-    temperature: float | None = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
+    # Honored, clamped or overridden by the configuration's parameter policy
+    top_p : float | None = Field(None, ge=0.0, le=1.0, description="Top-p sampling parameter")
+    temperature: float | None = Field(None, ge=0.0, le=2.0, description="Sampling temperature")
     max_tokens: int | None = Field(None, ge=1, description="Maximum tokens in the response")
+    stop: List[str] | None = Field(None, description="Sequences where generation stops")
+    reasoning_effort: ReasoningEffort | None = Field(None, description="Reasoning effort for reasoning models")
+
+    @field_validator("stop", mode="before")
+    @classmethod
+    def single_stop(cls, value):
+        # OpenAI also accepts a single string
+        return [value] if isinstance(value, str) else value
+
+    def policy_parameters(self) -> Dict[str, Any]:
+        """The policy-governed parameters the client set."""
+        return self.model_dump(include=set(POLICY_PARAMETERS), exclude_none=True, mode="json")
 
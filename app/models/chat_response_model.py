@@ -1,13 +1,19 @@
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List
 from pydantic import BaseModel, Field
 import uuid
 
+from app.models.logging_model import AIUsage
+
 
 class WrapperResponse(BaseModel):
     user_id: str | None = Field(..., description="Identifier for the user")
     timestamp: int | None = Field(..., description="Timestamp of the response")
     session_id: uuid.UUID | None = Field(..., description="Session ID of the conversation")
+    request_id: uuid.UUID | None = Field(None, description="Request ID of the logged response")
+    cache: str | None = Field(None, description="Cache that served the response, if any")
+    usage: AIUsage | None = Field(None, description="Token usage reported by the provider")
+    response: Dict[str, Any] = Field(..., description="Chat completion returned by the provider")
 
     def to_dict(self) -> dict:
         """Convert the WrapperResponse to a dictionary."""
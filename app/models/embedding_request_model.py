@@ -0,0 +1,21 @@
+from typing import List
+from pydantic import BaseModel, Field, field_validator
+
+
+class EmbeddingRequest(BaseModel):
+    input: str | List[str] = Field(..., description="Text, or list of texts, to embed")
+    # Included, but ignored, as the embedding model is set by the wrapper configuration
+    model: str | None = Field(None, description="Model identifier")
+
+    @field_validator("input")
+    @classmethod
+    def check_input(cls, value):
+        texts = [value] if isinstance(value, str) else value
+        if not texts or len(texts) > 2048:
+            raise ValueError("input must hold between 1 and 2048 texts")
+        if not all(texts):
+            raise ValueError("input texts must not be empty")
+        return value
+
+    def texts(self) -> List[str]:
+        return [self.input] if isinstance(self.input, str) else list(self.input)
@@ -0,0 +1,68 @@
+import datetime
+from typing import List
+from pydantic import BaseModel, Field
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert a LoggingModel ISO 8601 timestamp to epoch seconds (naive values are treated as UTC)."""
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+class LogQuery(BaseModel):
+    endpoint: str | None = Field(None, description="Only records for this configuration endpoint")
+    user_id: str | None = Field(None, description="Only records for this user")
+    session_id: str | None = Field(None, description="Only records for this session")
+    start: datetime.datetime | None = Field(None, description="Inclusive lower bound on the record timestamp")
+    end: datetime.datetime | None = Field(None, description="Exclusive upper bound on the record timestamp")
+    offset: int = Field(0, ge=0, description="Number of matching records to skip")
+    limit: int | None = Field(100, ge=0, description="Maximum number of records to return, 0 or None for all")
+
+    def start_epoch(self) -> float | None:
+        return _to_epoch(self.start)
+
+    def end_epoch(self) -> float | None:
+        return _to_epoch(self.end)
+
+    def start_iso(self) -> str | None:
+        return _to_iso(self.start)
+
+    def end_iso(self) -> str | None:
+        return _to_iso(self.end)
+
+    def unpaged(self) -> "LogQuery":
+        """The same filters without offset/limit, used for counting and aggregation."""
+        return self.model_copy(update={"offset": 0, "limit": None})
+
+
+class UsageSummary(BaseModel):
+    endpoint: str = Field(..., description="Configuration endpoint the records belong to")
+    requests: int = Field(0, description="Number of logged completions")
+    users: int = Field(0, description="Number of distinct user ids")
+    sessions: int = Field(0, description="Number of distinct session ids")
+    prompt_tokens: int = Field(0, description="Sum of prompt tokens")
+    completion_tokens: int = Field(0, description="Sum of completion tokens")
+    total_tokens: int = Field(0, description="Sum of total tokens")
+    first_timestamp: str | None = Field(None, description="Earliest record timestamp")
+    last_timestamp: str | None = Field(None, description="Latest record timestamp")
+
+
+class UsageSummaries(BaseModel):
+    summary: List[UsageSummary] = Field(default_factory=list)
+
+
+def _to_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def _to_epoch(value: datetime.datetime | None) -> float | None:
+    return _to_utc(value).timestamp() if value is not None else None
+
+
+def _to_iso(value: datetime.datetime | None) -> str | None:
+    # Same shape as unix_to_iso8601 so string comparison against stored timestamps works
+    return _to_utc(value).isoformat() if value is not None else None
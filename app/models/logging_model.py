@@ -1,6 +1,6 @@
 from enum import Enum
 from typing import List, Dict 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 import uuid 
 from app.models.chat_request_model import Role, Message
 from app.models.ai_configuration_model import AIConfigurationReportingModel
@@ -10,6 +10,17 @@ class AIUsage(BaseModel):
     prompt_tokens: int = Field(..., description="Number of tokens in the prompt")
     completion_tokens: int = Field(..., description="Number of tokens in the completion")
     total_tokens: int = Field(..., description="Total number of tokens used")
+    cached_tokens: int = Field(0, description="Prompt tokens the provider read from its prompt cache")
+
+    @model_validator(mode="before")
+    @classmethod
+    def lift_cached_tokens(cls, data):
+        # Upstreams report them as usage.prompt_tokens_details.cached_tokens
+        if isinstance(data, dict) and "cached_tokens" not in data:
+            details = data.get("prompt_tokens_details") or {}
+            if details.get("cached_tokens"):
+                data = {**data, "cached_tokens": details["cached_tokens"]}
+        return data
 
 class LoggingModel(BaseModel):
     #base fields
@@ -24,6 +35,9 @@ class LoggingModel(BaseModel):
     message: str = Field(..., description="Message content sent to the AI service")
 
     # composite fields
-    # usage: AIUsage = Field(..., description="Usage statistics for the AI service")
+    usage: AIUsage | None = Field(None, description="Usage statistics for the AI service")
+    trimmed_tokens: int = Field(0, description="Estimated prompt tokens dropped by context trimming")
+    cache: str | None = Field(None, description="Cache that served the response, if any")
+    content_filter: str | None = Field(None, description="Content filter action applied to the response (redacted or terminated), if any")
     # ai_configuration: AIConfigurationReportingModel = Field(..., description="AI configuration settings")
     # input_messages: List[Message] = Field(..., description="List of input messages sent to the AI service")
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+from typing import List, AsyncIterator
+from .readerbase import LogReaderBase
+from .logindex import LogIndex, IndexEntry
+from app.models.log_query_model import LogQuery, UsageSummary
+
+class LineOrientedJsonFileReader(LogReaderBase):
+    """
+    Reader for the line oriented JSON file written by LineOrientedJsonFileLogger.
+
+    The file is append-only, so the index is extended incrementally from the
+    last indexed byte offset on every query. Each index key is the
+    (offset, length) of the record's line.
+    """
+
+    _PAGE_SIZE = 256
+
+    def __init__(self, params: dict = None):
+        self._filespec = "applog.json"
+        if params:
+            self._filespec = params.get("filespec", self._filespec)
+        self._index = LogIndex()
+        self._indexed_bytes = 0
+        self._lock = asyncio.Lock()
+
+    async def query(self, query: LogQuery) -> AsyncIterator[str]:
+        entries = await self._search(query)
+        for start in range(0, len(entries), self._PAGE_SIZE):
+            page = entries[start:start + self._PAGE_SIZE]
+            for line in await asyncio.to_thread(self._read_lines, page):
+                yield line
+
+    async def count(self, query: LogQuery) -> int:
+        await self._refresh()
+        return self._index.count(query)
+
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        await self._refresh()
+        return self._index.summary(query)
+
+    def provider(self):
+        return "jsonfile"
+
+    def filespec(self):
+        return self._filespec
+
+    async def _search(self, query: LogQuery) -> List[IndexEntry]:
+        await self._refresh()
+        return self._index.search(query)
+
+    async def _refresh(self):
+        async with self._lock:
+            await asyncio.to_thread(self._index_new_lines)
+
+    def _index_new_lines(self):
+        try:
+            size = os.path.getsize(self._filespec)
+        except FileNotFoundError:
+            return
+        if size < self._indexed_bytes:
+            # File was truncated or rotated, start over
+            self._index = LogIndex()
+            self._indexed_bytes = 0
+        if size == self._indexed_bytes:
+            return
+
+        with open(self._filespec, "rb") as log_file:
+            log_file.seek(self._indexed_bytes)
+            offset = self._indexed_bytes
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    # Partially written record, pick it up on the next refresh
+                    break
+                try:
+                    self._index.add((offset, len(line)), json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+                offset += len(line)
+            self._indexed_bytes = offset
+
+    def _read_lines(self, entries: List[IndexEntry]) -> List[str]:
+        lines = []
+        with open(self._filespec, "rb") as log_file:
+            for entry in entries:
+                offset, length = entry.key
+                log_file.seek(offset)
+                lines.append(log_file.read(length).decode("utf-8").rstrip("\n"))
+        return lines
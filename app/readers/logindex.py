@@ -0,0 +1,132 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple
+from app.models.log_query_model import LogQuery, UsageSummary, parse_timestamp
+
+
+class IndexEntry(NamedTuple):
+    timestamp: float
+    iso_timestamp: str
+    key: object
+    endpoint: str
+    user_id: str
+    session_id: str
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+
+class LogIndex:
+    """
+    In-memory index over locally stored LoggingModel records.
+
+    Each entry keeps the filterable fields, token usage and a storage key
+    (byte offset or file name) so queries and summaries never touch the
+    log files except to read back the records that are actually returned.
+    """
+
+    _FIELDS = ("endpoint", "user_id", "session_id")
+
+    def __init__(self):
+        self._entries: List[IndexEntry] = []
+        self._postings: Dict[str, Dict[str, List[int]]] = {field: defaultdict(list) for field in self._FIELDS}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key: object, record: Dict):
+        """Index a decoded record stored under key."""
+        usage = record.get("usage") or {}
+        iso_timestamp = record.get("timestamp", "")
+        try:
+            timestamp = parse_timestamp(iso_timestamp)
+        except (TypeError, ValueError):
+            timestamp = 0.0
+        entry = IndexEntry(
+            timestamp=timestamp,
+            iso_timestamp=iso_timestamp,
+            key=key,
+            endpoint=str(record.get("endpoint", "")),
+            user_id=str(record.get("user_id", "")),
+            session_id=str(record.get("session_id", "")),
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0),
+        )
+        position = len(self._entries)
+        self._entries.append(entry)
+        for field in self._FIELDS:
+            self._postings[field][getattr(entry, field)].append(position)
+
+    def search(self, query: LogQuery) -> List[IndexEntry]:
+        """Matching entries ordered by timestamp, with offset/limit applied."""
+        matches = self._filter(query)
+        matches.sort(key=lambda entry: entry.timestamp)
+        end = query.offset + query.limit if query.limit else None
+        return matches[query.offset:end]
+
+    def count(self, query: LogQuery) -> int:
+        return len(self._filter(query))
+
+    def summary(self, query: LogQuery) -> List[UsageSummary]:
+        return summarize(self._filter(query))
+
+    def _filter(self, query: LogQuery) -> List[IndexEntry]:
+        # Start from the smallest posting list among the equality filters
+        candidates: Iterable[int] | None = None
+        for field in self._FIELDS:
+            value = getattr(query, field)
+            if value is None:
+                continue
+            postings = self._postings[field].get(value, [])
+            if candidates is None or len(postings) < len(candidates):
+                candidates = postings
+
+        entries = self._entries if candidates is None else [self._entries[i] for i in candidates]
+        start = query.start_epoch()
+        end = query.end_epoch()
+        return [
+            entry for entry in entries
+            if (query.endpoint is None or entry.endpoint == query.endpoint)
+            and (query.user_id is None or entry.user_id == query.user_id)
+            and (query.session_id is None or entry.session_id == query.session_id)
+            and (start is None or entry.timestamp >= start)
+            and (end is None or entry.timestamp < end)
+        ]
+
+
+def summarize(entries: Iterable[IndexEntry]) -> List[UsageSummary]:
+    """Aggregate index entries per endpoint."""
+    groups: Dict[str, Dict] = {}
+    for entry in entries:
+        group = groups.get(entry.endpoint)
+        if group is None:
+            group = groups[entry.endpoint] = {
+                "requests": 0, "users": set(), "sessions": set(),
+                "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                "first": None, "last": None,
+            }
+        group["requests"] += 1
+        group["users"].add(entry.user_id)
+        group["sessions"].add(entry.session_id)
+        group["prompt_tokens"] += entry.prompt_tokens
+        group["completion_tokens"] += entry.completion_tokens
+        group["total_tokens"] += entry.total_tokens
+        if group["first"] is None or entry.timestamp < group["first"].timestamp:
+            group["first"] = entry
+        if group["last"] is None or entry.timestamp > group["last"].timestamp:
+            group["last"] = entry
+
+    return [
+        UsageSummary(
+            endpoint=endpoint,
+            requests=group["requests"],
+            users=len(group["users"]),
+            sessions=len(group["sessions"]),
+            prompt_tokens=group["prompt_tokens"],
+            completion_tokens=group["completion_tokens"],
+            total_tokens=group["total_tokens"],
+            first_timestamp=group["first"].iso_timestamp,
+            last_timestamp=group["last"].iso_timestamp,
+        )
+        for endpoint, group in sorted(groups.items())
+    ]
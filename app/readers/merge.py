@@ -0,0 +1,61 @@
+import heapq
+import json
+from typing import AsyncIterator, Callable, List
+
+from app.models.log_query_model import LogQuery, parse_timestamp
+
+# Returns one source's matching records as JSON strings, oldest first
+Source = Callable[[LogQuery], AsyncIterator[str]]
+
+
+def record_timestamp(record: str) -> float:
+    try:
+        return parse_timestamp(json.loads(record).get("timestamp") or "")
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+async def merged_query(sources: List[Source], query: LogQuery) -> AsyncIterator[str]:
+    """
+    Page through several oldest-first sources as one timestamp-ordered stream.
+
+    Each source is asked for its first offset + limit records and the streams
+    are merged k-way on the record timestamp, holding one record per source.
+    The query's offset and limit then apply to the merged order. Records with
+    equal timestamps keep the order of the sources.
+    """
+    if len(sources) == 1:
+        async for record in sources[0](query):
+            yield record
+        return
+
+    window = query.model_copy(update={"offset": 0, "limit": query.offset + query.limit if query.limit else None})
+    streams = [source(window).__aiter__() for source in sources]
+    heap = []
+    try:
+        for number, stream in enumerate(streams):
+            await _push(heap, number, stream)
+        skip = query.offset
+        remaining = query.limit or None
+        while heap and (remaining is None or remaining > 0):
+            _, number, record = heapq.heappop(heap)
+            await _push(heap, number, streams[number])
+            if skip:
+                skip -= 1
+                continue
+            if remaining is not None:
+                remaining -= 1
+            yield record
+    finally:
+        for stream in streams:
+            close = getattr(stream, "aclose", None)
+            if close is not None:
+                await close()
+
+
+async def _push(heap: list, number: int, stream: AsyncIterator[str]):
+    try:
+        record = await stream.__anext__()
+    except StopAsyncIteration:
+        return
+    heapq.heappush(heap, (record_timestamp(record), number, record))
@@ -0,0 +1,126 @@
+import json
+from typing import List, AsyncIterator, Dict
+from .readerbase import LogReaderBase
+from app.models.log_query_model import LogQuery, UsageSummary
+
+from pymongo import ASCENDING
+from pymongo.asynchronous.mongo_client import AsyncMongoClient
+
+class MongoDbReader(LogReaderBase):
+    """
+    Reader for the collection written by MongoDbLogger.
+
+    Filtering, paging and aggregation run server side. Indexes on the query
+    fields are created on first use.
+    """
+
+    _INDEXED_FIELDS = ("timestamp", "endpoint", "user_id", "session_id")
+
+    def __init__(self, params: dict = None):
+        self._connection_string = "mongodb://localhost:27017/"
+        self._database = "ai_logs"
+        self._collection = "logs"
+        if params:
+            self._connection_string = params.get("connection_string", self._connection_string)
+            self._database = params.get("database", self._database)
+            self._collection = params.get("collection", self._collection)
+        self._db = AsyncMongoClient(self._connection_string)
+        self._indexes_ready = False
+
+    async def query(self, query: LogQuery) -> AsyncIterator[str]:
+        collection = await self._get_collection()
+        cursor = collection.find(self._filter(query), {"_id": 0}).sort("timestamp", ASCENDING).skip(query.offset)
+        if query.limit:
+            cursor = cursor.limit(query.limit)
+        async for document in cursor:
+            yield json.dumps(document)
+
+    async def count(self, query: LogQuery) -> int:
+        collection = await self._get_collection()
+        return await collection.count_documents(self._filter(query))
+
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        collection = await self._get_collection()
+        match = {"$match": self._filter(query)}
+        pipeline = [
+            match,
+            {"$group": {
+                "_id": "$endpoint",
+                "requests": {"$sum": 1},
+                "prompt_tokens": {"$sum": {"$ifNull": ["$usage.prompt_tokens", 0]}},
+                "completion_tokens": {"$sum": {"$ifNull": ["$usage.completion_tokens", 0]}},
+                "total_tokens": {"$sum": {"$ifNull": ["$usage.total_tokens", 0]}},
+                "first_timestamp": {"$min": "$timestamp"},
+                "last_timestamp": {"$max": "$timestamp"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "endpoint": "$_id",
+                "requests": 1,
+                "prompt_tokens": 1,
+                "completion_tokens": 1,
+                "total_tokens": 1,
+                "first_timestamp": 1,
+                "last_timestamp": 1,
+            }},
+            {"$sort": {"endpoint": ASCENDING}},
+        ]
+        cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+        summaries = [document async for document in cursor]
+        users = await self._distinct_counts(collection, match, "user_id")
+        sessions = await self._distinct_counts(collection, match, "session_id")
+        return [
+            UsageSummary(**document, users=users.get(document["endpoint"], 0),
+                         sessions=sessions.get(document["endpoint"], 0))
+            for document in summaries
+        ]
+
+    async def _distinct_counts(self, collection, match: Dict, field: str) -> Dict[str, int]:
+        """
+        Number of distinct values of field per endpoint.
+
+        Grouping on (endpoint, value) and then counting the groups keeps every
+        stage's documents small; collecting the values with $addToSet would build
+        one array per endpoint, which outgrows the 16 MB document limit on
+        per-request fields such as session_id.
+        """
+        pipeline = [
+            match,
+            {"$group": {"_id": {"endpoint": "$endpoint", "value": f"${field}"}}},
+            {"$group": {"_id": "$_id.endpoint", "count": {"$sum": 1}}},
+        ]
+        cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+        return {document["_id"]: document["count"] async for document in cursor}
+
+    def provider(self):
+        return "mongodb"
+
+    def database(self):
+        return self._database
+
+    def collection(self):
+        return self._collection
+
+    async def _get_collection(self):
+        collection = self._db[self._database][self._collection]
+        if not self._indexes_ready:
+            for field in self._INDEXED_FIELDS:
+                await collection.create_index([(field, ASCENDING)])
+            self._indexes_ready = True
+        return collection
+
+    def _filter(self, query: LogQuery) -> Dict:
+        # Timestamps are stored as ISO 8601 strings in UTC, so range bounds compare as strings
+        mongo_filter = {}
+        for field in ("endpoint", "user_id", "session_id"):
+            value = getattr(query, field)
+            if value is not None:
+                mongo_filter[field] = value
+        timestamp_range = {}
+        if query.start is not None:
+            timestamp_range["$gte"] = query.start_iso()
+        if query.end is not None:
+            timestamp_range["$lt"] = query.end_iso()
+        if timestamp_range:
+            mongo_filter["timestamp"] = timestamp_range
+        return mongo_filter
@@ -0,0 +1,155 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import List, AsyncIterator
+from urllib.parse import unquote
+from .readerbase import LogReaderBase
+from .merge import merged_query
+from app.loggers.parquetlogger import SCHEMA
+from app.models.log_query_model import LogQuery, UsageSummary
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+PARTITION_SCHEMA = pa.schema([("endpoint", pa.string()), ("date", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+# Explicit so files written before a column was added read it back as null
+DATASET_SCHEMA = pa.unify_schemas([SCHEMA, PARTITION_SCHEMA])
+
+class ParquetReader(LogReaderBase):
+    """
+    Reader for the partitioned dataset written by ParquetLogger.
+
+    Endpoint and date filters prune whole partition directories and only the
+    columns a query needs are decoded. Each endpoint's records are scanned in
+    date then write order, and endpoints are merged on timestamp, so records
+    come back oldest first as long as each was logged in time order.
+    """
+
+    _USAGE_COLUMNS = ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+    _SUMMARY_COLUMNS = ["endpoint", "user_id", "session_id", "timestamp", *_USAGE_COLUMNS[:3]]
+
+    def __init__(self, params: dict = None):
+        self._path = "parquet_logs"
+        if params:
+            self._path = params.get("path", self._path)
+
+    async def query(self, query: LogQuery) -> AsyncIterator[str]:
+        if query.endpoint is not None:
+            sources = [self._scan]
+        else:
+            endpoints = await asyncio.to_thread(self._endpoints)
+            sources = [self._endpoint_scan(endpoint) for endpoint in endpoints] or [self._scan]
+        async for record in merged_query(sources, query):
+            yield record
+
+    def _endpoint_scan(self, endpoint: str):
+        return lambda query: self._scan(query.model_copy(update={"endpoint": endpoint}))
+
+    async def _scan(self, query: LogQuery) -> AsyncIterator[str]:
+        dataset = await asyncio.to_thread(self._dataset)
+        if dataset is None:
+            return
+        batches = dataset.to_batches(filter=self._filter(query))
+        skip = query.offset
+        remaining = query.limit or None
+        while remaining is None or remaining > 0:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            batch = batch.slice(skip, remaining)
+            skip = 0
+            if remaining is not None:
+                remaining -= batch.num_rows
+            for row in batch.to_pylist():
+                yield json.dumps(self._to_record(row))
+
+    async def count(self, query: LogQuery) -> int:
+        dataset = await asyncio.to_thread(self._dataset)
+        if dataset is None:
+            return 0
+        return await asyncio.to_thread(dataset.count_rows, filter=self._filter(query))
+
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        dataset = await asyncio.to_thread(self._dataset)
+        if dataset is None:
+            return []
+        table = await asyncio.to_thread(dataset.to_table, columns=self._SUMMARY_COLUMNS, filter=self._filter(query))
+        grouped = table.group_by("endpoint").aggregate([
+            ([], "count_all"),
+            ("user_id", "count_distinct"),
+            ("session_id", "count_distinct"),
+            ("prompt_tokens", "sum"),
+            ("completion_tokens", "sum"),
+            ("total_tokens", "sum"),
+            ("timestamp", "min"),
+            ("timestamp", "max"),
+        ])
+        summaries = []
+        for row in grouped.to_pylist():
+            summaries.append(UsageSummary(
+                endpoint=row["endpoint"],
+                requests=row["count_all"],
+                users=row["user_id_count_distinct"],
+                sessions=row["session_id_count_distinct"],
+                prompt_tokens=row["prompt_tokens_sum"] or 0,
+                completion_tokens=row["completion_tokens_sum"] or 0,
+                total_tokens=row["total_tokens_sum"] or 0,
+                first_timestamp=row["timestamp_min"].isoformat() if row["timestamp_min"] else None,
+                last_timestamp=row["timestamp_max"].isoformat() if row["timestamp_max"] else None,
+            ))
+        summaries.sort(key=lambda summary: summary.endpoint)
+        return summaries
+
+    def provider(self):
+        return "parquet"
+
+    def path(self):
+        return self._path
+
+    def _endpoints(self) -> List[str]:
+        try:
+            folders = list(Path(self._path).iterdir())
+        except FileNotFoundError:
+            return []
+        return sorted(unquote(folder.name[len("endpoint="):]) for folder in folders
+                      if folder.is_dir() and folder.name.startswith("endpoint="))
+
+    def _dataset(self):
+        try:
+            return ds.dataset(self._path, schema=DATASET_SCHEMA, format="parquet", partitioning=PARTITIONING)
+        except FileNotFoundError:
+            return None
+
+    def _filter(self, query: LogQuery):
+        expression = None
+        conditions = []
+        for field in ("endpoint", "user_id", "session_id"):
+            value = getattr(query, field)
+            if value is not None:
+                conditions.append(pc.field(field) == value)
+        if query.start is not None:
+            start = pa.scalar(int(query.start_epoch() * 1_000_000), pa.int64()).cast(pa.timestamp("us", tz="UTC"))
+            conditions.append(pc.field("date") >= query.start_iso()[:10])
+            conditions.append(pc.field("timestamp") >= start)
+        if query.end is not None:
+            end = pa.scalar(int(query.end_epoch() * 1_000_000), pa.int64()).cast(pa.timestamp("us", tz="UTC"))
+            conditions.append(pc.field("date") <= query.end_iso()[:10])
+            conditions.append(pc.field("timestamp") < end)
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _to_record(self, row: dict) -> dict:
+        # Rebuild the LoggingModel shape from the flattened row
+        row.pop("date", None)
+        row["timestamp"] = row["timestamp"].isoformat() if row["timestamp"] else None
+        usage = {column: row.pop(column) for column in self._USAGE_COLUMNS}
+        # Null in files written before the column existed
+        usage["cached_tokens"] = usage["cached_tokens"] or 0
+        row["usage"] = usage if usage["total_tokens"] is not None else None
+        return row
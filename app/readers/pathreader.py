@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, AsyncIterator, Set
+from .readerbase import LogReaderBase
+from .logindex import LogIndex, IndexEntry
+from app.models.log_query_model import LogQuery, UsageSummary
+
+class PathJsonFileReader(LogReaderBase):
+    """
+    Reader for the one-file-per-record folder written by PathJsonFileLogger.
+
+    Records are indexed incrementally: creating a file changes the folder's
+    mtime, so the folder is only listed again once its mtime moves, and each
+    record file is opened once for indexing. Files that could not be read yet
+    (still being written) are retried on their own. Each index key is the
+    record's file name.
+    """
+
+    _PAGE_SIZE = 256
+    # A file created in the same mtime tick as the last listing may be missed, so recent listings are repeated
+    _MTIME_SLACK_NS = 2_000_000_000
+
+    def __init__(self, params: dict = None):
+        self._path = "somefolder"
+        if params:
+            self._path = params.get("path", self._path)
+        self._index = LogIndex()
+        self._indexed: Set[str] = set()
+        self._unreadable: Set[str] = set()
+        self._listed_mtime = 0
+        self._listed_at = 0
+        self._lock = asyncio.Lock()
+
+    async def query(self, query: LogQuery) -> AsyncIterator[str]:
+        entries = await self._search(query)
+        for start in range(0, len(entries), self._PAGE_SIZE):
+            page = entries[start:start + self._PAGE_SIZE]
+            for record in await asyncio.to_thread(self._read_records, page):
+                yield record
+
+    async def count(self, query: LogQuery) -> int:
+        await self._refresh()
+        return self._index.count(query)
+
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        await self._refresh()
+        return self._index.summary(query)
+
+    def provider(self):
+        return "path"
+
+    def path(self):
+        return self._path
+
+    async def _search(self, query: LogQuery) -> List[IndexEntry]:
+        await self._refresh()
+        return self._index.search(query)
+
+    async def _refresh(self):
+        async with self._lock:
+            await asyncio.to_thread(self._index_new_files)
+
+    def _index_new_files(self):
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._listed_mtime and self._listed_at - mtime > self._MTIME_SLACK_NS:
+            names = set(self._unreadable)
+        else:
+            listed_at = time.time_ns()
+            names = {entry.name for entry in os.scandir(self._path) if entry.name.endswith(".json")}
+            names -= self._indexed
+            self._listed_mtime, self._listed_at = mtime, listed_at
+        for name in names:
+            try:
+                with open(Path(self._path) / name, "r") as log_file:
+                    record = json.load(log_file)
+            except FileNotFoundError:
+                self._unreadable.discard(name)
+                continue
+            except (OSError, json.JSONDecodeError):
+                # Still being written, retry on the next refresh
+                self._unreadable.add(name)
+                continue
+            self._unreadable.discard(name)
+            self._index.add(name, record)
+            self._indexed.add(name)
+
+    def _read_records(self, entries: List[IndexEntry]) -> List[str]:
+        records = []
+        for entry in entries:
+            try:
+                with open(Path(self._path) / entry.key, "r") as log_file:
+                    records.append(log_file.read())
+            except FileNotFoundError:
+                continue
+        return records
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+from typing import List, AsyncIterator
+from app.models.log_query_model import LogQuery, UsageSummary
+
+class LogReaderBase(ABC):
+
+    @abstractmethod
+    def query(self, query: LogQuery) -> AsyncIterator[str]:
+        """Yield matching records as JSON strings, oldest first; /logs merges several readers on that order."""
+        pass
+
+    @abstractmethod
+    async def count(self, query: LogQuery) -> int:
+        """Number of records matching the query filters (offset/limit ignored)."""
+        pass
+
+    @abstractmethod
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        """Aggregate matching records per endpoint."""
+        pass
+
+    @abstractmethod
+    def provider(self):
+        pass
+
+if __name__=='__main__':
+    pass
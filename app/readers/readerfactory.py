@@ -0,0 +1,37 @@
+
+from app.readers.readerbase import LogReaderBase
+
+class LogReaderFactory:
+
+    @staticmethod
+    def create(logger_type: str, params: dict = None) -> LogReaderBase:
+        if logger_type == "jsonfile":
+            from .jsonfilereader import LineOrientedJsonFileReader
+            return LineOrientedJsonFileReader(params)
+
+        if logger_type == "mongodb":
+            from .mongoreader import MongoDbReader
+            return MongoDbReader(params)
+
+        if logger_type == "path":
+            from .pathreader import PathJsonFileReader
+            return PathJsonFileReader(params)
+
+        if logger_type == "parquet":
+            from .parquetreader import ParquetReader
+            return ParquetReader(params)
+
+        if logger_type == "sqlite":
+            from .sqlitereader import SqliteReader
+            return SqliteReader(params)
+
+        if logger_type == "multi":
+            # Read back from the first sink that supports it
+            for sink in (params or {}).get("sinks", []):
+                try:
+                    return LogReaderFactory.create(sink["logger_type"], sink.get("logger_params", {}))
+                except ValueError:
+                    continue
+
+        raise ValueError(f"Logger type cannot be read back: {logger_type}")
+
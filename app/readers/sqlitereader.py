@@ -0,0 +1,94 @@
+import asyncio
+from typing import List, AsyncIterator, Tuple
+from .readerbase import LogReaderBase
+from app.loggers.sqlitelogger import connect
+from app.models.log_query_model import LogQuery, UsageSummary
+
+class SqliteReader(LogReaderBase):
+    """
+    Reader for the database written by SqliteLogger.
+
+    Queries run on their own WAL connection in a worker thread, so reads
+    neither block the event loop nor the logger's writer thread.
+    """
+
+    _PAGE_SIZE = 256
+
+    def __init__(self, params: dict = None):
+        self._filespec = "applog.db"
+        if params:
+            self._filespec = params.get("filespec", self._filespec)
+
+    async def query(self, query: LogQuery) -> AsyncIterator[str]:
+        where, args = self._where(query)
+        sql = f"SELECT record FROM logs {where} ORDER BY ts LIMIT ? OFFSET ?"
+        args += [query.limit or -1, query.offset]
+        connection = await asyncio.to_thread(connect, self._filespec)
+        try:
+            cursor = await asyncio.to_thread(connection.execute, sql, args)
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, self._PAGE_SIZE)
+                if not rows:
+                    break
+                for (record,) in rows:
+                    yield record
+        finally:
+            connection.close()
+
+    async def count(self, query: LogQuery) -> int:
+        where, args = self._where(query)
+        rows = await asyncio.to_thread(self._fetchall, f"SELECT COUNT(*) FROM logs {where}", args)
+        return rows[0][0]
+
+    async def summary(self, query: LogQuery) -> List[UsageSummary]:
+        where, args = self._where(query)
+        sql = f"""
+            SELECT endpoint, COUNT(*), COUNT(DISTINCT user_id), COUNT(DISTINCT session_id),
+                   TOTAL(prompt_tokens), TOTAL(completion_tokens), TOTAL(total_tokens),
+                   MIN(timestamp), MAX(timestamp)
+            FROM logs {where} GROUP BY endpoint ORDER BY endpoint
+        """
+        rows = await asyncio.to_thread(self._fetchall, sql, args)
+        return [
+            UsageSummary(
+                endpoint=row[0],
+                requests=row[1],
+                users=row[2],
+                sessions=row[3],
+                prompt_tokens=int(row[4]),
+                completion_tokens=int(row[5]),
+                total_tokens=int(row[6]),
+                first_timestamp=row[7],
+                last_timestamp=row[8],
+            )
+            for row in rows
+        ]
+
+    def provider(self):
+        return "sqlite"
+
+    def filespec(self):
+        return self._filespec
+
+    def _fetchall(self, sql: str, args: list):
+        connection = connect(self._filespec)
+        try:
+            return connection.execute(sql, args).fetchall()
+        finally:
+            connection.close()
+
+    def _where(self, query: LogQuery) -> Tuple[str, list]:
+        clauses = []
+        args = []
+        for field in ("endpoint", "user_id", "session_id"):
+            value = getattr(query, field)
+            if value is not None:
+                clauses.append(f"{field} = ?")
+                args.append(value)
+        if query.start is not None:
+            clauses.append("ts >= ?")
+            args.append(query.start_epoch())
+        if query.end is not None:
+            clauses.append("ts < ?")
+            args.append(query.end_epoch())
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", args
@@ -1,30 +1,123 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+import os
+
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.models.chat_request_model import ChatRequest
+from app.models.chat_request_model import ChatRequest, Message
 from app.models.chat_response_model import WrapperResponse
+from app.models.embedding_request_model import EmbeddingRequest
 from app.models.ai_configuration_model import AIConfigurationModel, AIConfigurations
+from app.models.ai_configuration_model import load_configurations
+from app.models.log_query_model import LogQuery, UsageSummaries
+from app.readers.readerbase import LogReaderBase
+from app.readers.readerfactory import LogReaderFactory
+from app.readers.merge import merged_query
 from app.wrappers.requests_wrapper import RequestsWrapper
+from app.services.batch_runner import BatchRunner, BatchJobBusy, BatchJobNotFound, BatchUploadTooLarge
+from app.services.sse_coalescer import coalesce_events
+from app.services.traffic_capture import TrafficRecorder
+from app.services.request_context import ServerTimingMiddleware, current_request, timing
+from app.services.compression import CompressionMiddleware
+from app.services.sampling_profiler import SamplingProfiler, ProfilerMiddleware
+from app.services.idempotency import IdempotencyStore, IdempotencyConflict, fingerprint
+from app.services.metrics import registry
+from app.services.conversation_store import ConversationStore
+from app.services.adaptive_limiter import AdaptiveLimiters, UpstreamBusy
+from app.services.content_filter import ContentBlocked
+from app.services.drain import DrainController, DrainMiddleware
+from app.services.loop_monitor import LoopMonitor
+import asyncio
+import importlib
+import json
+import math
 import time
 import uuid
-from fastapi.responses import StreamingResponse
-from pydantic_yaml import parse_yaml_raw_as
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Optional
+from pydantic import ValidationError
+from typing import AsyncIterator, Dict, List, Optional
 
 if not load_dotenv(".env"):
     raise FileNotFoundError("Could not find .env file at .env")
 
-app = FastAPI(title="Universal AI Wrapper API - Requests Implementation")
+# One wrapper (and therefore one logger) per configuration, created on first use
+providers: Dict[str, RequestsWrapper] = {}
+
+
+# Adaptive concurrency limits for upstream calls, one per model across configurations
+upstream_limiters = AdaptiveLimiters.from_env()
+
+
+# Anonymized request capture for app.tools.replay, enabled by CAPTURE_PATH
+traffic_recorder = TrafficRecorder.from_env()
+
+
+# Drains in-flight requests before a restart, on SIGUSR1 or POST /admin/drain
+drain_controller = DrainController.from_env()
+
+
+# Event loop lag and blocking-callback detection, LOOP_BLOCK_THRESHOLD_MS=0 turns it off
+loop_monitor = LoopMonitor.from_env()
+
+
+# Imported lazily on the request path; warmed in the background once the server is up
+WARM_IMPORTS = ["requests"]
+
+
+def warm_imports():
+    for module in WARM_IMPORTS:
+        importlib.import_module(module)
+
+
+def uses_spool(logger_params: dict | None) -> bool:
+    """Whether a logger (or one of a multi logger's sinks) has a disk spool."""
+    params = logger_params or {}
+    if params.get("spool_path"):
+        return True
+    return any(uses_spool(sink.get("logger_params")) for sink in params.get("sinks", []))
+
+
+async def close_providers():
+    """Flush and close every configuration's logger and batcher, and the traffic capture."""
+    while providers:
+        _, provider = providers.popitem()
+        await provider.close()
+    if traffic_recorder is not None:
+        await traffic_recorder.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    asyncio.get_running_loop().run_in_executor(None, warm_imports)
+    drain_controller.on_drained(close_providers)
+    drain_controller.install_signal_handler()
+    loop_monitor.start()
+    # Create spooling loggers up front so records spooled before a restart are replayed
+    for name, config in configurations.configurations.items():
+        if uses_spool(config.logger_params):
+            get_provider(name, config)
+    yield
+    # Flush buffered loggers on shutdown (already done if the server was drained)
+    await close_providers()
+    await loop_monitor.stop()
+
+
+app = FastAPI(title="Universal AI Wrapper API - Requests Implementation", lifespan=lifespan)
+# Off until started through /admin/profile/start
+profiler = SamplingProfiler()
+app.add_middleware(DrainMiddleware, controller=drain_controller)
+app.add_middleware(ProfilerMiddleware, profiler=profiler, always=loop_monitor.enabled)
+# Added last so it is outermost and its Server-Timing total covers compression
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+app.add_middleware(ServerTimingMiddleware)
 
 # Security scheme
 security = HTTPBearer()
 
 # Load configurations at startup
 config_path = Path(__file__).parent / "config.yaml"
-with open(config_path, "r") as f:
-    yaml_content = f.read()
-configurations = parse_yaml_raw_as(AIConfigurations, yaml_content)
+configurations = load_configurations(config_path)
 
 
 # Create authentication dependency factory
@@ -33,17 +126,75 @@ def create_auth_dependency(expected_api_key: str):
 
     async def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
         """Verify that the provided API key matches the expected one."""
-        if credentials.credentials != expected_api_key:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid API key",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return credentials.credentials
+        with timing("auth"):
+            if credentials.credentials != expected_api_key:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid API key",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            return credentials.credentials
 
     return verify_api_key
 
 
+# Read-side endpoints expose every user's logs, so they use a separate admin key.
+# When ADMIN_API_KEY is not set no bearer token matches and they stay closed.
+admin_auth = create_auth_dependency(os.getenv("ADMIN_API_KEY"))
+
+
+def get_provider(config_name: str, config: AIConfigurationModel) -> RequestsWrapper:
+    """Return the configuration's wrapper, creating it on first use."""
+    provider = providers.get(config_name)
+    if provider is None:
+        base_url: str = os.getenv("OPENROUTER_BASE_URL", 'https://openrouter.ai/api/v1')
+        provider = providers[config_name] = RequestsWrapper(config, base_url=base_url, limiters=upstream_limiters)
+    return provider
+
+
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request: Request, exc: UpstreamBusy):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+
+@app.exception_handler(ContentBlocked)
+async def content_blocked(request: Request, exc: ContentBlocked):
+    return JSONResponse({"detail": str(exc)}, status_code=400)
+
+
+async def started(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Wait for the first chunk of a stream before the response starts, so that a
+    request refused by the upstream limiter (or the upstream) gets an error
+    status instead of an empty 200 stream.
+    """
+    iterator = chunks.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def resumed():
+        if first is not None:
+            yield first
+        async for chunk in iterator:
+            yield chunk
+
+    return resumed()
+
+
+# Responses of requests sent with an Idempotency-Key, so client retries are not sent upstream again
+idempotency_store = IdempotencyStore.from_env()
+
+
+def idempotency_conflict() -> HTTPException:
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+
+
+def replay_headers(replayed: bool) -> Dict[str, str] | None:
+    return {"Idempotent-Replayed": "true"} if replayed else None
+
+
 # Create dynamic routes for each configuration
 def create_chat_endpoint(config_name: str, config : AIConfigurationModel):
     """Factory function to create a chat endpoint for a specific configuration."""
@@ -56,7 +207,10 @@ def create_chat_endpoint(config_name: str, config : AIConfigurationModel):
 
     async def chat_endpoint(
         request: ChatRequest,
-        api_key: str = Depends(auth_dependency)
+        api_key: str = Depends(auth_dependency),
+        idempotency_key: Optional[str] = Header(
+            None, max_length=255, description="Retries sent with the same key reuse the first request's response"
+        )
     ):
         """
         Handle chat requests using the {config_name} configuration.
@@ -64,28 +218,68 @@ def create_chat_endpoint(config_name: str, config : AIConfigurationModel):
         Args:
             request: ChatRequest containing messages and other parameters
             api_key: Verified API key from Authorization header
+            idempotency_key: Optional Idempotency-Key header
 
         Returns:
             Text response or streaming response
         """
-        base_url: str = 'https://openrouter.ai/api/v1'
         stream = request.stream if request.stream is not None else False
 
+        if traffic_recorder is not None:
+            await traffic_recorder.record(config_name, request)
+
         # Convert Pydantic Message objects to dictionaries
         messages = [{"role": msg.role.value, "content": msg.content} for msg in request.messages]
 
         # Use the requests wrapper with configuration settings
-        provider = RequestsWrapper(config, base_url=base_url)
+        provider = get_provider(config_name, config)
 
         if stream:
             async def stream_generator():
-                async for chunk in provider.generate_stream(messages=messages):
+                events = provider.generate_stream(messages=messages, parameters=request.policy_parameters())
+                if config.sse_coalesce is not None:
+                    events = coalesce_events(
+                        events,
+                        max_bytes=config.sse_coalesce.max_bytes,
+                        max_delay=config.sse_coalesce.max_delay_ms / 1000
+                    )
+                async for chunk in events:
                     yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
 
-            return StreamingResponse(stream_generator(), media_type="text/event-stream")
+            if idempotency_key is None:
+                return StreamingResponse(await started(stream_generator()), media_type="text/event-stream")
+            try:
+                chunks, replayed = idempotency_store.stream(
+                    config_name, idempotency_key, fingerprint(request.model_dump_json()), stream_generator
+                )
+            except IdempotencyConflict:
+                raise idempotency_conflict()
+            return StreamingResponse(await started(chunks), media_type="text/event-stream", headers=replay_headers(replayed))
         else:
-            response_text = await provider.generate_text(messages=messages)
-            return response_text
+            async def complete():
+                response_text = await provider.generate_text(messages=messages, parameters=request.policy_parameters())
+                if not config.response_envelope:
+                    return response_text
+                context = current_request.get()
+                return WrapperResponse(
+                    user_id=context.user_id if context else None,
+                    timestamp=int(time.time()),
+                    session_id=context.session_id if context else None,
+                    request_id=context.request_id if context else None,
+                    cache=context.cache if context else None,
+                    usage=context.usage if context else None,
+                    response=response_text
+                ).model_dump(mode="json")
+
+            if idempotency_key is None:
+                return await complete()
+            try:
+                response, replayed = await idempotency_store.result(
+                    config_name, idempotency_key, fingerprint(request.model_dump_json()), complete
+                )
+            except IdempotencyConflict:
+                raise idempotency_conflict()
+            return JSONResponse(response, headers=replay_headers(replayed))
 
     # Set function name and docstring for better API docs
     chat_endpoint.__name__ = f"chat_endpoint_{config_name}"
@@ -94,6 +288,195 @@ def create_chat_endpoint(config_name: str, config : AIConfigurationModel):
     return chat_endpoint
 
 
+def create_embeddings_endpoint(config_name: str, config: AIConfigurationModel):
+    """Factory function to create the embeddings endpoint for a configuration with an embedding model."""
+
+    auth_dependency = create_auth_dependency(config.api_key)
+
+    async def embeddings_endpoint(request: EmbeddingRequest, api_key: str = Depends(auth_dependency)):
+        """
+        Embed the input with the configuration's embedding model. Concurrent
+        requests are sent upstream together, and repeated inputs are served
+        from the cache.
+        """
+        provider = get_provider(config_name, config)
+        return await provider.generate_embeddings(request.texts())
+
+    embeddings_endpoint.__name__ = f"embeddings_endpoint_{config_name}"
+    return embeddings_endpoint
+
+
+batch_runner = BatchRunner()
+
+
+def create_batch_endpoints(config_name: str, config: AIConfigurationModel):
+    """Factory function to create the batch submit and resume endpoints for a configuration."""
+
+    auth_dependency = create_auth_dependency(config.api_key)
+
+    def stream_results(job_id: str):
+        try:
+            lines = batch_runner.start(job_id, get_provider(config_name, config))
+        except BatchJobBusy:
+            raise HTTPException(status_code=409, detail=f"Batch job {job_id} is already running")
+
+        async def result_generator():
+            try:
+                async for line in lines:
+                    yield line + "\n"
+            finally:
+                await lines.aclose()
+
+        return StreamingResponse(
+            result_generator(),
+            media_type="application/x-ndjson",
+            headers={"X-Batch-Job-Id": job_id}
+        )
+
+    async def batch_endpoint(
+        request: Request,
+        concurrency: int = Query(4, ge=1, le=32, description="Requests in flight at once"),
+        max_retries: int = Query(3, ge=0, le=10, description="Retries for 429/5xx and connection errors"),
+        api_key: str = Depends(auth_dependency)
+    ):
+        """
+        Run a JSONL upload of ChatRequest bodies (one per line) and stream one
+        JSON result line per request back in completion order. The job id is
+        returned in the X-Batch-Job-Id header and on every result line.
+        """
+        try:
+            job_id = await batch_runner.create(config_name, request.stream(), concurrency, max_retries)
+        except BatchUploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        return stream_results(job_id)
+
+    async def batch_resume_endpoint(job_id: str, api_key: str = Depends(auth_dependency)):
+        """Replay a batch job's finished results, then run whatever is left."""
+        try:
+            meta = await batch_runner.meta(job_id)
+        except BatchJobNotFound:
+            raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+        if meta["config"] != config_name:
+            raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+        return stream_results(job_id)
+
+    batch_endpoint.__name__ = f"batch_endpoint_{config_name}"
+    batch_resume_endpoint.__name__ = f"batch_resume_endpoint_{config_name}"
+    return batch_endpoint, batch_resume_endpoint
+
+
+# Conversation histories of WebSocket clients
+conversation_store = ConversationStore.from_env()
+
+
+def create_websocket_endpoint(config_name: str, config: AIConfigurationModel):
+    """
+    Factory function to create the WebSocket chat endpoint for a configuration.
+
+    The server keeps the conversation, so each turn the client only sends the
+    new user message as {"content": "..."} and receives {"type": "delta"}
+    frames followed by {"type": "done"}. Browsers cannot set headers on a
+    WebSocket, so the API key may also be passed as ?api_key=. Pass
+    ?session_id= to resume a conversation; {"type": "reset"} starts a new one.
+    """
+
+    def authorized(websocket: WebSocket, api_key: Optional[str]) -> bool:
+        if api_key is None:
+            scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+            api_key = credentials if scheme.lower() == "bearer" else None
+        return api_key == config.api_key
+
+    async def send_turn(websocket: WebSocket, provider: RequestsWrapper, conversation) -> Dict | None:
+        """Stream one completion of the conversation to the client and return the assistant message."""
+        reply: List[str] = []
+        usage = None
+
+        async def deltas():
+            nonlocal usage
+            async for _, chunk in provider.stream_chunks(
+                conversation.messages, session_id=conversation.session_id, system_prompt_applied=True
+            ):
+                if chunk is None:
+                    break
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                choices = chunk.get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    reply.append(content)
+                    yield content
+
+        frames = deltas()
+        if config.sse_coalesce is not None:
+            frames = coalesce_events(
+                frames,
+                max_bytes=config.sse_coalesce.max_bytes,
+                max_delay=config.sse_coalesce.max_delay_ms / 1000
+            )
+        async for frame in frames:
+            await websocket.send_json({
+                "type": "delta", "content": frame.decode("utf-8") if isinstance(frame, bytes) else frame
+            })
+        await websocket.send_json({"type": "done", "session_id": str(conversation.session_id), "usage": usage})
+        return {"role": "assistant", "content": "".join(reply)}
+
+    async def websocket_endpoint(
+        websocket: WebSocket,
+        api_key: Optional[str] = Query(None),
+        session_id: Optional[uuid.UUID] = Query(None)
+    ):
+        if not authorized(websocket, api_key):
+            await websocket.close(code=1008, reason="Invalid API key")
+            return
+        await websocket.accept()
+
+        provider = get_provider(config_name, config)
+        conversation = conversation_store.get(config_name, session_id) if session_id else None
+        if conversation is None:
+            conversation = conversation_store.create(config_name, config.system_prompt)
+        await websocket.send_json({"type": "session", "session_id": str(conversation.session_id)})
+
+        try:
+            while True:
+                try:
+                    data = json.loads(await websocket.receive_text())
+                    if not isinstance(data, dict):
+                        raise ValueError("Expected a JSON object")
+                    if data.get("type") == "reset":
+                        conversation = conversation_store.create(config_name, config.system_prompt)
+                        await websocket.send_json({"type": "session", "session_id": str(conversation.session_id)})
+                        continue
+                    message = Message(role="user", content=data.get("content"))
+                except (ValueError, ValidationError) as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+
+                async with conversation.lock:
+                    conversation_store.append(conversation, {"role": "user", "content": message.content})
+                    try:
+                        assistant = await send_turn(websocket, provider, conversation)
+                    except WebSocketDisconnect:
+                        raise
+                    except ContentBlocked as e:
+                        conversation.messages.pop()
+                        await websocket.send_json({"type": "error", "detail": str(e)})
+                        continue
+                    except Exception as e:
+                        # Leave the history as it was so the client can retry the turn
+                        conversation.messages.pop()
+                        try:
+                            await websocket.send_json({"type": "error", "detail": f"Upstream request failed: {e}"})
+                        except Exception:
+                            return
+                        continue
+                    conversation_store.append(conversation, assistant)
+        except WebSocketDisconnect:
+            pass
+
+    websocket_endpoint.__name__ = f"websocket_endpoint_{config_name}"
+    return websocket_endpoint
+
+
 # Register dynamic routes for each configuration
 for config_name, config in configurations.configurations.items():
     endpoint = create_chat_endpoint(config_name, config)
@@ -103,6 +486,154 @@ for config_name, config in configurations.configurations.items():
         tags=["endpoints"]
     )(endpoint)
 
+    if config.embeddings is not None:
+        app.post(
+            f"/{config_name}/embeddings",
+            name=f"{config_name}_embeddings",
+            tags=["endpoints"]
+        )(create_embeddings_endpoint(config_name, config))
+
+    batch_endpoint, batch_resume_endpoint = create_batch_endpoints(config_name, config)
+    app.post(
+        f"/{config_name}/batch",
+        name=f"{config_name}_batch",
+        tags=["batch"]
+    )(batch_endpoint)
+    app.get(
+        f"/{config_name}/batch/{{job_id}}",
+        name=f"{config_name}_batch_resume",
+        tags=["batch"]
+    )(batch_resume_endpoint)
+
+    app.websocket(
+        f"/{config_name}/ws",
+        name=f"{config_name}_ws"
+    )(create_websocket_endpoint(config_name, config))
+
+
+def create_log_readers(configurations: AIConfigurations) -> Dict[str, LogReaderBase]:
+    """Map each configuration whose logs can be read back to a reader.
+    Configurations that log to the same place share one reader (and its index)."""
+    readers = {}
+    shared = {}
+    for config_name, config in configurations.configurations.items():
+        key = (config.logger_type, json.dumps(config.logger_params, sort_keys=True))
+        if key not in shared:
+            try:
+                shared[key] = LogReaderFactory.create(config.logger_type, config.logger_params)
+            except ValueError:
+                shared[key] = None
+        if shared[key] is not None:
+            readers[config_name] = shared[key]
+    return readers
+
+
+# Created on first use so reader dependencies (pymongo, pyarrow) stay off the boot path
+log_readers: Dict[str, LogReaderBase] | None = None
+
+
+def select_log_readers(endpoint: Optional[str]) -> List[LogReaderBase]:
+    """Readers that can hold records for the endpoint, or every distinct reader."""
+    global log_readers
+    if log_readers is None:
+        log_readers = create_log_readers(configurations)
+    if endpoint is not None:
+        if endpoint not in log_readers:
+            raise HTTPException(status_code=404, detail=f"No readable logs for endpoint: {endpoint}")
+        return [log_readers[endpoint]]
+    unique = {}
+    for reader in log_readers.values():
+        unique.setdefault(id(reader), reader)
+    return list(unique.values())
+
+
+@app.get("/logs", tags=["logs"])
+async def query_logs(query: LogQuery = Depends(), api_key: str = Depends(admin_auth)):
+    """Stream matching log records as JSON lines, oldest first. Use limit=0 to export everything."""
+    readers = select_log_readers(query.endpoint)
+
+    async def log_generator():
+        # Several storages are merged on timestamp, so pages stay oldest first across them
+        async for record in merged_query([reader.query for reader in readers], query):
+            yield record + "\n"
+
+    return StreamingResponse(log_generator(), media_type="application/x-ndjson")
+
+
+@app.get("/usage/summary", tags=["logs"], response_model=UsageSummaries)
+async def usage_summary(query: LogQuery = Depends(), api_key: str = Depends(admin_auth)):
+    """Aggregate request counts, distinct users/sessions and token usage per endpoint."""
+    summaries = []
+    for reader in select_log_readers(query.endpoint):
+        summaries.extend(await reader.summary(query.unpaged()))
+    summaries.sort(key=lambda summary: summary.endpoint)
+    return UsageSummaries(summary=summaries)
+
+
+@app.get("/metrics", tags=["admin"], response_class=PlainTextResponse)
+async def metrics(api_key: str = Depends(admin_auth)):
+    """Prometheus text exposition of the server's metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/limits", tags=["admin"])
+async def upstream_limits(api_key: str = Depends(admin_auth)):
+    """Adaptive upstream concurrency limit, load and latency averages per model."""
+    return upstream_limiters.status()
+
+
+@app.post("/admin/drain", tags=["admin"])
+async def start_drain(
+    deadline: Optional[float] = Query(None, ge=0, description="Seconds in-flight requests may take to finish, DRAIN_DEADLINE_SECONDS when omitted"),
+    exit: bool = Query(False, description="Shut the server down once drained"),
+    api_key: str = Depends(admin_auth)
+):
+    """Stop accepting requests, let in-flight ones finish, then flush loggers. Poll GET /admin/drain for progress."""
+    return drain_controller.start(deadline, exit)
+
+
+@app.get("/admin/drain", tags=["admin"])
+async def drain_status(api_key: str = Depends(admin_auth)):
+    return drain_controller.status()
+
+
+@app.get("/admin/loop", tags=["admin"])
+async def loop_status(api_key: str = Depends(admin_auth)):
+    """Event loop lag and the most recent stalls, newest first, with the stack that blocked the loop."""
+    return loop_monitor.status()
+
+
+@app.post("/admin/profile/start", tags=["admin"])
+async def start_profile(
+    duration: float = Query(30, gt=0, le=600, description="Seconds to profile before stopping on its own"),
+    fraction: float = Query(1.0, gt=0, le=1, description="Share of requests to profile"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Sampling interval"),
+    api_key: str = Depends(admin_auth)
+):
+    """Start the sampling profiler. Results of the previous run are discarded."""
+    try:
+        profiler.start(duration, fraction, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+
+@app.post("/admin/profile/stop", tags=["admin"])
+async def stop_profile(api_key: str = Depends(admin_auth)):
+    await asyncio.to_thread(profiler.stop)
+    return profiler.status()
+
+
+@app.get("/admin/profile", tags=["admin"])
+async def profile_status(api_key: str = Depends(admin_auth)):
+    return profiler.status()
+
+
+@app.get("/admin/profile/folded", tags=["admin"], response_class=PlainTextResponse)
+async def profile_folded(config: Optional[str] = None, api_key: str = Depends(admin_auth)):
+    """Folded stacks of the last run for flamegraph.pl or speedscope, optionally for one configuration."""
+    return PlainTextResponse(profiler.folded(config))
+
 
 @app.get("/", tags=["system"])
 async def root():
@@ -112,7 +643,9 @@ async def root():
 
 @app.get("/health", tags=["system"])
 async def health():
-    """Health check endpoint."""
+    """Health check endpoint; 503 while draining so load balancers stop routing here."""
+    if drain_controller.draining:
+        return JSONResponse({"status": drain_controller.state}, status_code=503)
     return {"status": "healthy"}
 
 
@@ -128,6 +661,7 @@ async def list_configurations():
             "description": config.description,
             "temperature": config.temperature,
             "top_p": config.top_p,
+            "embeddings_endpoint": f"/{config_name}/embeddings" if config.embeddings is not None else None,
             "requires_auth": True
         })
     return {"configurations": config_list}
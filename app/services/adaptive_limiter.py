@@ -0,0 +1,161 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from app.services.metrics import registry
+
+limit_gauge = registry.gauge("upstream_concurrency_limit", "Current adaptive concurrency limit per upstream model", ("model",))
+in_flight_gauge = registry.gauge("upstream_in_flight", "Upstream requests in flight per model", ("model",))
+queued_gauge = registry.gauge("upstream_queued", "Requests waiting for an upstream slot per model", ("model",))
+rejected_requests = registry.counter(
+    "upstream_rejected_total", "Requests refused after waiting too long for an upstream slot", ("model",)
+)
+
+
+class UpstreamBusy(Exception):
+    """No upstream slot became free before the request's queue deadline."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Upstream {model} is at its concurrency limit, retry later")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one upstream model.
+
+    Every upstream response feeds observe() with its time to first byte and
+    whether it failed (429, 5xx or no response). A fast EWMA of the latency is
+    compared with a slow one that tracks the healthy baseline: when the fast
+    one exceeds `tolerance` times the baseline, or a request fails, the limit
+    is multiplied by `backoff`, at most once per round trip so a burst of
+    errors counts once. Healthy responses while the limit is in use add
+    1/limit, about one more slot per round trip.
+
+    Requests over the limit wait in FIFO order for up to `queue_timeout`
+    seconds and then raise UpstreamBusy, as do requests arriving to a full
+    queue.
+    """
+
+    # EWMA weights of the fast (recent) and slow (baseline) latency averages
+    FAST = 0.2
+    SLOW = 0.02
+
+    def __init__(self, model: str, initial_limit: int = 16, min_limit: int = 1, max_limit: int = 256,
+                 tolerance: float = 2.0, backoff: float = 0.75, queue_timeout: float = 30.0, max_queue: int = 1000):
+        self.model = model
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.fast_latency: float | None = None
+        self.slow_latency: float | None = None
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        limit_gauge.set_function(lambda: math.floor(self.limit), model=model)
+        in_flight_gauge.set_function(lambda: self.in_flight, model=model)
+        queued_gauge.set_function(lambda: len(self._waiters), model=model)
+
+    def status(self) -> Dict:
+        return {
+            "limit": math.floor(self.limit), "in_flight": self.in_flight, "queued": len(self._waiters),
+            "fast_latency_ms": self.fast_latency and self.fast_latency * 1000,
+            "slow_latency_ms": self.slow_latency and self.slow_latency * 1000,
+        }
+
+    async def acquire(self):
+        """Wait for a slot; raises UpstreamBusy past the queue deadline."""
+        if not self._waiters and self.in_flight < math.floor(self.limit):
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            rejected_requests.inc(model=self.model)
+            raise UpstreamBusy(self.model, self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as the deadline passed (or the caller went away)
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                rejected_requests.inc(model=self.model)
+                raise UpstreamBusy(self.model, self._retry_after()) from None
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def observe(self, latency: float | None, failed: bool = False):
+        """Adjust the limit after an upstream response (latency None when there was none)."""
+        now = time.monotonic()
+        overloaded = failed
+        if latency is not None and not failed:
+            if self.fast_latency is None:
+                self.fast_latency = self.slow_latency = latency
+            else:
+                self.fast_latency += self.FAST * (latency - self.fast_latency)
+                self.slow_latency += self.SLOW * (latency - self.slow_latency)
+            overloaded = self.fast_latency > self.tolerance * self.slow_latency
+
+        if overloaded:
+            # One decrease per round trip, so the responses of one burst count once
+            if now - self._last_decrease >= (self.fast_latency or 0.0):
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        elif self.in_flight + len(self._waiters) >= math.floor(self.limit):
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._grant()
+
+    def _retry_after(self) -> float:
+        # About one round trip, when a slot is likely to have freed up
+        return max(1.0, self.fast_latency or 1.0)
+
+    def _grant(self):
+        while self._waiters and self.in_flight < math.floor(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class AdaptiveLimiters:
+    """One AdaptiveLimiter per upstream model, shared by every configuration using it."""
+
+    def __init__(self, **settings):
+        self._settings = settings
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveLimiters":
+        return cls(
+            initial_limit=int(os.getenv("UPSTREAM_LIMIT_INITIAL", "16")),
+            min_limit=int(os.getenv("UPSTREAM_LIMIT_MIN", "1")),
+            max_limit=int(os.getenv("UPSTREAM_LIMIT_MAX", "256")),
+            tolerance=float(os.getenv("UPSTREAM_LATENCY_TOLERANCE", "2.0")),
+            queue_timeout=float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "30")),
+            max_queue=int(os.getenv("UPSTREAM_QUEUE_MAX", "1000")),
+        )
+
+    def get(self, model: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = self._limiters[model] = AdaptiveLimiter(model, **self._settings)
+        return limiter
+
+    def status(self) -> Dict[str, Dict]:
+        return {model: limiter.status() for model, limiter in self._limiters.items()}
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import random
+import shutil
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, List, Set, Tuple
+
+from pydantic import ValidationError
+
+from app.models.chat_request_model import ChatRequest
+from app.services.adaptive_limiter import UpstreamBusy
+from app.wrappers.requests_wrapper import RequestsWrapper
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): a claim only holds within one process there
+    fcntl = None
+
+# Upstream statuses worth retrying, anything else is reported as an error
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class BatchJobNotFound(Exception):
+    pass
+
+
+class BatchJobBusy(Exception):
+    pass
+
+
+class BatchUploadTooLarge(Exception):
+    pass
+
+
+class BatchRunner:
+    """
+    Runs JSONL batches of ChatRequest bodies against a configuration.
+
+    Every job lives in <root>/<job_id>/: the uploaded input.jsonl, a meta.json
+    and results.jsonl, which gets one line per finished request as soon as it
+    completes. Resuming a job replays results.jsonl and only runs the input
+    lines that have no result yet, so jobs survive restarts and disconnects.
+    Input is read from disk a few lines at a time and at most `concurrency`
+    requests are in flight, so memory does not depend on the batch size.
+    Uploads are limited to max_upload_bytes, and a job that is not running
+    and has not been written to for ttl seconds is deleted.
+
+    A running job holds an flock on <job>/lock, so with several server
+    workers sharing the jobs folder a job still runs for one client at a
+    time and is never deleted while another worker runs it.
+    """
+
+    _READ_LINES = 64
+
+    def __init__(self, root: str | None = None, max_upload_bytes: int | None = None, ttl: float | None = None):
+        self._root = Path(root or os.getenv("BATCH_JOBS_PATH", "batch_jobs"))
+        self._max_upload_bytes = max_upload_bytes or int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(100 << 20)))
+        self._ttl = ttl or float(os.getenv("BATCH_JOB_TTL_SECONDS", str(7 * 86400)))
+        # Running job ids and the claim (the locked lock file) that owns each
+        self._running: Dict[str, BinaryIO] = {}
+
+    async def create(self, config_name: str, body: AsyncIterator[bytes],
+                     concurrency: int, max_retries: int) -> str:
+        """Spool an uploaded JSONL body to disk and return the new job id."""
+        await asyncio.to_thread(self._remove_expired)
+        job_id = uuid.uuid4().hex
+        folder = self._root / job_id
+        await asyncio.to_thread(folder.mkdir, parents=True, exist_ok=True)
+
+        input_file = await asyncio.to_thread(open, folder / "input.jsonl", "wb")
+        try:
+            pending = bytearray()
+            size = 0
+            async for chunk in body:
+                size += len(chunk)
+                if size > self._max_upload_bytes:
+                    raise BatchUploadTooLarge(f"Batch uploads are limited to {self._max_upload_bytes} bytes")
+                pending += chunk
+                if len(pending) >= 1 << 20:
+                    await asyncio.to_thread(input_file.write, bytes(pending))
+                    pending.clear()
+            await asyncio.to_thread(input_file.write, bytes(pending))
+        except BaseException:
+            await asyncio.to_thread(input_file.close)
+            await asyncio.to_thread(shutil.rmtree, folder, True)
+            raise
+        await asyncio.to_thread(input_file.close)
+
+        meta = {"job_id": job_id, "config": config_name, "concurrency": concurrency, "max_retries": max_retries}
+        await asyncio.to_thread((folder / "meta.json").write_text, json.dumps(meta))
+        return job_id
+
+    async def meta(self, job_id: str) -> Dict:
+        meta_file = self._root / Path(job_id).name / "meta.json"
+        try:
+            return json.loads(await asyncio.to_thread(meta_file.read_text))
+        except FileNotFoundError:
+            raise BatchJobNotFound(job_id)
+
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._running
+
+    def start(self, job_id: str, provider: RequestsWrapper) -> AsyncIterator[str]:
+        """
+        Claim the job and return its result lines (see run()). The claim is
+        taken here, synchronously, so that of two concurrent resumes (in this
+        or another worker) one gets BatchJobBusy before its response starts.
+        It is released when the lines are exhausted or closed, or the iterator
+        is dropped unstarted.
+        """
+        job_id = Path(job_id).name
+        if job_id in self._running:
+            raise BatchJobBusy(job_id)
+        claim = self._lock(self._root / job_id)
+        if claim is None:
+            raise BatchJobBusy(job_id)
+        self._running[job_id] = claim
+        lines = self.run(job_id, provider, claim)
+        weakref.finalize(lines, self._release, job_id, claim)
+        return lines
+
+    async def run(self, job_id: str, provider: RequestsWrapper, claim: BinaryIO) -> AsyncIterator[str]:
+        """
+        Yield result lines in completion order: first the results already on
+        disk, then those of the remaining input lines as they finish. The job
+        must have been claimed with start().
+        """
+        folder = self._root / job_id
+        lock = asyncio.Lock()
+        pending: Set[asyncio.Task] = set()
+        try:
+            meta = await self.meta(job_id)
+            results_path = folder / "results.jsonl"
+            done_indexes = await asyncio.to_thread(self._recover_results, results_path)
+            if done_indexes:
+                async for line in self._iter_lines(results_path):
+                    yield line.decode("utf-8").rstrip("\n")
+
+            concurrency = meta["concurrency"]
+            async for index, line in self._read_input(folder / "input.jsonl"):
+                if index in done_indexes:
+                    continue
+                if len(pending) >= concurrency:
+                    finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        yield task.result()
+                pending.add(asyncio.create_task(
+                    self._run_one(job_id, index, line, provider, meta["max_retries"], folder, lock)
+                ))
+
+            while pending:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            self._release(job_id, claim)
+
+    def _release(self, job_id: str, claim: BinaryIO):
+        # A later run of the same job has its own claim, which must survive this one's cleanup
+        if self._running.get(job_id) is claim:
+            del self._running[job_id]
+        # Closing the file drops its lock
+        claim.close()
+
+    @staticmethod
+    def _lock(folder: Path) -> BinaryIO | None:
+        """Open and lock the job's lock file without waiting, None while another process holds it."""
+        try:
+            lock_file = open(folder / "lock", "ab")
+        except FileNotFoundError:
+            raise BatchJobNotFound(folder.name)
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    async def _run_one(self, job_id: str, index: int, line: bytes, provider: RequestsWrapper,
+                       max_retries: int, folder: Path, lock: asyncio.Lock) -> str:
+        import requests
+
+        result = {"job_id": job_id, "index": index, "status": "ok", "attempts": 0, "response": None, "error": None}
+        try:
+            request = ChatRequest.model_validate_json(line)
+        except ValidationError as e:
+            result.update(status="error", error=f"Invalid ChatRequest: {e.errors(include_url=False)}")
+        else:
+            messages = [{"role": msg.role.value, "content": msg.content} for msg in request.messages]
+            for attempt in range(max_retries + 1):
+                result["attempts"] = attempt + 1
+                try:
+                    result["response"] = await provider.generate_text(
+                        messages=messages, parameters=request.policy_parameters()
+                    )
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError, UpstreamBusy) as e:
+                    response = getattr(e, "response", None)
+                    status = response.status_code if response is not None else None
+                    retryable = status is None or status in RETRYABLE_STATUS
+                    if not retryable or attempt == max_retries:
+                        result.update(status="error", error=str(e))
+                        break
+                    # Exponential backoff with jitter, capped at 30s
+                    await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random() / 2))
+                except Exception as e:
+                    result.update(status="error", error=repr(e))
+                    break
+
+        result_line = json.dumps(result, default=str)
+        async with lock:
+            await asyncio.to_thread(self._append, folder / "results.jsonl", result_line)
+        return result_line
+
+    async def _read_input(self, input_path: Path) -> AsyncIterator[Tuple[int, bytes]]:
+        index = 0
+        async for line in self._iter_lines(input_path):
+            if line.strip():
+                yield index, line
+                index += 1
+
+    async def _iter_lines(self, path: Path) -> AsyncIterator[bytes]:
+        source = await asyncio.to_thread(open, path, "rb")
+        try:
+            while True:
+                lines = await asyncio.to_thread(self._read_lines, source)
+                if not lines:
+                    return
+                for line in lines:
+                    yield line
+        finally:
+            source.close()
+
+    def _read_lines(self, input_file) -> List[bytes]:
+        lines = []
+        for _ in range(self._READ_LINES):
+            line = input_file.readline()
+            if not line:
+                break
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def _recover_results(results_path: Path) -> Set[int]:
+        """Indexes that already have a result. A torn last line left by a crash is cut off so that request runs again."""
+        done = set()
+        valid_bytes = 0
+        try:
+            with open(results_path, "rb") as results_file:
+                for line in results_file:
+                    if not line.endswith(b"\n"):
+                        break
+                    valid_bytes += len(line)
+                    try:
+                        done.add(json.loads(line)["index"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+            if valid_bytes < results_path.stat().st_size:
+                os.truncate(results_path, valid_bytes)
+        except FileNotFoundError:
+            pass
+        return done
+
+    def _remove_expired(self):
+        if not self._root.is_dir():
+            return
+        now = time.time()
+        for folder in self._root.iterdir():
+            if not folder.is_dir() or folder.name in self._running:
+                continue
+            try:
+                touched = max(entry.stat().st_mtime for entry in folder.iterdir())
+            except ValueError:
+                touched = folder.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - touched <= self._ttl:
+                continue
+            try:
+                lock_file = self._lock(folder)
+            except BatchJobNotFound:
+                continue
+            if lock_file is None:
+                # Running in another worker
+                continue
+            try:
+                shutil.rmtree(folder, ignore_errors=True)
+            finally:
+                lock_file.close()
+
+    @staticmethod
+    def _append(results_path: Path, line: str):
+        with open(results_path, "a") as results_file:
+            results_file.write(line + "\n")
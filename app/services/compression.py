@@ -0,0 +1,107 @@
+import gzip
+import time
+
+from app.services.request_context import add_timing
+
+# brotli (in requirements.txt) or its API-compatible CFFI build for PyPy; gzip only without either
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Content types worth compressing; event streams are never buffered for compression
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/plain")
+
+
+def accepted_encodings(scope) -> set:
+    """Encodings the client accepts, ignoring those it refuses with q=0."""
+    encodings = set()
+    for name, value in scope.get("headers", []):
+        if name != b"accept-encoding":
+            continue
+        for item in value.decode("latin-1").split(","):
+            coding, _, params = item.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete (non-streamed) responses of at least
+    minimum_size bytes with brotli, when the brotli package is installed and
+    the client accepts it, or gzip. Streamed responses pass through unchanged
+    so that tokens are not held back.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = dict(start_message.get("headers", []))
+            content_type = headers.get(b"content-type", b"").split(b";")[0].strip()
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or b"content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            started = time.perf_counter()
+            if encoding == "br":
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+            add_timing("compress", time.perf_counter() - started)
+
+            response_headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name not in (b"content-length", b"vary")
+            ]
+            vary = headers.get(b"vary")
+            response_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+            ]
+            passthrough = True
+            await send({**start_message, "headers": response_headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
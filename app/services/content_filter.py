@@ -0,0 +1,289 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from app.services.metrics import registry
+
+filter_matches = registry.counter(
+    "content_filter_matches_total", "Content filter matches by configuration and where they were found",
+    ("config", "source"),
+)
+
+
+class ContentBlocked(Exception):
+    """A request message matched the configuration's blocklist."""
+
+
+def _lower(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters lowercase to two; keep offsets aligned with the original
+        lowered = "".join(c.lower()[0] for c in text)
+    return lowered
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over case-folded text, built once per configuration.
+
+    Matching costs one transition per character however many patterns there
+    are, and runs incrementally: feed text in any pieces and carry the state.
+    Each state knows its depth (the length of the longest pattern prefix
+    ending at the current character) and the lengths of every pattern ending
+    there, so callers never look further back than the depth.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        count = 0
+        for pattern in patterns:
+            pattern = _lower(pattern.strip())
+            if not pattern:
+                continue
+            count += 1
+            state = 0
+            for c in pattern:
+                nxt = self._goto[state].get(c)
+                if nxt is None:
+                    nxt = self._goto[state][c] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._depth.append(self._depth[state] + 1)
+                    self._out.append(())
+                state = nxt
+            if len(pattern) not in self._out[state]:
+                self._out[state] += (len(pattern),)
+        self.patterns = count
+
+        # Breadth first, so a state's failure target is complete before its children
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for c, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and c not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(c, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    @classmethod
+    def load(cls, patterns: Iterable[str] = (), patterns_file: str | None = None) -> "PatternMatcher":
+        """Patterns given inline plus one per line of patterns_file (blank lines and # comments skipped)."""
+        patterns = list(patterns)
+        if patterns_file:
+            lines = Path(patterns_file).read_text(encoding="utf-8").splitlines()
+            patterns.extend(line for line in lines if line.strip() and not line.lstrip().startswith("#"))
+        return cls(patterns)
+
+    def scan(self, text: str, state: int = 0) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Advance from state over text.
+
+        Returns:
+            The new state and the (start, end) offsets into text of every match
+            ending in it; a start is negative for a match that began in earlier text
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        for i, c in enumerate(_lower(text)):
+            nxt = goto[state].get(c)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(c)
+            state = nxt or 0
+            if out[state]:
+                for length in out[state]:
+                    matches.append((i + 1 - length, i + 1))
+        return state, matches
+
+    def depth(self, state: int) -> int:
+        return self._depth[state]
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class ContentFilter:
+    """
+    A configuration's blocklist, applied to whole texts and to streams.
+
+    With whole_words, a match only counts when it is not part of a longer
+    word, so "ass" does not hit "class".
+    """
+
+    def __init__(self, matcher: PatternMatcher, replacement: str = "[redacted]", whole_words: bool = True,
+                 name: str = ""):
+        self.matcher = matcher
+        self.replacement = replacement
+        self.whole_words = whole_words
+        self.name = name
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """Merged (start, end) spans of the matches in text."""
+        _, matches = self.matcher.scan(text)
+        if self.whole_words:
+            matches = [(start, end) for start, end in matches if self._bounded(text, start, end)]
+        return _merge(matches)
+
+    def apply(self, text: str, terminate: bool = False, source: str = "output") -> Tuple[str, str | None]:
+        """
+        Redact every match in text, or cut it before the first one when
+        terminating. Returns the text and "redacted", "terminated" or None.
+        """
+        spans = self.find(text)
+        if not spans:
+            return text, None
+        filter_matches.inc(len(spans), config=self.name, source=source)
+        if terminate:
+            return text[:spans[0][0]], "terminated"
+        return _replace(text, spans, self.replacement), "redacted"
+
+    def stream(self, terminate: bool = False) -> "StreamFilter":
+        return StreamFilter(self, terminate)
+
+    @staticmethod
+    def _bounded(text: str, start: int, end: int) -> bool:
+        return (start <= 0 or not _is_word(text[start - 1])) and (end >= len(text) or not _is_word(text[end]))
+
+
+class StreamFilter:
+    """
+    Incremental filter for one streamed response.
+
+    feed() returns the part of the text seen so far that can no longer be
+    part of a match; the rest (at most the automaton's current depth, plus a
+    match waiting for the next character to confirm a word boundary) is held
+    back until more text arrives or the stream ends with flush(). Held back
+    text is therefore bounded by the longest pattern, and clean text flows
+    through with no added latency beyond that. When terminating, the first
+    match ends the stream: the text before it is released and nothing after,
+    less any tail that could still be the start of a longer pattern.
+    """
+
+    def __init__(self, content_filter: ContentFilter, terminate: bool = False):
+        self._filter = content_filter
+        self._terminate = terminate
+        self.terminated = False
+        self._state = 0
+        self._buffer = ""
+        # Last character already released, for the word boundary before a match
+        self._before = ""
+        self._spans: List[Tuple[int, int]] = []
+        self._unconfirmed: List[Tuple[int, int]] = []
+        self.matches = 0
+
+    @property
+    def outcome(self) -> str | None:
+        if self.terminated:
+            return "terminated"
+        return "redacted" if self.matches else None
+
+    def feed(self, text: str) -> str:
+        """Add a chunk of text and return the text that is safe to release."""
+        if self.terminated:
+            return ""
+        offset = len(self._buffer)
+        self._buffer += text
+        self._state, matches = self._filter.matcher.scan(text, self._state)
+        self._confirm()
+        for start, end in matches:
+            span = (start + offset, end + offset)
+            if not self._filter.whole_words:
+                self._add(span)
+            elif span[1] < len(self._buffer):
+                self._check(span)
+            else:
+                self._unconfirmed.append(span)
+        if self._terminate and self._spans:
+            # Text within the current depth may belong to a longer match that started earlier
+            return self._cut(len(self._buffer) - self._filter.matcher.depth(self._state))
+
+        hold = len(self._buffer) - self._filter.matcher.depth(self._state)
+        for start, _ in self._unconfirmed:
+            hold = min(hold, start)
+        for start, end in self._spans:
+            if start < hold < end:
+                hold = start
+        return self._release(max(hold, 0))
+
+    def flush(self) -> str:
+        """Release everything held back once the stream has ended."""
+        if self.terminated:
+            return ""
+        for span in self._unconfirmed:
+            self._check(span)
+        self._unconfirmed = []
+        if self._terminate and self._spans:
+            return self._cut(len(self._buffer))
+        return self._release(len(self._buffer))
+
+    def _confirm(self):
+        # Matches that ended at the previous chunk's last character now know the next one
+        unconfirmed, self._unconfirmed = self._unconfirmed, []
+        for span in unconfirmed:
+            if span[1] < len(self._buffer):
+                self._check(span)
+            else:
+                self._unconfirmed.append(span)
+
+    def _check(self, span: Tuple[int, int]):
+        start, end = span
+        before = self._buffer[start - 1] if start > 0 else self._before
+        after = self._buffer[end] if end < len(self._buffer) else ""
+        if not ((before and _is_word(before)) or (after and _is_word(after))):
+            self._add(span)
+
+    def _add(self, span: Tuple[int, int]):
+        self._spans = _merge(self._spans + [span])
+        self.matches += 1
+        filter_matches.inc(config=self._filter.name, source="stream")
+
+    def _cut(self, limit: int) -> str:
+        released = self._buffer[:max(0, min(self._spans[0][0], limit))]
+        self._buffer = ""
+        self._spans = self._unconfirmed = []
+        self.terminated = True
+        return released
+
+    def _release(self, upto: int) -> str:
+        if upto <= 0:
+            return ""
+        # The hold point never falls inside a span, so spans are released whole
+        spans = [span for span in self._spans if span[0] < upto]
+        self._spans = [(start - upto, end - upto) for start, end in self._spans if start >= upto]
+        self._unconfirmed = [(start - upto, end - upto) for start, end in self._unconfirmed]
+        released = _replace(self._buffer[:upto], spans, self._filter.replacement)
+        self._before = self._buffer[upto - 1]
+        self._buffer = self._buffer[upto:]
+        return released
+
+
+def _merge(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Join overlapping spans. Touching ones stay separate: a stream releases a
+    span before it can know whether the next match will touch it.
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _replace(text: str, spans: List[Tuple[int, int]], replacement: str) -> str:
+    if not spans:
+        return text
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(text[position:max(start, 0)])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
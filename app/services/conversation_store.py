@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from app.services.metrics import registry
+
+conversations_gauge = registry.gauge("conversations", "Server-side conversations held for WebSocket clients")
+
+
+class Conversation:
+    """Message history of one session, starting with the configuration's system prompt."""
+
+    def __init__(self, session_id: uuid.UUID, messages: List[Dict]):
+        self.session_id = session_id
+        self.messages = messages
+        self.last_used = time.monotonic()
+        # One turn at a time, even if the session is resumed on a second connection
+        self.lock = asyncio.Lock()
+
+
+class ConversationStore:
+    """
+    Bounded in-memory conversation histories keyed by configuration and session.
+
+    Conversations unused for ttl seconds expire, the least recently used are
+    evicted beyond max_conversations, and each keeps at most max_messages
+    messages after the system prompt, dropping the oldest turns first.
+    """
+
+    def __init__(self, max_conversations: int = 10000, max_messages: int = 200, ttl: float = 3600.0):
+        self._max_conversations = max_conversations
+        self._max_messages = max_messages
+        self._ttl = ttl
+        self._conversations: "OrderedDict[Tuple[str, uuid.UUID], Conversation]" = OrderedDict()
+        conversations_gauge.set_function(lambda: len(self._conversations))
+
+    @classmethod
+    def from_env(cls) -> "ConversationStore":
+        return cls(
+            max_conversations=int(os.getenv("WS_MAX_CONVERSATIONS", "10000")),
+            max_messages=int(os.getenv("WS_MAX_MESSAGES", "200")),
+            ttl=float(os.getenv("WS_CONVERSATION_TTL_SECONDS", "3600")),
+        )
+
+    def __len__(self):
+        return len(self._conversations)
+
+    def get(self, config: str, session_id: uuid.UUID) -> Conversation | None:
+        key = (config, session_id)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return None
+        if time.monotonic() - conversation.last_used > self._ttl:
+            del self._conversations[key]
+            return None
+        conversation.last_used = time.monotonic()
+        self._conversations.move_to_end(key)
+        return conversation
+
+    def create(self, config: str, system_prompt: str) -> Conversation:
+        conversation = Conversation(uuid.uuid4(), [{"role": "system", "content": system_prompt}])
+        self._conversations[(config, conversation.session_id)] = conversation
+        self._evict()
+        return conversation
+
+    def append(self, conversation: Conversation, message: Dict):
+        """Add a message, dropping the oldest turns beyond max_messages."""
+        messages = conversation.messages
+        messages.append(message)
+        excess = len(messages) - 1 - self._max_messages
+        if excess > 0:
+            # Keep the system prompt and never open the history with an assistant reply
+            while excess < len(messages) - 1 and messages[1 + excess].get("role") == "assistant":
+                excess += 1
+            del messages[1:1 + excess]
+        conversation.last_used = time.monotonic()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._conversations:
+            key, conversation = next(iter(self._conversations.items()))
+            if len(self._conversations) <= self._max_conversations and now - conversation.last_used <= self._ttl:
+                break
+            del self._conversations[key]
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import signal
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+from loguru import logger
+
+from app.services.metrics import registry
+
+in_flight_gauge = registry.gauge("requests_in_flight", "HTTP requests and WebSocket connections in progress")
+draining_gauge = registry.gauge("draining", "1 while the server is draining before a restart")
+
+# Close code for "service restart", so WebSocket clients reconnect to another worker
+WS_SERVICE_RESTART = 1012
+
+
+class DrainController:
+    """
+    Tracks in-flight requests and drains the server before a restart.
+
+    Once start() is called, new requests are refused with 503, Retry-After and
+    Connection: close, so a load balancer sends them to another worker, and
+    /health reports "draining". Requests already running, including SSE
+    streams, are left to finish until the deadline; any still running then are
+    cancelled. WebSocket connections are closed with 1012 as soon as they are
+    idle between turns. When nothing is left in flight the on_drained callbacks
+    run (flushing loggers and closing pools) and the state becomes "drained";
+    with exit the process then sends itself SIGTERM, so the server shuts down
+    and the process manager starts the new version.
+    """
+
+    def __init__(self, deadline: float = 30.0, retry_after: int = 5):
+        self.default_deadline = deadline
+        self.retry_after = retry_after
+        self.state = "serving"
+        self._tasks: Set[asyncio.Task] = set()
+        self._callbacks: List[Callable[[], Awaitable]] = []
+        self._idle: asyncio.Event | None = None
+        self._started: asyncio.Event | None = None
+        self._drain_task: asyncio.Task | None = None
+        self._doomed: Set[asyncio.Task] = set()
+        self.started_at: float | None = None
+        self.deadline_at: float | None = None
+        self.finished_at: float | None = None
+        self.in_flight_at_start = 0
+        self.cancelled = 0
+        in_flight_gauge.set_function(lambda: len(self._tasks))
+        draining_gauge.set_function(lambda: 0 if self.state == "serving" else 1)
+
+    @classmethod
+    def from_env(cls) -> "DrainController":
+        return cls(
+            deadline=float(os.getenv("DRAIN_DEADLINE_SECONDS", "30")),
+            retry_after=int(os.getenv("DRAIN_RETRY_AFTER_SECONDS", "5")),
+        )
+
+    @property
+    def draining(self) -> bool:
+        return self.state != "serving"
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def on_drained(self, callback: Callable[[], Awaitable]):
+        """Run callback once no request is left in flight."""
+        self._callbacks.append(callback)
+
+    def start(self, deadline: float | None = None, exit: bool = False) -> Dict:
+        """Begin draining; a second call only reports progress."""
+        if not self.draining:
+            deadline = self.default_deadline if deadline is None else deadline
+            self.state = "draining"
+            self.started_at = time.time()
+            self.deadline_at = self.started_at + deadline
+            self.in_flight_at_start = len(self._tasks)
+            self._started_event().set()
+            logger.info(f"Draining {self.in_flight_at_start} in-flight requests, deadline {deadline:g}s")
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain(deadline, exit))
+        return self.status()
+
+    def status(self) -> Dict:
+        now = time.time()
+        return {
+            "state": self.state,
+            "in_flight": len(self._tasks),
+            "in_flight_at_start": self.in_flight_at_start,
+            "cancelled": self.cancelled,
+            "elapsed_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "deadline_remaining_seconds": max(0.0, round(self.deadline_at - now, 3))
+            if self.deadline_at and self.state == "draining" else None,
+        }
+
+    def install_signal_handler(self, signum: int = getattr(signal, "SIGUSR1", 0)):
+        """Drain and exit on signum (SIGUSR1 by default), where the platform has it."""
+        if not signum:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, lambda: self.start(exit=True))
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not on the main thread, or no signal support (Windows)
+            logger.warning("Drain signal handler not installed; use POST /admin/drain")
+
+    async def track(self, call: Callable[[], Awaitable]):
+        """Run call as an in-flight request; cancelled at the drain deadline."""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await call()
+        except asyncio.CancelledError:
+            if task not in self._doomed:
+                raise
+            # Cut by the drain deadline; the server itself is not shutting down yet
+            task.uncancel()
+        finally:
+            self._tasks.discard(task)
+            if not self._tasks and self._idle is not None:
+                self._idle.set()
+
+    async def wait_started(self):
+        await self._started_event().wait()
+
+    async def _drain(self, deadline: float, exit: bool):
+        if self._tasks:
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=deadline)
+            except TimeoutError:
+                self._doomed = set(self._tasks)
+                self.cancelled = len(self._doomed)
+                logger.warning(f"Drain deadline passed, cancelling {self.cancelled} requests")
+                for task in self._doomed:
+                    task.cancel()
+                await self._idle.wait()
+
+        self.state = "flushing"
+        for callback in self._callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Drain cleanup failed: {e!r}")
+        self.state = "drained"
+        self.finished_at = time.time()
+        logger.info(f"Drained in {self.finished_at - self.started_at:.1f}s, {self.cancelled} requests cancelled")
+        if exit:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def _started_event(self) -> asyncio.Event:
+        if self._started is None:
+            self._started = asyncio.Event()
+        return self._started
+
+
+class DrainMiddleware:
+    """
+    ASGI middleware counting in-flight requests for the DrainController and
+    refusing new ones while it drains. Paths starting with one of `exempt`
+    (health checks, metrics, admin) are always served and not counted, so
+    drain progress can be polled.
+    """
+
+    def __init__(self, app, controller: DrainController, exempt=("/health", "/metrics", "/admin/")):
+        self.app = app
+        self.controller = controller
+        self.exempt = tuple(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        if self.controller.draining:
+            await self._refuse(scope, send)
+            return
+
+        if scope["type"] == "websocket":
+            receive = self._closing_when_draining(receive, send)
+        await self.controller.track(lambda: self.app(scope, receive, send))
+
+    async def _refuse(self, scope, send):
+        if scope["type"] == "websocket":
+            # Before the handshake is accepted this rejects the connection
+            await send({"type": "websocket.close", "code": WS_SERVICE_RESTART, "reason": "Server restarting"})
+            return
+        body = json.dumps({"detail": "Server is restarting, retry shortly"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(self.controller.retry_after).encode("latin-1")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _closing_when_draining(self, receive, send):
+        """
+        Wrap a WebSocket's receive so that a connection waiting for the client's
+        next message is closed with 1012 once draining starts. A turn already
+        streaming is left to finish, as its handler only receives between turns.
+        """
+        controller = self.controller
+
+        async def receive_or_close():
+            if not controller.draining:
+                receiving = asyncio.ensure_future(receive())
+                started = asyncio.ensure_future(controller.wait_started())
+                done, _ = await asyncio.wait({receiving, started}, return_when=asyncio.FIRST_COMPLETED)
+                if receiving in done:
+                    started.cancel()
+                    return receiving.result()
+                receiving.cancel()
+            await send({"type": "websocket.close", "code": WS_SERVICE_RESTART, "reason": "Server restarting"})
+            return {"type": "websocket.disconnect", "code": WS_SERVICE_RESTART}
+
+        return receive_or_close
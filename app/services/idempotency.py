@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+from app.services.metrics import registry
+
+idempotency_requests = registry.counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key by outcome: miss (ran upstream), attached (joined an "
+    "in-flight request), replayed (served a stored result), conflict (key reused for another body) "
+    "or untracked (ran without deduplication, too many keys in flight)",
+    ("config", "outcome"),
+)
+idempotency_entries = registry.gauge("idempotency_entries", "Results held by the idempotency store")
+idempotency_bytes = registry.gauge("idempotency_bytes", "Approximate bytes held by the idempotency store")
+
+# Ends a retry's stream when the request it was attached to failed after part of it was sent
+STREAM_FAILED = b'data: {"error": {"code": 502, "message": "The original request failed mid-stream, retry"}}\n\n'
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+def fingerprint(body: bytes | str) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+class _Entry:
+    """One request's outcome: a JSON result or the chunks of a streamed response."""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.finished = False
+        self.failed = False
+        self.value: Any = None
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        self._notify()
+
+    def finish(self, failed: bool = False):
+        self.finished = True
+        self.failed = failed
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        while not self.finished:
+            await self._changed.wait()
+
+    async def follow(self) -> AsyncIterator[bytes]:
+        """Replay the recorded chunks, then the rest as they arrive. Stops when the entry fails."""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks) and not self.failed:
+                yield self.chunks[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+
+class IdempotencyStore:
+    """
+    Results of requests sent with an Idempotency-Key, so client retries do
+    not reach the upstream (or the logs) twice.
+
+    The first request with a key runs; a retry arriving while it is in flight
+    attaches to it, and a later retry gets the stored result, or a replay of
+    the stored stream. The same key with a different request body is a
+    conflict. Finished entries expire after ttl seconds and the oldest are
+    evicted beyond max_entries or max_bytes; results larger than
+    max_entry_bytes are not kept. max_bytes also counts the chunks of streams
+    still being recorded, so it bounds the whole store. A failed request is
+    forgotten so that its retry runs again; a retry attached to it runs the
+    request itself, or, when part of the failed stream was already sent, ends
+    with an error event. A stream stops being recorded once it outgrows
+    max_entry_bytes, or max_bytes with every finished entry evicted, which
+    fails its attached retries the same way. Beyond max_inflight keys in
+    flight, new keys run without deduplication.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 << 20,
+                 max_entry_bytes: int = 1 << 20, ttl: float = 600.0, max_inflight: int = 1000):
+        self._max_entries = max_entries
+        self._max_inflight = max_inflight
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes
+        self._ttl = ttl
+        # Finished entries, oldest first; in-flight ones are never evicted
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], _Entry] = {}
+        # Finished entries plus recorded in-flight chunks; the owner of an in-flight
+        # entry gives its bytes back when it finishes or fails
+        self._bytes = 0
+        idempotency_entries.set_function(lambda: len(self._entries))
+        idempotency_bytes.set_function(lambda: self._bytes)
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        return cls(
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(64 << 20))),
+            max_entry_bytes=int(os.getenv("IDEMPOTENCY_MAX_ENTRY_BYTES", str(1 << 20))),
+            ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600")),
+            max_inflight=int(os.getenv("IDEMPOTENCY_MAX_INFLIGHT", "1000")),
+        )
+
+    def __len__(self):
+        return len(self._entries) + len(self._inflight)
+
+    def claim(self, config: str, key: str, request_fingerprint: str) -> Tuple[_Entry | None, bool]:
+        """
+        Return the entry for the key and whether the caller owns it (must run
+        the request) or should use its result. The entry is None when too
+        many keys are in flight; the caller runs the request untracked.
+        """
+        entry_key = (config, key)
+        entry = self._inflight.get(entry_key) or self._entries.get(entry_key)
+        if entry is not None and time.monotonic() - entry.created > self._ttl:
+            # Expired, or in flight for so long that its owner is presumed gone
+            self._discard(entry_key, entry)
+            entry = None
+        if entry is None:
+            if len(self._inflight) >= self._max_inflight:
+                idempotency_requests.inc(config=config, outcome="untracked")
+                return None, True
+            entry = self._inflight[entry_key] = _Entry(request_fingerprint)
+            idempotency_requests.inc(config=config, outcome="miss")
+            return entry, True
+        if entry.fingerprint != request_fingerprint:
+            idempotency_requests.inc(config=config, outcome="conflict")
+            raise IdempotencyConflict(key)
+        idempotency_requests.inc(config=config, outcome="replayed" if entry.finished else "attached")
+        return entry, False
+
+    async def result(self, config: str, key: str, request_fingerprint: str,
+                     compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run compute once per key. Returns the result and whether it was reused."""
+        while True:
+            entry, owner = self.claim(config, key, request_fingerprint)
+            if entry is None:
+                return await compute(), False
+            if not owner:
+                await entry.wait()
+                if entry.failed:
+                    continue
+                return entry.value, True
+            try:
+                value = await compute()
+            except BaseException:
+                self._fail(config, key, entry)
+                raise
+            entry.value = value
+            entry.size = len(json.dumps(value, default=str))
+            self._bytes += entry.size
+            self._finish(config, key, entry)
+            return value, False
+
+    def stream(self, config: str, key: str, request_fingerprint: str,
+               produce: Callable[[], AsyncIterator[bytes]]) -> Tuple[AsyncIterator[bytes], bool]:
+        """Stream produce() once per key. Returns the chunks and whether they are a replay."""
+        entry, owner = self.claim(config, key, request_fingerprint)
+        if entry is None:
+            return produce(), False
+        if not owner:
+            return self._follow(config, key, request_fingerprint, entry, produce), True
+        return self._record(config, key, entry, produce()), False
+
+    async def _follow(self, config: str, key: str, request_fingerprint: str, entry: _Entry,
+                      produce: Callable[[], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+        sent = False
+        while True:
+            async for chunk in entry.follow():
+                sent = True
+                yield chunk
+            if not entry.failed:
+                return
+            if sent:
+                # The rest of a fresh completion would not continue what was sent
+                yield STREAM_FAILED
+                return
+            # Nothing sent yet: run it as the next owner, or attach to whoever claimed it first
+            entry, owner = self.claim(config, key, request_fingerprint)
+            if entry is None or owner:
+                chunks = produce() if entry is None else self._record(config, key, entry, produce())
+                async for chunk in chunks:
+                    yield chunk
+                return
+
+    async def _record(self, config: str, key: str, entry: _Entry, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        recording = True
+        try:
+            async for chunk in chunks:
+                if recording and not self._charge(entry, len(chunk)):
+                    # Too large to keep: stop buffering and let retries run on their own
+                    recording = False
+                    self._fail(config, key, entry)
+                if recording:
+                    entry.append(chunk)
+                yield chunk
+        except BaseException:
+            # Includes the client going away mid-stream; a retry starts over
+            if recording:
+                self._fail(config, key, entry)
+            raise
+        if recording:
+            self._finish(config, key, entry)
+
+    def _charge(self, entry: _Entry, size: int) -> bool:
+        """Count size more recorded bytes for an in-flight entry, False when there is no room for them."""
+        if entry.size + size > self._max_entry_bytes:
+            return False
+        self._bytes += size
+        self._shrink()
+        if self._bytes > self._max_bytes:
+            self._bytes -= size
+            return False
+        return True
+
+    def _finish(self, config: str, key: str, entry: _Entry):
+        entry.finish()
+        entry_key = (config, key)
+        if self._inflight.get(entry_key) is not entry:
+            # Discarded while in flight
+            self._bytes -= entry.size
+            return
+        del self._inflight[entry_key]
+        if entry.size > self._max_entry_bytes:
+            self._bytes -= entry.size
+            return
+        self._entries[entry_key] = entry
+        self._shrink()
+
+    def _fail(self, config: str, key: str, entry: _Entry):
+        entry.finish(failed=True)
+        if self._inflight.get((config, key)) is entry:
+            del self._inflight[(config, key)]
+        self._bytes -= entry.size
+        entry.size = 0
+        entry.chunks = []
+
+    def _discard(self, entry_key: Tuple[str, str], entry: _Entry):
+        if self._inflight.get(entry_key) is entry:
+            # Its bytes are returned by the owner
+            del self._inflight[entry_key]
+        elif self._entries.get(entry_key) is entry:
+            del self._entries[entry_key]
+            self._bytes -= entry.size
+
+    def _shrink(self):
+        now = time.monotonic()
+        while self._entries:
+            entry_key, entry = next(iter(self._entries.items()))
+            over = len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+            if not over and now - entry.created <= self._ttl:
+                break
+            self._discard(entry_key, entry)
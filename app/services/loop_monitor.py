@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple
+
+from loguru import logger
+
+from app.services.metrics import registry
+from app.services.sampling_profiler import NO_REQUEST, format_stack, running_request
+
+lag_gauge = registry.gauge("event_loop_lag_seconds", "How late the event loop ran its last heartbeat")
+blocked_counter = registry.counter(
+    "event_loop_blocked_total", "Stalls of the event loop longer than the threshold, by configuration", ("config",)
+)
+blocked_seconds = registry.counter(
+    "event_loop_blocked_seconds_total", "Time the event loop spent stalled, by configuration", ("config",)
+)
+
+# Innermost frames of a stall's stack written to the log
+LOGGED_FRAMES = 15
+# Stalls that ended before the watchdog looked at the loop
+NOT_CAPTURED = "(not captured)"
+
+
+class Stall(NamedTuple):
+    at: float
+    duration: float
+    config: str
+    stack: List[str]
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag and catches callbacks that block the loop.
+
+    A heartbeat task sleeps for `interval` and records how much later than
+    asked it woke up: that lag is how long any other callback waited for
+    the loop. A daemon thread watches the heartbeat; once it is `threshold`
+    overdue the loop is stuck in a callback, so the thread reads the loop
+    thread's stack with sys._current_frames() and the configuration of the
+    task running it (from the context ProfilerMiddleware sets). When the
+    loop comes back the stall is logged with that stack, counted per
+    configuration and kept in a short history for /admin/loop.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, history: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls: Deque[Stall] = deque(maxlen=history)
+        self._beat = time.monotonic()
+        # (heartbeat it belongs to, configuration, stack) captured by the watchdog
+        self._capture: tuple | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        lag_gauge.set_function(lambda: self.lag)
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        """LOOP_BLOCK_THRESHOLD_MS (0 disables) and LOOP_MONITOR_INTERVAL_MS."""
+        return cls(
+            threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000,
+            interval=float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50")) / 1000,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start monitoring the running loop. Must be called from the loop's thread."""
+        if not self.enabled or self.active:
+            return
+        loop = asyncio.get_running_loop()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, args=(threading.get_ident(), loop), name="loop-monitor", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def status(self) -> Dict:
+        return {
+            "active": self.active,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "lag_ms": round(self.lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "stalls": [
+                {"at": stall.at, "duration_ms": round(stall.duration * 1000, 1),
+                 "config": stall.config, "stack": stall.stack}
+                for stall in reversed(self.stalls)
+            ],
+        }
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+            beat, self._beat = self._beat, now
+            if self.lag >= self.threshold:
+                self._record(beat, self.lag)
+
+    def _record(self, beat: float, duration: float):
+        capture = self._capture
+        if capture is not None and capture[0] == beat:
+            _, config, stack = capture
+        else:
+            # Stalled and recovered between two watchdog checks
+            config, stack = NOT_CAPTURED, []
+        stall = Stall(time.time() - duration, duration, config, stack)
+        self.stalls.append(stall)
+        blocked_counter.inc(config=config)
+        blocked_seconds.inc(duration, config=config)
+        frames = "\n  ".join(stack[-LOGGED_FRAMES:]) or NOT_CAPTURED
+        logger.warning(f"Event loop blocked for {duration * 1000:.0f} ms ({config}), innermost frame last:\n  {frames}")
+
+    def _watch(self, thread_id: int, loop: asyncio.AbstractEventLoop):
+        check = max(0.005, self.threshold / 4)
+        while not self._stop.wait(check):
+            beat = self._beat
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            if self._capture is not None and self._capture[0] == beat:
+                # Already captured this stall
+                continue
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            request = running_request(loop)
+            self._capture = (beat, request.config if request else NO_REQUEST, format_stack(frame))
@@ -0,0 +1,97 @@
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator
+
+from app.models.logging_model import AIUsage, LoggingModel
+
+
+class RequestContext:
+    """
+    Per-request metadata shared between the middleware, the endpoint and the
+    wrapper: named phase timings for Server-Timing and the identifiers of the
+    log record written for the request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.request_id: uuid.UUID | None = None
+        self.session_id: uuid.UUID | None = None
+        self.user_id: str | None = None
+        self.cache: str | None = None
+        self.usage: AIUsage | None = None
+
+    def add_timing(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def record(self, log_data: LoggingModel):
+        """Keep the identifiers of the log record so the response can refer to it."""
+        self.request_id = log_data.request_id
+        self.session_id = log_data.session_id
+        self.user_id = log_data.user_id
+        self.cache = log_data.cache
+        self.usage = log_data.usage
+
+    def server_timing(self) -> str:
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings.items()]
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+current_request: ContextVar[RequestContext | None] = ContextVar("current_request", default=None)
+
+
+def add_timing(name: str, seconds: float):
+    """Add to a phase timing of the current request, if there is one."""
+    context = current_request.get()
+    if context is not None:
+        context.add_timing(name, seconds)
+
+
+def record_log(log_data: LoggingModel):
+    """Attach the log record's identifiers to the current request, if there is one."""
+    context = current_request.get()
+    if context is not None:
+        context.record(log_data)
+
+
+@contextmanager
+def timing(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a RequestContext and adds a
+    Server-Timing header with the phases recorded before the response starts
+    (for streamed responses, only those before the first byte).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        context = RequestContext()
+        token = current_request.set(context)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", context.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
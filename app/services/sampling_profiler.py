@@ -0,0 +1,189 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from types import CodeType, FrameType
+from typing import Dict, List, NamedTuple
+
+# Samples taken outside any request, e.g. background logger tasks
+NO_REQUEST = "(no request)"
+# An idle event loop waits in selectors.py; those samples are not counted
+_IDLE_FILENAME = "selectors.py"
+_labels: Dict[CodeType, str] = {}
+
+
+def frame_label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_qualname}"
+    return label
+
+
+def format_stack(frame: FrameType | None, limit: int = 200) -> List[str]:
+    """Frame labels from the outermost caller to the innermost frame."""
+    stack = []
+    while frame is not None and len(stack) < limit:
+        stack.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class ProfiledRequest(NamedTuple):
+    config: str
+    selected: bool
+
+
+# Set by ProfilerMiddleware; tasks a request spawns (e.g. a streaming body) inherit it
+profiled_request: ContextVar[ProfiledRequest | None] = ContextVar("profiled_request", default=None)
+
+
+def scope_config(scope: Dict) -> str:
+    """Configuration (the first path segment) a request was sent to."""
+    return scope.get("path", "/").strip("/").split("/", 1)[0] or "/"
+
+
+def running_request(loop: asyncio.AbstractEventLoop) -> ProfiledRequest | None:
+    """
+    The request whose task `loop` is running right now, read from another
+    thread through the task's context. None between tasks or outside requests.
+    """
+    task = asyncio.current_task(loop)
+    if task is None:
+        return None
+    return task.get_context().get(profiled_request)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the event loop thread.
+
+    While running, a daemon thread reads the loop thread's current stack
+    every `interval` seconds with sys._current_frames() and counts it per
+    configuration as a folded stack ("a;b;c"). Nothing is traced, so the
+    profiled code runs at full speed; while stopped the only cost is one
+    attribute check per request in ProfilerMiddleware. With fraction < 1
+    only a random share of requests is selected and other samples are
+    dropped. Idle samples (the loop waiting in select) are skipped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.active = False
+        self.fraction = 1.0
+        self.interval = 0.005
+        self.samples = 0
+        self.idle_samples = 0
+        self.started: float | None = None
+        self.stopped: float | None = None
+        self._stacks: Dict[str, Counter] = defaultdict(Counter)
+
+    def select(self) -> bool:
+        """Whether the request starting now should be profiled."""
+        return self.active and (self.fraction >= 1.0 or random.random() < self.fraction)
+
+    def start(self, duration: float, fraction: float = 1.0, interval: float = 0.005):
+        """
+        Profile the running event loop for `duration` seconds. Must be called
+        from the loop's thread. Results of the previous run are discarded.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Profiler is already running")
+            self._stacks = defaultdict(Counter)
+            self.samples = self.idle_samples = 0
+            self.fraction = fraction
+            self.interval = interval
+            self.started, self.stopped = time.time(), None
+            self._stop.clear()
+            self.active = True
+            self._thread = threading.Thread(
+                target=self._run, args=(threading.get_ident(), loop, duration),
+                name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def status(self) -> Dict:
+        return {
+            "active": self.active, "fraction": self.fraction, "interval_ms": self.interval * 1000,
+            "samples": self.samples, "idle_samples": self.idle_samples,
+            "started": self.started, "stopped": self.stopped,
+            "configs": {config: sum(stacks.values()) for config, stacks in self._stacks.items()},
+        }
+
+    def folded(self, config: str | None = None) -> str:
+        """
+        Folded stacks ("frame;frame;frame count" per line) for flamegraph.pl or
+        speedscope. Without a config every stack is rooted at its configuration.
+        """
+        with self._lock:
+            stacks = {name: Counter(counts) for name, counts in self._stacks.items()}
+        lines = []
+        for name in sorted(stacks):
+            if config is not None and name != config:
+                continue
+            for stack, count in stacks[name].most_common():
+                lines.append(f"{stack if config is not None else name + ';' + stack} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def _run(self, thread_id: int, loop: asyncio.AbstractEventLoop, duration: float):
+        deadline = time.monotonic() + duration
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+                self._sample(thread_id, loop)
+        finally:
+            self.active = False
+            self.stopped = time.time()
+
+    def _sample(self, thread_id: int, loop: asyncio.AbstractEventLoop):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return
+        if frame.f_code.co_filename.endswith(_IDLE_FILENAME):
+            self.idle_samples += 1
+            return
+        request = running_request(loop)
+        if request is None and self.fraction < 1.0:
+            return
+        if request is not None and not request.selected:
+            return
+        stack = ";".join(format_stack(frame))
+        with self._lock:
+            self._stacks[request.config if request else NO_REQUEST][stack] += 1
+            self.samples += 1
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware tagging each request's context with its configuration and
+    whether it was selected for profiling, so the sampler can attribute
+    samples. While the profiler is stopped it only checks a flag, unless
+    always is set (the loop monitor attributes stalls the same way).
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, always: bool = False):
+        self.app = app
+        self.profiler = profiler
+        self.always = always
+
+    async def __call__(self, scope, receive, send):
+        if not (self.always or self.profiler.active) or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = profiled_request.set(ProfiledRequest(scope_config(scope), self.profiler.select()))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiled_request.reset(token)
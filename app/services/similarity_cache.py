@@ -0,0 +1,168 @@
+import heapq
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, NamedTuple, Tuple
+
+_MASK = (1 << 61) - 1
+_EMPTY = 1 << 62
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?.!]+$")
+# Code in a prompt: backticks, brackets and operators. Prompts that differ by one
+# of these characters can look near-identical while needing different answers.
+_CODE = re.compile(r"[`()\[\]{}<>=+*/%&|^~]|!=|--|-[=>]|\w-\d|\s-\s")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing question marks, periods and exclamation marks."""
+    return _TRAILING.sub("", _SPACES.sub(" ", text.lower()).strip())
+
+
+def cacheable(text: str) -> bool:
+    """Whether a prompt may be matched approximately; prompts containing code are not."""
+    return _CODE.search(text) is None
+
+
+def shingles(text: str, size: int) -> set:
+    """Character shingles of the normalized text; short texts become a single shingle."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class _Entry(NamedTuple):
+    context: int
+    signature: Tuple[int, ...]
+    bands: Tuple[int, ...]
+    value: Any
+    created: float
+
+
+class SimilarityCache:
+    """
+    Near-duplicate response cache using MinHash signatures and LSH banding.
+
+    The last user message is normalized and shingled, and its MinHash
+    signature is computed with one-permutation hashing: every shingle is
+    hashed once and the hash picks a bin and a value, keeping the minimum per
+    bin; empty bins borrow from the next filled bin. That costs one hash per
+    shingle instead of one per shingle and permutation. The signature is split
+    into bands, and each band is hashed into a bucket. A lookup only
+    considers entries sharing a bucket (and the same preceding conversation),
+    fully scores the `candidates` sharing the most buckets, and serves the
+    best one whose estimated Jaccard similarity reaches the threshold. Shared
+    boilerplate collides in a few bands only, while a near-duplicate matches
+    most of them, so the ranking is cheap and rarely discards the right
+    entry. Each bucket only remembers its
+    bucket_size most recent entries, so a burst of near-identical questions
+    cannot make lookups scan thousands of candidates. Entries are evicted
+    least recently used beyond max_entries and expire after ttl seconds.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 10000, num_perm: int = 64,
+                 bands: int = 16, shingle_size: int = 4, ttl: float | None = None, bucket_size: int = 32,
+                 candidates: int = 8):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._num_perm = num_perm
+        self._bands = bands
+        self._rows = num_perm // bands
+        self._shingle_size = shingle_size
+        self._ttl = ttl
+        self._bucket_size = bucket_size
+        self._candidates = candidates
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[int, Deque[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        num_perm = self._num_perm
+        bins = [_EMPTY] * num_perm
+        for shingle in shingles(normalize(text), self._shingle_size):
+            value, bin_index = divmod(hash(shingle) & _MASK, num_perm)
+            if value < bins[bin_index]:
+                bins[bin_index] = value
+        if _EMPTY in bins:
+            # Rotation densification: an empty bin takes the next filled bin's value (wrapping
+            # around), offset by the distance. One right-to-left pass over two laps finds it.
+            original = bins[:]
+            nearest_index = nearest_value = None
+            for j in range(2 * num_perm - 1, -1, -1):
+                i = j % num_perm
+                if original[i] != _EMPTY:
+                    nearest_index, nearest_value = j, original[i]
+                elif j < num_perm:
+                    bins[i] = _EMPTY + (nearest_index - j) * _MASK + nearest_value
+        return tuple(bins)
+
+    def lookup(self, context: int, text: str) -> Any | None:
+        """Return the cached value for a near-duplicate of text under the same context, or None."""
+        signature = self.signature(text)
+        collisions: Dict[int, int] = {}
+        for bucket in self._band_keys(context, signature):
+            for entry_id in self._buckets.get(bucket, ()):
+                collisions[entry_id] = collisions.get(entry_id, 0) + 1
+
+        best_id = None
+        best_score = self._threshold
+        now = time.monotonic()
+        for entry_id in heapq.nlargest(self._candidates, collisions, key=collisions.__getitem__):
+            entry = self._entries[entry_id]
+            if self._ttl is not None and now - entry.created > self._ttl:
+                # Expired candidates are dropped, so a valid one further down can still match
+                self._evict(entry_id)
+                continue
+            if entry.context != context:
+                continue
+            score = sum(x == y for x, y in zip(signature, entry.signature)) / self._num_perm
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        return self._entries[best_id].value
+
+    def store(self, context: int, text: str, value: Any):
+        signature = self.signature(text)
+        bands = self._band_keys(context, signature)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(context, signature, bands, value, time.monotonic())
+        for bucket in bands:
+            members = self._buckets.get(bucket)
+            if members is None:
+                members = self._buckets[bucket] = deque(maxlen=self._bucket_size)
+            members.append(entry_id)
+        while len(self._entries) > self._max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _band_keys(self, context: int, signature: Tuple[int, ...]) -> Tuple[int, ...]:
+        rows = self._rows
+        return tuple(hash((context, band, signature[band * rows:(band + 1) * rows])) for band in range(self._bands))
+
+    def _evict(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for bucket in entry.bands:
+            members = self._buckets.get(bucket)
+            if members is None:
+                continue
+            try:
+                members.remove(entry_id)
+            except ValueError:
+                # Already pushed out of a full bucket
+                continue
+            if not members:
+                del self._buckets[bucket]
@@ -0,0 +1,70 @@
+import asyncio
+from typing import AsyncIterator
+
+_END = object()
+
+
+async def coalesce_events(events: AsyncIterator[str | bytes], max_bytes: int = 16384,
+                          max_delay: float = 0.02, queue_size: int = 256) -> AsyncIterator[bytes]:
+    """
+    Batch complete SSE events into fewer, larger writes.
+
+    Every item of `events` must be one whole event ending in a blank line
+    ("data: {...}\\n\\n"), so concatenating them is still a valid event stream
+    and clients parse it exactly as before. A batch is written once it
+    reaches max_bytes, or max_delay seconds after its first event, whichever
+    comes first; the last batch is written as soon as the source ends.
+
+    The source is consumed by its own task so that a slow or idle upstream
+    cannot hold back a batch past its deadline.
+    """
+    queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event.encode("utf-8") if isinstance(event, str) else event)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_END)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    batch = bytearray()
+    deadline = 0.0
+    try:
+        while True:
+            if batch:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await queue.get()
+                except TimeoutError:
+                    yield bytes(batch)
+                    batch.clear()
+                    continue
+            else:
+                item = await queue.get()
+
+            # Take everything that is already waiting without going back to the loop
+            while True:
+                if item is _END:
+                    if batch:
+                        yield bytes(batch)
+                    return
+                if isinstance(item, Exception):
+                    if batch:
+                        yield bytes(batch)
+                    raise item
+                if not batch:
+                    deadline = loop.time() + max_delay
+                batch += item
+                if len(batch) >= max_bytes or loop.time() >= deadline:
+                    yield bytes(batch)
+                    batch.clear()
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+    finally:
+        producer.cancel()
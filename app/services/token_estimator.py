@@ -0,0 +1,74 @@
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+# Chat formats add a few tokens per message for the role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=16384)
+def estimate_text_tokens(text: str) -> int:
+    """
+    Fast approximate token count for BPE tokenizers.
+
+    Takes the larger of ~4 characters per token and word/punctuation pieces,
+    which tracks real tokenizers closely enough for budgeting while costing a
+    single regex pass. Results are memoized, so a conversation history that is
+    re-sent every turn is only counted once.
+    """
+    return max(len(text) // 4, len(_WORD.findall(text)))
+
+
+def estimate_message_tokens(message: Dict) -> int:
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = str(content)
+    return estimate_text_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def trim_messages(messages: List[Dict], max_tokens: int) -> tuple[List[Dict], int]:
+    """
+    Drop the oldest turns until the estimated prompt fits in max_tokens.
+
+    System messages and the latest user message are always kept, and the
+    kept history never starts with an assistant reply. If those alone exceed
+    the budget they are sent anyway.
+
+    Args:
+        messages: List of message dictionaries, system prompt already applied
+        max_tokens: Token budget for the prompt
+
+    Returns:
+        The trimmed messages and the estimated number of tokens dropped
+    """
+    counts = [estimate_message_tokens(message) for message in messages]
+    total = sum(counts)
+    if total <= max_tokens:
+        return messages, 0
+
+    last_user = max((i for i, message in enumerate(messages) if message.get("role") == "user"), default=len(messages) - 1)
+    drop = set()
+    for i, message in enumerate(messages):
+        if total <= max_tokens or i >= last_user:
+            break
+        if message.get("role") == "system":
+            continue
+        drop.add(i)
+        total -= counts[i]
+
+    # Don't open the remaining history with an orphaned assistant reply
+    for i in range(len(messages)):
+        if i in drop or messages[i].get("role") == "system":
+            continue
+        if messages[i].get("role") != "assistant" or i >= last_user:
+            break
+        drop.add(i)
+
+    trimmed = [message for i, message in enumerate(messages) if i not in drop]
+    return trimmed, sum(counts[i] for i in drop)
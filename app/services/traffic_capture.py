@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+from app.models.chat_request_model import ChatRequest
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+_DIGITS = "0123456789"
+
+
+def anonymize(text: str, key: bytes) -> str:
+    """
+    Replace every word with a keyed pseudo-word of the same length.
+
+    Whitespace, punctuation and word lengths are kept, so token estimates,
+    context trimming and the similarity cache behave as they did on the
+    original text, and the same word always maps to the same pseudo-word
+    within one capture. The key is never written out, so the mapping cannot
+    be reversed by hashing a dictionary.
+    """
+    def replace(match: re.Match) -> str:
+        word = match.group(0)
+        digest = hashlib.blake2b(word.lower().encode("utf-8"), key=key, digest_size=32).digest()
+        alphabet = _DIGITS if word.isdigit() else _LETTERS
+        return "".join(alphabet[digest[i % len(digest)] % len(alphabet)] for i in range(len(word)))
+
+    return _WORD.sub(replace, text)
+
+
+class TrafficRecorder:
+    """
+    Records anonymized chat requests with their arrival times for replay.
+
+    Every line is a ChatRequest body, so a capture can also be posted to
+    /{config}/batch as is, with an extra "capture" object holding the
+    configuration, a request id and the arrival offset in milliseconds since
+    the recorder started. Lines are buffered and appended off the event loop.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0, flush_lines: int = 100):
+        self._path = Path(path)
+        self._sample_rate = sample_rate
+        self._flush_lines = flush_lines
+        self._key = secrets.token_bytes(32)
+        self._started = time.monotonic()
+        self._pending: List[str] = []
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TrafficRecorder | None":
+        """Recorder configured by CAPTURE_PATH and CAPTURE_SAMPLE_RATE, or None when capture is off."""
+        path = os.getenv("CAPTURE_PATH")
+        if not path:
+            return None
+        return cls(path, float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0")))
+
+    async def record(self, config_name: str, request: ChatRequest):
+        if self._sample_rate < 1.0 and secrets.randbelow(1_000_000) >= self._sample_rate * 1_000_000:
+            return
+        body: Dict = request.model_dump(mode="json", exclude_none=True)
+        for message in body["messages"]:
+            message["content"] = anonymize(message["content"], self._key)
+        body["capture"] = {
+            "config": config_name,
+            "request_id": str(uuid.uuid4()),
+            "offset_ms": round((time.monotonic() - self._started) * 1000, 3),
+        }
+        self._pending.append(json.dumps(body))
+        if len(self._pending) >= self._flush_lines:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            lines, self._pending = self._pending, []
+            if lines:
+                await asyncio.to_thread(self._append, lines)
+
+    async def close(self):
+        await self.flush()
+
+    def _append(self, lines: List[str]):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path, "a", encoding="utf-8") as capture_file:
+            capture_file.write("\n".join(lines) + "\n")
@@ -0,0 +1,102 @@
+"""
+Minimal in-process ASGI client used by the profiling and load tools.
+
+It calls the application directly, without sockets or an HTTP client
+dependency, so measurements only include the app's own work.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, NamedTuple, Tuple
+
+
+class Response(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def _scope(method: str, path: str, headers: Dict[str, str] | None, query_string: str) -> Dict:
+    raw_headers: List[Tuple[bytes, bytes]] = [
+        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()
+    ]
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def stream(app, method: str, path: str, headers: Dict[str, str] | None = None,
+                 body: bytes = b"", query_string: str = "") -> AsyncIterator[Tuple[str, object]]:
+    """
+    Call the app and yield ("start", (status, headers)) followed by ("body", bytes)
+    for every body message the app sends, one item per ASGI send() call.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Block until the app finishes, as a connected client would
+        await asyncio.Event().wait()
+
+    async def send(message):
+        await queue.put(message)
+
+    task = asyncio.create_task(app(_scope(method, path, headers, query_string), receive, send))
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            await asyncio.wait([get, task], return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                task.result()
+                return
+            message = get.result()
+            if message["type"] == "http.response.start":
+                response_headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])}
+                yield "start", (message["status"], response_headers)
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    yield "body", message["body"]
+                if not message.get("more_body", False):
+                    return
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def request(app, method: str, path: str, headers: Dict[str, str] | None = None,
+                  body: bytes = b"", query_string: str = "") -> Response:
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    async for kind, value in stream(app, method, path, headers, body, query_string):
+        if kind == "start":
+            status, response_headers = value
+        else:
+            chunks.append(value)
+    return Response(status, response_headers, b"".join(chunks))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown handlers around the block."""
+    async with app.router.lifespan_context(app):
+        yield
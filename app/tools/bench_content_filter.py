@@ -0,0 +1,98 @@
+"""
+Per-chunk cost of the streaming content filter with a large blocklist.
+
+Builds an automaton from `--patterns` synthetic words and phrases, then
+feeds a synthetic response through a StreamFilter in token-sized chunks
+and reports the time per chunk. For comparison it times the naive approach
+of running one compiled regex per pattern over each chunk (plus the tail
+that a match could straddle) on a sample of the chunks:
+
+    python -m app.tools.bench_content_filter --patterns 5000 --chunks 200000
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from app.services.content_filter import ContentFilter, PatternMatcher
+
+
+def synthetic_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patterns", type=int, default=5000, help="Blocklist size")
+    parser.add_argument("--chunks", type=int, default=200000, help="Streamed chunks to filter")
+    parser.add_argument("--naive-chunks", type=int, default=2000, help="Chunks timed with one regex per pattern")
+    parser.add_argument("--match-rate", type=float, default=0.001, help="Share of response words that are blocked")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patterns = [
+        " ".join(synthetic_word(rng) for _ in range(rng.choice((1, 1, 1, 2))))
+        for _ in range(args.patterns)
+    ]
+    started = time.perf_counter()
+    matcher = PatternMatcher(patterns)
+    build = time.perf_counter() - started
+    content_filter = ContentFilter(matcher)
+
+    vocabulary = [synthetic_word(rng) for _ in range(2000)]
+    words = []
+    length = 0
+    while length < args.chunks * 4:
+        words.append(rng.choice(patterns) if rng.random() < args.match_rate else rng.choice(vocabulary))
+        length += len(words[-1]) + 1
+    text = " ".join(words)
+    chunks = []
+    position = 0
+    while position < len(text) and len(chunks) < args.chunks:
+        size = rng.randint(1, 7)
+        chunks.append(text[position:position + size])
+        position += size
+
+    stream = content_filter.stream()
+    timings = []
+    clock = time.perf_counter
+    total = clock()
+    for chunk in chunks:
+        started = clock()
+        stream.feed(chunk)
+        timings.append(clock() - started)
+    stream.flush()
+    total = clock() - total
+
+    longest = max(len(pattern) for pattern in patterns)
+    regexes = [re.compile(re.escape(pattern), re.IGNORECASE) for pattern in patterns]
+    naive = []
+    tail = ""
+    for chunk in chunks[:args.naive_chunks]:
+        window = tail + chunk
+        started = clock()
+        for regex in regexes:
+            regex.search(window)
+        naive.append(clock() - started)
+        tail = window[-longest:]
+
+    characters = sum(len(chunk) for chunk in chunks)
+    print(f"patterns {matcher.patterns}, automaton built in {build * 1000:.0f} ms")
+    print(f"chunks {len(chunks)}, {characters / len(chunks):.1f} chars each, {stream.matches} matches")
+    print(f"{'':>22} {'mean us':>9} {'p50 us':>8} {'p99 us':>8}")
+    print(f"{'automaton':>22} {total / len(chunks) * 1e6:>9.2f} {percentile(timings, 0.5) * 1e6:>8.2f} "
+          f"{percentile(timings, 0.99) * 1e6:>8.2f}")
+    print(f"{'regex per pattern':>22} {sum(naive) / len(naive) * 1e6:>9.2f} {percentile(naive, 0.5) * 1e6:>8.2f} "
+          f"{percentile(naive, 0.99) * 1e6:>8.2f}")
+    print(f"automaton throughput {characters / total / 1e6:.1f} M chars/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Throughput and upstream call count of the embeddings endpoint with and
+without micro-batching.
+
+Starts the stub upstream in a child process, then sends `--requests`
+single-input embedding requests through app.server2 in-process,
+`--concurrency` at a time, once per mode. Every input is distinct unless
+`--repeat` is above zero, so the cache only helps when asked to. Run from
+the folder holding .env:
+
+    python -m app.tools.bench_embeddings --requests 2000 --concurrency 64 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.tools import stub_upstream
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_mode(server, config_name: str, args, embeddings) -> dict:
+    from app.services.embedding_batcher import embedding_batches
+    from app.tools import asgi_client
+
+    config = server.configurations.configurations[config_name]
+    config.embeddings = embeddings
+    # The batcher is built with the wrapper, so start from a fresh one
+    provider = server.providers.pop(config_name, None)
+    if provider is not None:
+        await provider.close()
+
+    headers = {"Authorization": f"Bearer {config.api_key}", "Content-Type": "application/json"}
+    path = f"/{config_name}/embeddings"
+    rng = random.Random(args.seed)
+    texts = [
+        f"chunk {rng.randrange(args.requests // 10 + 1) if rng.random() < args.repeat else i} of the course notes"
+        for i in range(args.requests)
+    ]
+    queue = iter(texts)
+    latencies = []
+
+    async def worker():
+        for text in queue:
+            started = time.perf_counter()
+            response = await asgi_client.request(
+                server.app, "POST", path, headers, json.dumps({"input": text}).encode("utf-8")
+            )
+            assert response.status == 200, (response.status, response.body[:200])
+            latencies.append(time.perf_counter() - started)
+
+    calls = sum(value for labels, value in embedding_batches.samples() if labels == (config_name,))
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - wall
+    calls = sum(value for labels, value in embedding_batches.samples() if labels == (config_name,)) - calls
+    return {
+        "wall": wall, "calls": calls,
+        "p50": statistics.median(latencies), "p99": percentile(latencies, 0.99),
+    }
+
+
+async def bench(args):
+    import app.server2 as server
+    from app.models.ai_configuration_model import EmbeddingsModel
+    from app.tools import asgi_client
+
+    config = server.configurations.configurations[args.config]
+    config.logger_type = "path"
+    config.logger_params = {"path": tempfile.mkdtemp(prefix="bench_embeddings_logs_")}
+    if config.embeddings is None:
+        # Routes are registered at import for configurations with an embedding model only
+        config.embeddings = EmbeddingsModel(model="stub")
+        server.app.post(f"/{args.config}/embeddings")(server.create_embeddings_endpoint(args.config, config))
+
+    modes = [
+        ("unbatched", EmbeddingsModel(model="stub", max_batch_size=1, max_wait_ms=0, cache_entries=0)),
+        (f"{args.max_batch_size}/{args.max_wait_ms:g}ms",
+         EmbeddingsModel(model="stub", max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                         cache_entries=args.cache_entries)),
+    ]
+    async with asgi_client.lifespan(server.app):
+        print(f"{'batching':>12} {'upstream calls':>15} {'inputs/call':>12} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p99 ms':>8}")
+        for label, embeddings in modes:
+            result = await run_mode(server, args.config, args, embeddings)
+            print(f"{label:>12} {result['calls']:>15g} {args.requests / max(result['calls'], 1):>12.1f} "
+                  f"{args.requests / result['wall']:>9.0f} {result['p50'] * 1000:>8.1f} {result['p99'] * 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="demo1", help="Configuration to send requests to")
+    parser.add_argument("--requests", type=int, default=2000, help="Single-input requests per mode")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Upstream time per call")
+    parser.add_argument("--repeat", type=float, default=0.0, help="Share of inputs drawn from a small repeated set")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--cache-entries", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with stub_upstream.spawn(latency=args.latency_ms / 1000) as base_url:
+        os.environ["OPENROUTER_BASE_URL"] = base_url
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
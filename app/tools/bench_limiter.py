@@ -0,0 +1,101 @@
+"""
+Adaptive upstream concurrency limit against an upstream that degrades on
+demand.
+
+Starts the stub upstream in a child process and keeps `--clients`
+closed-loop clients sending non-streaming chat requests through
+app.server2 in-process. After a healthy phase the stub's capacity drops to
+`--capacity` concurrent requests (slower past it, 429 past twice it), then
+recovers. Every `--interval` seconds it prints the limit, load and the
+outcomes seen by clients; run once with `--static` to compare with no
+limiter. Run from the folder holding .env:
+
+    python -m app.tools.bench_limiter --clients 32 --capacity 8 --phase-seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from app.tools import stub_upstream
+
+
+async def bench(args, base_url: str):
+    import app.server2 as server
+    from app.tools import asgi_client
+
+    config = server.configurations.configurations[args.config]
+    config.logger_type = "path"
+    config.logger_params = {"path": tempfile.mkdtemp(prefix="bench_limiter_logs_")}
+    if args.static:
+        server.upstream_limiters = None
+    limiter = server.upstream_limiters.get(config.model) if not args.static else None
+
+    headers = {"Authorization": f"Bearer {config.api_key}", "Content-Type": "application/json"}
+    path = f"/{args.config}/chat/completions"
+    body = json.dumps({"model": "stub", "messages": [{"role": "user", "content": "Explain generators"}]}).encode()
+    outcomes: Counter = Counter()
+    latencies = []
+    stop = asyncio.Event()
+
+    async def client():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = await asgi_client.request(server.app, "POST", path, headers, body)
+                status = response.status
+            except Exception:
+                status = "error"
+            outcomes[status] += 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                await asyncio.sleep(0.05)
+
+    def report(phase: str, elapsed: float):
+        limit = limiter.status() if limiter else {"limit": "-", "in_flight": "-", "queued": "-"}
+        p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+        print(f"{elapsed:>6.1f} {phase:>9} {limit['limit']:>6} {limit['in_flight']:>9} {limit['queued']:>7} "
+              f"{outcomes[200]:>6} {outcomes[503]:>5} {outcomes[500] + outcomes['error']:>7} {p50:>8.0f}")
+        outcomes.clear()
+        latencies.clear()
+
+    phases = [("healthy", {"capacity": 0}), ("degraded", {"capacity": args.capacity}), ("recovered", {"capacity": 0})]
+    async with asgi_client.lifespan(server.app):
+        print(f"{'t':>6} {'phase':>9} {'limit':>6} {'in flight':>9} {'queued':>7} "
+              f"{'ok':>6} {'503':>5} {'failed':>7} {'p50 ms':>8}")
+        clients = [asyncio.create_task(client()) for _ in range(args.clients)]
+        started = time.monotonic()
+        for phase, settings in phases:
+            await asyncio.to_thread(stub_upstream.control, base_url, **settings)
+            phase_end = time.monotonic() + args.phase_seconds
+            while time.monotonic() < phase_end:
+                await asyncio.sleep(args.interval)
+                report(phase, time.monotonic() - started)
+        stop.set()
+        await asyncio.gather(*clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="demo1", help="Configuration to send requests to")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent closed-loop clients")
+    parser.add_argument("--capacity", type=int, default=8, help="Stub capacity while degraded")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Stub latency within capacity")
+    parser.add_argument("--phase-seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between report lines")
+    parser.add_argument("--static", action="store_true", help="Run without the adaptive limiter")
+    args = parser.parse_args()
+
+    os.environ.setdefault("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "2")
+    with stub_upstream.spawn(tokens=20, latency=args.latency_ms / 1000) as base_url:
+        os.environ["OPENROUTER_BASE_URL"] = base_url
+        asyncio.run(bench(args, base_url))
+
+
+if __name__ == "__main__":
+    main()
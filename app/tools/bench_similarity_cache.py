@@ -0,0 +1,82 @@
+"""
+Lookup latency of the similarity cache at a given index size.
+
+Fills the cache with synthetic questions, then times lookups of reworded
+versions of stored questions (hits) and of unseen questions (misses):
+
+    python -m app.tools.bench_similarity_cache --entries 100000 --lookups 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.services.similarity_cache import SimilarityCache
+
+TOPICS = ["list comprehension", "dictionary", "generator", "decorator", "class", "tuple", "lambda",
+          "for loop", "while loop", "recursion", "exception", "module", "set", "string", "file",
+          "iterator", "closure", "context manager", "type hint", "dataclass", "virtual environment"]
+TEMPLATES = ["what is a {topic} when {detail}", "how do i use a {topic} to {detail}",
+             "can you explain the {topic} where {detail}", "why does my {topic} fail if {detail}"]
+SYLLABLES = ["ka", "lo", "mi", "ter", "van", "qu", "sor", "pel", "dax", "ni", "bru", "zo", "fen", "gal", "ux", "rit"]
+REWORDINGS = [("what is", "Whats"), ("how do i", "How do I"), ("can you", "Can you"), ("why does", "Why does")]
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def question(rng: random.Random) -> str:
+    detail = " ".join(word(rng) for _ in range(rng.randint(3, 8)))
+    return rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS), detail=detail)
+
+
+def reword(text: str) -> str:
+    for old, new in REWORDINGS:
+        if text.startswith(old):
+            return new + text[len(old):] + "?"
+    return text.capitalize() + "?"
+
+
+def percentile(samples, fraction: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100000, help="Entries stored before timing")
+    parser.add_argument("--lookups", type=int, default=2000, help="Timed lookups per kind")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cache = SimilarityCache(threshold=args.threshold, max_entries=args.entries)
+    stored = []
+    started = time.perf_counter()
+    for n in range(args.entries):
+        text = question(rng)
+        cache.store(0, text, n)
+        stored.append((text, n))
+    print(f"filled {len(cache)} entries in {time.perf_counter() - started:.1f} s")
+
+    for kind in ("hit", "miss"):
+        samples = []
+        correct = 0
+        for _ in range(args.lookups):
+            if kind == "hit":
+                text, expected = rng.choice(stored)
+                text = reword(text)
+            else:
+                text, expected = question(rng), None
+            started = time.perf_counter()
+            value = cache.lookup(0, text)
+            samples.append((time.perf_counter() - started) * 1e6)
+            correct += value == expected
+        print(f"{kind:>5}: p50 {percentile(samples, 0.5):7.1f} us, p99 {percentile(samples, 0.99):7.1f} us, "
+              f"max {max(samples):7.1f} us, mean {statistics.mean(samples):7.1f} us, "
+              f"{correct}/{args.lookups} as expected")
+
+
+if __name__ == "__main__":
+    main()
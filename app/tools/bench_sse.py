@@ -0,0 +1,105 @@
+"""
+Downstream write count and CPU for streamed chat responses, with and without
+SSE coalescing.
+
+Starts the stub upstream in a child process, then runs `--streams`
+concurrent streaming requests through app.server2 in-process, once per
+mode. Every ASGI body message becomes one transport write (one send()
+syscall under uvicorn), so the write count is what coalescing reduces.
+Run from the folder holding .env:
+
+    python -m app.tools.bench_sse --streams 100 --tokens 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.tools import stub_upstream
+
+
+async def one_stream(app, path: str, api_key: str, body: bytes) -> tuple[int, int, int]:
+    from app.tools import asgi_client
+
+    writes = size = events = 0
+    tail = b""
+    async for kind, value in asgi_client.stream(
+        app, "POST", path, {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}, body
+    ):
+        if kind == "start":
+            assert value[0] == 200, value
+            continue
+        writes += 1
+        size += len(value)
+        # Count complete events the way an SSE client would see them
+        tail += value
+        *complete, tail = tail.split(b"\n\n")
+        events += sum(1 for event in complete if event.startswith(b"data: "))
+    assert not tail, "stream ended inside an event"
+    return writes, size, events
+
+
+async def run_mode(server, config_name: str, streams: int, coalesce) -> dict:
+    config = server.configurations.configurations[config_name]
+    config.sse_coalesce = coalesce
+    body = (b'{"model": "stub", "stream": true, '
+            b'"messages": [{"role": "user", "content": "Tell me about list comprehensions"}]}')
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    results = await asyncio.gather(*(
+        one_stream(server.app, f"/{config_name}/chat/completions", config.api_key, body) for _ in range(streams)
+    ))
+    return {
+        "cpu": time.process_time() - cpu,
+        "wall": time.perf_counter() - wall,
+        "writes": sum(r[0] for r in results),
+        "bytes": sum(r[1] for r in results),
+        "events": sum(r[2] for r in results),
+    }
+
+
+async def bench(args):
+    import app.server2 as server
+    from app.models.ai_configuration_model import SseCoalesceModel
+    from app.tools import asgi_client
+
+    config = server.configurations.configurations[args.config]
+    config.logger_type = "path"
+    config.logger_params = {"path": tempfile.mkdtemp(prefix="bench_sse_logs_")}
+
+    modes = [
+        ("off", None),
+        (f"{args.max_bytes}B/{args.max_delay_ms:g}ms",
+         SseCoalesceModel(max_bytes=args.max_bytes, max_delay_ms=args.max_delay_ms)),
+    ]
+    async with asgi_client.lifespan(server.app):
+        # One warm-up stream so imports and connection setup are not measured
+        await run_mode(server, args.config, 1, None)
+        print(f"{'coalescing':>14} {'writes':>9} {'per stream':>11} {'events':>8} {'MB':>7} "
+              f"{'cpu s':>7} {'cpu ms/stream':>14} {'wall s':>7}")
+        for label, coalesce in modes:
+            result = await run_mode(server, args.config, args.streams, coalesce)
+            print(f"{label:>14} {result['writes']:>9} {result['writes'] / args.streams:>11.1f} "
+                  f"{result['events']:>8} {result['bytes'] / 1e6:>7.2f} {result['cpu']:>7.2f} "
+                  f"{result['cpu'] * 1000 / args.streams:>14.2f} {result['wall']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="demo1", help="Configuration to stream through")
+    parser.add_argument("--streams", type=int, default=100, help="Concurrent streaming requests per mode")
+    parser.add_argument("--tokens", type=int, default=500, help="Upstream chunks per stream")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Upstream pause between chunks")
+    parser.add_argument("--max-bytes", type=int, default=16384)
+    parser.add_argument("--max-delay-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    with stub_upstream.spawn(args.tokens, args.token_delay_ms / 1000) as base_url:
+        os.environ["OPENROUTER_BASE_URL"] = base_url
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
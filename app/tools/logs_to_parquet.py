@@ -0,0 +1,87 @@
+"""
+Convert stored JSON logs into the partitioned Parquet layout used by ParquetLogger.
+
+Records are streamed one at a time and at most --max-buffered-rows rows are
+held across all partitions, so memory is bounded regardless of the size of the
+input or the number of endpoint and date partitions in it.
+
+    python -m app.tools.logs_to_parquet jsonfile applog.json parquet_logs
+    python -m app.tools.logs_to_parquet path logs parquet_logs --batch-size 5000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import ValidationError
+
+from app.loggers.parquetlogger import PartitionedParquetWriter, to_row, partition_of
+from app.models.logging_model import LoggingModel
+
+
+def iter_jsonfile(filespec: str) -> Iterator[str]:
+    with open(filespec, "r") as log_file:
+        for line in log_file:
+            if line.strip():
+                yield line
+
+
+def iter_path(path: str) -> Iterator[str]:
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                yield Path(entry.path).read_text()
+
+
+def convert(records: Iterator[str], writer: PartitionedParquetWriter) -> tuple[int, int]:
+    converted = 0
+    skipped = 0
+    for record in records:
+        try:
+            data = LoggingModel.model_validate_json(record)
+        except ValidationError:
+            skipped += 1
+            continue
+        row = to_row(data)
+        partition = partition_of(row, data.endpoint)
+        ready = writer.add(partition, row)
+        if ready is not None:
+            writer.write_row_group(ready)
+        converted += 1
+    writer.flush()
+    return converted, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", choices=["jsonfile", "path"], help="Logger type that wrote the input")
+    parser.add_argument("input", help="jsonfile filespec or path folder")
+    parser.add_argument("output", help="Root folder of the Parquet dataset")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per row group")
+    parser.add_argument("--rows-per-file", type=int, default=1_000_000, help="Rows per Parquet file")
+    parser.add_argument("--max-open-files", type=int, default=64, help="Partitions kept open at once")
+    parser.add_argument("--max-buffered-rows", type=int, default=100_000,
+                        help="Rows buffered across all partitions before the largest buffer is written")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    args = parser.parse_args()
+
+    records = iter_jsonfile(args.input) if args.source == "jsonfile" else iter_path(args.input)
+    writer = PartitionedParquetWriter(
+        args.output,
+        row_group_size=args.batch_size,
+        rows_per_file=args.rows_per_file,
+        max_open_files=args.max_open_files,
+        compression=args.compression,
+        max_buffered_rows=args.max_buffered_rows
+    )
+
+    started = time.perf_counter()
+    converted, skipped = convert(records, writer)
+    elapsed = time.perf_counter() - started
+    print(f"Converted {converted} records ({skipped} skipped) in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Replay captured traffic against app.server2 with a stub upstream.
+
+Record anonymized traffic by starting the server with CAPTURE_PATH set,
+then re-drive it in-process at its original arrival times divided by
+--speed. The upstream is the local stub, so only the wrapper's own latency
+is measured. Loggers are redirected to a temporary folder unless
+--keep-loggers is given. Run from the folder holding .env:
+
+    CAPTURE_PATH=captures/monday.jsonl uvicorn app.server2:app
+    python -m app.tools.replay captures/monday.jsonl --speed 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+from app.tools import stub_upstream
+
+
+class Captured(NamedTuple):
+    offset: float
+    config: str
+    body: bytes
+
+
+class Sample(NamedTuple):
+    config: str
+    status: int
+    first_byte: float
+    total: float
+    lag: float
+
+
+def load_capture(path: str, configs: List[str] | None, limit: int | None) -> List[Captured]:
+    captured = []
+    with open(path, "rb") as capture_file:
+        for line in capture_file:
+            if not line.strip():
+                continue
+            body = json.loads(line)
+            capture = body.get("capture", {})
+            if configs and capture.get("config") not in configs:
+                continue
+            captured.append(Captured(capture.get("offset_ms", 0) / 1000, capture.get("config"), line.strip()))
+    captured.sort(key=lambda request: request.offset)
+    return captured[:limit] if limit else captured
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def send(app, request: Captured, api_key: str, lag: float) -> Sample:
+    from app.tools import asgi_client
+
+    started = time.perf_counter()
+    status, first_byte = 0, None
+    async for kind, value in asgi_client.stream(
+        app, "POST", f"/{request.config}/chat/completions",
+        {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}, request.body
+    ):
+        if kind == "start":
+            status = value[0]
+        elif first_byte is None:
+            first_byte = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return Sample(request.config, status, first_byte if first_byte is not None else total, total, lag)
+
+
+async def replay(captured: List[Captured], speed: float, keep_loggers: bool) -> tuple[List[Sample], float]:
+    import app.server2 as server
+    from app.tools import asgi_client
+
+    configurations = server.configurations.configurations
+    if not keep_loggers:
+        log_path = tempfile.mkdtemp(prefix="replay_logs_")
+        for config in configurations.values():
+            config.logger_type = "path"
+            config.logger_params = {"path": log_path}
+
+    tasks = []
+    async with asgi_client.lifespan(server.app):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for request in captured:
+            config = configurations.get(request.config)
+            if config is None:
+                continue
+            due = started + request.offset / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(server.app, request, config.api_key, max(0.0, loop.time() - due))))
+        samples = await asyncio.gather(*tasks)
+        return samples, loop.time() - started
+
+
+def report(samples: List[Sample], captured: List[Captured], wall: float):
+    by_config: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_config[sample.config].append(sample)
+
+    print(f"{'config':>12} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'ttfb p50':>9} {'ttfb p99':>9}")
+    for config_name in sorted(by_config):
+        rows = by_config[config_name]
+        totals = [s.total * 1000 for s in rows]
+        first_bytes = [s.first_byte * 1000 for s in rows]
+        errors = sum(1 for s in rows if s.status != 200)
+        print(f"{config_name:>12} {len(rows):>9} {errors:>7} {percentile(totals, 0.5):>8.1f} "
+              f"{percentile(totals, 0.9):>8.1f} {percentile(totals, 0.99):>8.1f} {max(totals):>8.1f} "
+              f"{percentile(first_bytes, 0.5):>9.1f} {percentile(first_bytes, 0.99):>9.1f}")
+
+    skipped = len(captured) - len(samples)
+    lags = [s.lag * 1000 for s in samples]
+    print(f"\n{len(samples)} requests in {wall:.1f} s ({len(samples) / wall:.1f}/s), "
+          f"{skipped} skipped for unknown configurations")
+    if lags:
+        print(f"send lag behind schedule: p99 {percentile(lags, 0.99):.1f} ms, max {max(lags):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="JSONL file written with CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, e.g. 1, 10 or 100")
+    parser.add_argument("--config", action="append", help="Only replay these configurations (repeatable)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests")
+    parser.add_argument("--tokens", type=int, default=200, help="Stub upstream chunks per response")
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="Stub upstream pause between chunks")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Stub upstream time to first byte")
+    parser.add_argument("--keep-loggers", action="store_true", help="Log to the configured loggers")
+    args = parser.parse_args()
+
+    captured = load_capture(args.capture, args.config, args.limit)
+    if not captured:
+        parser.error("no requests to replay")
+    # Don't capture the replay itself
+    os.environ.pop("CAPTURE_PATH", None)
+
+    with stub_upstream.spawn(args.tokens, args.token_delay_ms / 1000, args.latency_ms / 1000) as base_url:
+        os.environ["OPENROUTER_BASE_URL"] = base_url
+        samples, wall = asyncio.run(replay(captured, args.speed, args.keep_loggers))
+        report(samples, captured, wall)
+
+
+if __name__ == "__main__":
+    main()
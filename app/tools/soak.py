@@ -0,0 +1,360 @@
+"""
+Soak test: steady load against app.server2 for hours, watching for leaks.
+
+Starts the stub upstream in a child process and runs app.server2 in-process
+with the configuration's logger writing to a temporary folder. `--clients`
+closed-loop clients send a mix of non-streaming requests, streams read to
+the end and streams abandoned after the first chunk (a client that
+disconnects). Every `--interval` seconds it samples RSS, open file
+descriptors, memory traced by tracemalloc, live asyncio tasks and threads,
+and the worst event loop lag.
+
+Samples taken after `--warmup` get a linear trend, and the run fails (exit
+status 1) when RSS, traced memory, descriptors or tasks grow faster than
+allowed and their rise over the run stands clear of the samples' scatter
+(in-flight requests alone make descriptors and tasks fluctuate), so give
+it long enough to separate the two. To point at the cause, the report lists the allocation sites
+whose memory grew most since warmup, the object types whose live count
+grew (with where the new ones were allocated) and the kinds of descriptors
+that piled up. Run from the folder holding .env:
+
+    python -m app.tools.soak --duration 14400 --clients 16
+    python -m app.tools.soak --duration 900 --warmup 120 --interval 10    # quick check
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from app.tools import stub_upstream
+
+# Logger params per --logger, rooted in the run's temporary folder
+LOGGER_PARAMS = {
+    "jsonfile": lambda folder: {"filespec": os.path.join(folder, "applog.json")},
+    "path": lambda folder: {"path": folder},
+    "sqlite": lambda folder: {"filespec": os.path.join(folder, "applog.db")},
+    "parquet": lambda folder: {"path": folder},
+}
+
+# Trended series and the option holding the growth each may show per hour
+LIMITS = {
+    "rss_mb": "max_rss_mb_per_hour",
+    "traced_mb": "max_traced_mb_per_hour",
+    "fds": "max_fds_per_hour",
+    "tasks": "max_tasks_per_hour",
+}
+
+
+def rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def fd_folder() -> str | None:
+    for folder in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(folder):
+            return folder
+    return None
+
+
+def open_fds() -> Counter:
+    """Open descriptors by kind: socket, pipe, anon_inode or the folder of a file."""
+    kinds: Counter = Counter()
+    folder = fd_folder()
+    if folder is None:
+        return kinds
+    for name in os.listdir(folder):
+        try:
+            target = os.readlink(os.path.join(folder, name))
+        except OSError:
+            continue
+        kind = target.split(":", 1)[0] if ":" in target and not target.startswith("/") else os.path.dirname(target)
+        kinds[kind] += 1
+    return kinds
+
+
+def object_counts() -> Counter:
+    return Counter(f"{type(o).__module__}.{type(o).__qualname__}" for o in gc.get_objects())
+
+
+def trend(samples: List[Dict], key: str) -> Tuple[float, float, float] | None:
+    """
+    Least squares growth of a series per hour, its rise over the samples and
+    the standard deviation of the samples around the fitted line.
+    """
+    points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    if len(points) < 5 or len({t for t, _ in points}) < 2:
+        return None
+    slope, intercept = statistics.linear_regression([t for t, _ in points], [v for _, v in points])
+    scatter = statistics.pstdev(v - (slope * t + intercept) for t, v in points)
+    return slope * 3600, slope * (points[-1][0] - points[0][0]), scatter
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes up a sleeping task."""
+
+    def __init__(self, tick: float = 0.05):
+        self.tick = tick
+        self.worst = 0.0
+        self._discard = False
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            if self._discard:
+                self._discard = False
+                continue
+            self.worst = max(self.worst, time.perf_counter() - started - self.tick)
+
+    def take(self) -> float:
+        worst, self.worst = self.worst, 0.0
+        return worst
+
+    def discard(self):
+        """Ignore the wait in progress, stretched by work of the tool's own."""
+        self._discard = True
+        self.worst = 0.0
+
+
+class Baseline:
+    """State at the end of warmup, to diff the end of the run against."""
+
+    def __init__(self):
+        gc.collect()
+        # The tool's own allocations below are filtered out of snapshot diffs
+        self.snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        self.objects = object_counts()
+        self.object_ids = {id(o) for o in gc.get_objects()}
+        self.fds = open_fds()
+
+
+def snapshot_filters() -> Tuple[tracemalloc.Filter, ...]:
+    return (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+
+def leak_report(baseline: Baseline, top: int, min_objects: int = 20) -> Dict:
+    """Allocation sites, object types and descriptor kinds that grew since the baseline."""
+    gc.collect()
+    report: Dict = {"allocation_sites": [], "object_types": [], "fds": {}}
+    # Counted before the snapshot below adds objects of its own
+    grown = [(name, growth) for name, growth in (object_counts() - baseline.objects).most_common(top)
+             if growth >= min_objects]
+
+    if baseline.snapshot is not None:
+        filters = snapshot_filters()
+        current = tracemalloc.take_snapshot().filter_traces(filters)
+        for stat in current.compare_to(baseline.snapshot.filter_traces(filters), "traceback")[:top]:
+            if stat.size_diff <= 0:
+                break
+            report["allocation_sites"].append({
+                "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff,
+                "traceback": stat.traceback.format(most_recent_first=True),
+            })
+
+    if grown:
+        wanted = {name for name, _ in grown}
+        sites: Dict[str, Counter] = {name: Counter() for name in wanted}
+        for o in gc.get_objects():
+            name = f"{type(o).__module__}.{type(o).__qualname__}"
+            if name in wanted and id(o) not in baseline.object_ids:
+                traceback = tracemalloc.get_object_traceback(o)
+                if traceback is not None:
+                    sites[name]["\n".join(traceback.format(most_recent_first=True))] += 1
+        for name, growth in grown:
+            site, count = sites[name].most_common(1)[0] if sites[name] else ("(allocation not traced)", 0)
+            report["object_types"].append({"type": name, "growth": growth, "top_site": site, "top_site_count": count})
+
+    current_fds = open_fds()
+    report["fds"] = {kind: current_fds[kind] - baseline.fds[kind] for kind in current_fds | baseline.fds
+                     if current_fds[kind] != baseline.fds[kind]}
+    return report
+
+
+async def soak(args, base_url: str) -> int:
+    import app.server2 as server
+    from app.tools import asgi_client
+
+    config = server.configurations.configurations[args.config]
+    folder = tempfile.mkdtemp(prefix="soak_logs_")
+    config.logger_type = args.logger
+    config.logger_params = LOGGER_PARAMS[args.logger](folder)
+
+    headers = {"Authorization": f"Bearer {config.api_key}", "Content-Type": "application/json"}
+    path = f"/{args.config}/chat/completions"
+    rng = random.Random(args.seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    weights = [float(w) for w in args.mix.split(",")]
+    outcomes: Counter = Counter()
+    stop = asyncio.Event()
+
+    def body(stream: bool) -> bytes:
+        words = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 40)))
+        return json.dumps({"model": "stub", "stream": stream, "messages": [{"role": "user", "content": words}]}).encode()
+
+    async def one(kind: str) -> str:
+        if kind == "complete":
+            response = await asgi_client.request(server.app, "POST", path, headers, body(False))
+            return str(response.status)
+        status = "error"
+        # aclosing so an abandoned stream cancels the request at once, as a disconnect would
+        async with contextlib.aclosing(asgi_client.stream(server.app, "POST", path, headers, body(True))) as events:
+            async for event, value in events:
+                if event == "start":
+                    status = str(value[0])
+                elif kind == "abandon":
+                    return "abandoned"
+        return status
+
+    async def client():
+        while not stop.is_set():
+            kind = rng.choices(("complete", "stream", "abandon"), weights)[0]
+            try:
+                outcomes[await one(kind)] += 1
+            except Exception as e:
+                outcomes[type(e).__name__] += 1
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+
+    lag = LagMonitor()
+    samples: List[Dict] = []
+    baseline = None
+    async with asgi_client.lifespan(server.app):
+        monitor = asyncio.create_task(lag.run())
+        clients = [asyncio.create_task(client()) for _ in range(args.clients)]
+        started = time.monotonic()
+        print(f"{'t':>7} {'ok':>7} {'other':>6} {'rss MB':>8} {'traced MB':>10} {'fds':>5} {'tasks':>6} "
+              f"{'threads':>7} {'lag ms':>7}")
+        while (elapsed := time.monotonic() - started) < args.duration:
+            await asyncio.sleep(min(args.interval, args.duration - elapsed))
+            elapsed = time.monotonic() - started
+            if baseline is None and elapsed >= args.warmup:
+                baseline = Baseline()
+                # The snapshot stalls the loop; that is not the server's lag
+                lag.discard()
+            gc.collect()
+            rss = rss_bytes()
+            if rss is not None and tracemalloc.is_tracing():
+                # tracemalloc's own bookkeeping grows with what it traces
+                rss -= tracemalloc.get_tracemalloc_memory()
+            sample = {
+                "t": round(elapsed, 1),
+                "ok": outcomes["200"] + outcomes["abandoned"],
+                "other": sum(outcomes.values()) - outcomes["200"] - outcomes["abandoned"],
+                "rss_mb": rss / 2**20 if rss is not None else None,
+                "traced_mb": tracemalloc.get_traced_memory()[0] / 2**20 if tracemalloc.is_tracing() else None,
+                "fds": sum(open_fds().values()) if fd_folder() else None,
+                "tasks": len(asyncio.all_tasks()),
+                "threads": threading.active_count(),
+                "lag_ms": lag.take() * 1000,
+                "warm": baseline is not None,
+            }
+            outcomes.clear()
+            samples.append(sample)
+            print(f"{sample['t']:>7.0f} {sample['ok']:>7} {sample['other']:>6} "
+                  f"{sample['rss_mb'] or float('nan'):>8.1f} {sample['traced_mb'] or float('nan'):>10.1f} "
+                  f"{sample['fds'] if sample['fds'] is not None else '-':>5} {sample['tasks']:>6} "
+                  f"{sample['threads']:>7} {sample['lag_ms']:>7.1f}", flush=True)
+
+        stop.set()
+        await asyncio.gather(*clients)
+        report = leak_report(baseline, args.top) if baseline is not None else None
+        monitor.cancel()
+
+    steady = [s for s in samples if s["warm"]]
+    failures = []
+    trends = {}
+    print(f"\n{'after warmup':>12} {'per hour':>10} {'limit':>7} {'rise':>8} {'scatter':>8}")
+    for key, option in LIMITS.items():
+        limit = getattr(args, option)
+        fitted = trend(steady, key)
+        if fitted is None:
+            print(f"{key:>12} {'-':>10} {limit:>7g}   too few samples")
+            continue
+        growth, rise, scatter = fitted
+        trends[key] = {"per_hour": growth, "rise": rise, "scatter": scatter}
+        # A rise within a few standard deviations of the noise is not a trend yet
+        failed = growth > limit and rise > 3 * scatter
+        if failed:
+            failures.append(key)
+        print(f"{key:>12} {growth:>+10.2f} {limit:>7g} {rise:>+8.2f} {scatter:>8.2f}   {'FAIL' if failed else 'ok'}")
+    lags = [s["lag_ms"] for s in steady]
+    if lags:
+        print(f"event loop lag: median of interval maxima {statistics.median(lags):.1f} ms, worst {max(lags):.1f} ms")
+
+    if report is not None:
+        print("\nallocation sites that grew most since warmup:")
+        for site in report["allocation_sites"]:
+            print(f"  +{site['size_diff_kb']} KiB in {site['count_diff']:+} blocks")
+            for line in site["traceback"][:args.frames * 2]:
+                print(f"      {line}")
+        print("\nobject types whose live count grew:")
+        for entry in report["object_types"]:
+            print(f"  {entry['growth']:+7} {entry['type']}")
+            first = entry["top_site"].splitlines()[:2]
+            print(f"          {entry['top_site_count']} of them allocated at: {' '.join(line.strip() for line in first)}")
+        if report["fds"]:
+            print("\ndescriptor kinds that changed:", ", ".join(f"{k} {v:+}" for k, v in report["fds"].items()))
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump({"samples": samples, "growth_per_hour": trends, "failures": failures, "leaks": report},
+                      report_file, indent=2)
+
+    print(f"\n{'FAILED: ' + ', '.join(failures) + ' kept growing' if failures else 'PASSED'}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="demo1", help="Configuration to send requests to")
+    parser.add_argument("--duration", type=float, default=3600, help="Seconds to run")
+    parser.add_argument("--warmup", type=float, default=300, help="Seconds before trends and the leak baseline start")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between samples")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent closed-loop clients")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between a client's requests")
+    parser.add_argument("--mix", default="50,40,10", help="Weights of complete, streamed and abandoned requests")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per stub response")
+    parser.add_argument("--token-delay-ms", type=float, default=2.0)
+    parser.add_argument("--logger", choices=sorted(LOGGER_PARAMS), default="jsonfile")
+    parser.add_argument("--frames", type=int, default=10, help="Traceback depth kept by tracemalloc, 0 to disable")
+    parser.add_argument("--top", type=int, default=10, help="Allocation sites and object types to report")
+    parser.add_argument("--max-rss-mb-per-hour", type=float, default=50.0,
+                        help="RSS also grows while the allocator settles; traced memory is the stricter check")
+    parser.add_argument("--max-traced-mb-per-hour", type=float, default=5.0)
+    parser.add_argument("--max-fds-per-hour", type=float, default=5.0)
+    parser.add_argument("--max-tasks-per-hour", type=float, default=5.0)
+    parser.add_argument("--report", help="Also write samples, trends and leak sites to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Started before the app is imported so its allocations can be attributed too
+    if args.frames:
+        tracemalloc.start(args.frames)
+    with stub_upstream.spawn(tokens=args.tokens, token_delay=args.token_delay_ms / 1000) as base_url:
+        os.environ["OPENROUTER_BASE_URL"] = base_url
+        sys.exit(asyncio.run(soak(args, base_url)))
+
+
+if __name__ == "__main__":
+    main()
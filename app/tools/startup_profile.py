@@ -0,0 +1,99 @@
+"""
+Cold start profile for app.server2.
+
+Prints the slowest imports (from python -X importtime) and the median
+time-to-first-request over several fresh interpreters, with and without the
+compiled configuration cache. Run from the folder holding .env:
+
+    python -m app.tools.startup_profile --runs 5 --top 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child():
+    """Runs in a fresh interpreter: import the app and serve one request."""
+    started = time.perf_counter()
+    import app.server2 as server
+    from app.tools import asgi_client
+    imported = time.perf_counter()
+
+    async def first_request():
+        async with asgi_client.lifespan(server.app):
+            response = await asgi_client.request(server.app, "GET", "/health")
+            assert response.status == 200, response
+            return time.perf_counter()
+
+    served = asyncio.run(first_request())
+    print(json.dumps({"import": imported - started, "first_request": served - started}))
+
+
+def run_child(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-m", "app.tools.startup_profile", "--child"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(env: dict, top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.server2"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+
+def time_to_first_request(env: dict, runs: int, cached: bool):
+    samples = [run_child(env) for _ in range(runs)] if cached else []
+    if not cached:
+        for _ in range(runs):
+            shutil.rmtree(env["CONFIG_CACHE_DIR"], ignore_errors=True)
+            samples.append(run_child(env))
+    label = "warm config cache" if cached else "cold config cache"
+    print(f"{label:>18}: import {statistics.median(s['import'] for s in samples) * 1000:7.1f} ms, "
+          f"first request {statistics.median(s['first_request'] for s in samples) * 1000:7.1f} ms "
+          f"(median of {runs})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=20, help="Number of imports to list")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    env = dict(os.environ)
+    env["CONFIG_CACHE_DIR"] = tempfile.mkdtemp(prefix="config_cache_")
+    try:
+        import_breakdown(env, args.top)
+        print()
+        time_to_first_request(env, args.runs, cached=False)
+        time_to_first_request(env, args.runs, cached=True)
+    finally:
+        shutil.rmtree(env["CONFIG_CACHE_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Local stand-in for the OpenRouter chat completions API, used by the load
+and benchmark tools so they never call (or pay for) the real upstream.
+
+Streams `--tokens` SSE chunks per request, `--token-delay-ms` apart, after
+`--latency-ms`, and answers non-streaming requests with one JSON body. A
+request's max_tokens cuts the answer short with finish_reason "length".
+POST /embeddings returns deterministic vectors derived from each input.
+Prompt-caching breakpoints (`cache_control` on text parts) are checked like
+a provider would, answering 400 when malformed, and a prefix sent before up
+to a breakpoint is reported in usage.prompt_tokens_details.cached_tokens.
+POST /control changes `latency_ms`, `token_delay_ms` or `capacity` while
+running, to degrade the stub on demand: past `capacity` concurrent requests
+the latency grows in proportion, and past twice `capacity` it answers 429:
+
+    python -m app.tools.stub_upstream --port 9999 --tokens 200
+    OPENROUTER_BASE_URL=http://127.0.0.1:9999 uvicorn app.server2:app
+"""
+import argparse
+import hashlib
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+
+class StubUpstream:
+    """Threaded HTTP server answering POST /chat/completions and /embeddings like an OpenAI-compatible API."""
+
+    # Length of the stub's embedding vectors
+    DIMENSIONS = 16
+    # Most prompt-caching breakpoints one request may carry, as with Anthropic models
+    MAX_CACHE_BREAKPOINTS = 4
+    CACHE_LOOKBACK = 20
+
+    def __init__(self, tokens: int = 200, token_delay: float = 0.0, latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/control":
+                    self._send_json(stub.control(body))
+                    return
+                stub.requests += 1
+                with stub.admit() as latency:
+                    if latency is None:
+                        self._send_json({"error": {"code": 429, "message": "Rate limited by stub"}}, status=429)
+                        return
+                    if latency:
+                        time.sleep(latency)
+                    self._answer(body)
+
+            def _answer(self, body):
+                if self.path.endswith("/embeddings"):
+                    stub.embedding_inputs += len(body.get("input", []))
+                    self._send_json(stub.embeddings(body))
+                    return
+                try:
+                    cached_tokens = stub.prompt_cache(body)
+                except ValueError as e:
+                    self._send_json({"error": {"code": 400, "message": str(e)}}, status=400)
+                    return
+                if body.get("stream"):
+                    self._stream(body, cached_tokens)
+                else:
+                    self._complete(body, cached_tokens)
+
+            def _complete(self, body, cached_tokens):
+                self._send_json(stub.completion(body, cached_tokens))
+
+            def _send_json(self, result, status: int = 200):
+                payload = json.dumps(result).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, cached_tokens):
+                try:
+                    self._send_stream(body, cached_tokens)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading, as a disconnecting caller does
+                    self.close_connection = True
+
+            def _send_stream(self, body, cached_tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                created = int(time.time())
+                tokens, finish_reason = stub.completion_length(body)
+                for i in range(tokens):
+                    chunk = {
+                        "id": "gen-stub", "model": body.get("model", "stub"), "created": created,
+                        "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {"role": "assistant", "content": f"tok{i} "}}],
+                    }
+                    if i == tokens - 1:
+                        chunk["choices"][0]["finish_reason"] = finish_reason
+                        chunk["usage"] = stub.usage(body, cached_tokens)
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                    if stub.token_delay:
+                        time.sleep(stub.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.latency = latency
+        self.requests = 0
+        self.embedding_inputs = 0
+        # Digests of prompt prefixes sent up to a cache breakpoint
+        self.cached_prefixes = set()
+        # Concurrent requests served at full speed, 0 for unlimited
+        self.capacity = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def message_tokens(message: dict) -> int:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return len(str(content).split())
+
+    def completion_length(self, body: dict) -> tuple[int, str]:
+        """Tokens to generate and the finish reason; max_tokens cuts the answer short."""
+        max_tokens = body.get("max_tokens")
+        if max_tokens is not None and max_tokens < self.tokens:
+            return max_tokens, "length"
+        return self.tokens, "stop"
+
+    def usage(self, body: dict, cached_tokens: int = 0) -> dict:
+        prompt_tokens = sum(self.message_tokens(msg) for msg in body.get("messages", []))
+        completion_tokens, _ = self.completion_length(body)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+    def prompt_cache(self, body: dict) -> int:
+        """
+        Check the request's cache breakpoints and remember the prefixes they end.
+        Returns the prompt tokens of the longest cached prefix; raises
+        ValueError for hints a provider would reject.
+        """
+        digest = hashlib.blake2b()
+        tokens = 0
+        cached = 0
+        breakpoints = 0
+        prefixes = []
+        marks = []
+        for message in body.get("messages", []):
+            if "cache_control" in message:
+                raise ValueError("cache_control belongs on a content part, not on the message")
+            content = message.get("content")
+            marked = False
+            for part in content if isinstance(content, list) else ():
+                if not isinstance(part, dict) or "cache_control" not in part:
+                    continue
+                control = part["cache_control"]
+                if part.get("type") != "text":
+                    raise ValueError("cache_control is only supported on text parts")
+                if not isinstance(control, dict) or control.get("type") != "ephemeral" \
+                        or control.get("ttl", "5m") not in ("5m", "1h") or set(control) - {"type", "ttl"}:
+                    raise ValueError(f"Invalid cache_control {control!r}")
+                breakpoints += 1
+                marked = True
+            if breakpoints > self.MAX_CACHE_BREAKPOINTS:
+                raise ValueError(f"At most {self.MAX_CACHE_BREAKPOINTS} cache_control breakpoints are allowed")
+            # Markers are not part of the cached text
+            if isinstance(content, list):
+                content = [{k: v for k, v in part.items() if k != "cache_control"} if isinstance(part, dict) else part
+                           for part in content]
+                if all(isinstance(part, dict) and part.get("type") == "text" for part in content):
+                    content = "".join(part.get("text", "") for part in content)
+            digest.update(json.dumps({**message, "content": content}, sort_keys=True).encode("utf-8"))
+            tokens += self.message_tokens(message)
+            prefixes.append((digest.copy().digest(), tokens))
+            if marked:
+                marks.append(len(prefixes))
+        with self._lock:
+            for mark in marks:
+                # Like providers, look back a few messages for a prefix cached by an earlier request
+                for prefix, prefix_tokens in reversed(prefixes[max(0, mark - self.CACHE_LOOKBACK):mark]):
+                    if prefix in self.cached_prefixes:
+                        cached = max(cached, prefix_tokens)
+                        break
+            self.cached_prefixes.update(prefixes[mark - 1][0] for mark in marks)
+        return cached
+
+    def completion(self, body: dict, cached_tokens: int = 0) -> dict:
+        tokens, finish_reason = self.completion_length(body)
+        return {
+            "id": "gen-stub", "model": body.get("model", "stub"), "created": int(time.time()),
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": " ".join(f"tok{i}" for i in range(tokens))}}],
+            "usage": self.usage(body, cached_tokens),
+        }
+
+    def control(self, settings: dict) -> dict:
+        if "latency_ms" in settings:
+            self.latency = settings["latency_ms"] / 1000
+        if "token_delay_ms" in settings:
+            self.token_delay = settings["token_delay_ms"] / 1000
+        if "capacity" in settings:
+            self.capacity = settings["capacity"]
+        return {"latency_ms": self.latency * 1000, "token_delay_ms": self.token_delay * 1000,
+                "capacity": self.capacity, "active": self.active, "requests": self.requests}
+
+    @contextmanager
+    def admit(self) -> Iterator[float | None]:
+        """Count the request as active and yield its latency, or None if it is rejected with 429."""
+        with self._lock:
+            self.active += 1
+            active = self.active
+        try:
+            if self.capacity and active > 2 * self.capacity:
+                yield None
+            elif self.capacity and active > self.capacity:
+                yield self.latency * active / self.capacity
+            else:
+                yield self.latency
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def embeddings(self, body: dict) -> dict:
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = []
+        for index, text in enumerate(inputs):
+            digest = hashlib.blake2b(str(text).encode("utf-8"), digest_size=self.DIMENSIONS).digest()
+            data.append({"object": "embedding", "index": index, "embedding": [b / 255 - 0.5 for b in digest]})
+        prompt_tokens = sum(len(str(text).split()) for text in inputs)
+        return {"object": "list", "data": data, "model": body.get("model", "stub"),
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}}
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> "StubUpstream":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@contextmanager
+def spawn(tokens: int = 200, token_delay: float = 0.0, latency: float = 0.0) -> Iterator[str]:
+    """Run the stub in a child process, so its CPU is not counted with the app's, and yield its base URL."""
+    port = free_port()
+    child = subprocess.Popen([
+        sys.executable, "-m", "app.tools.stub_upstream", "--port", str(port), "--tokens", str(tokens),
+        "--token-delay-ms", str(token_delay * 1000), "--latency-ms", str(latency * 1000)
+    ], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def control(base_url: str, **settings) -> dict:
+    """Change a running stub's latency_ms, token_delay_ms or capacity."""
+    request = urllib.request.Request(
+        f"{base_url}/control", data=json.dumps(settings).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--tokens", type=int, default=200, help="Chunks per streamed response")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Pause between streamed chunks")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Pause before the first byte")
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.tokens, args.token_delay_ms / 1000, args.latency_ms / 1000, args.host, args.port)
+    print(f"Stub upstream listening on {stub.base_url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,6 @@
 from typing import List, Dict, AsyncIterator
 import os
 import asyncio
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.settings import ModelSettings
 from .wrapperbase import WrapperBase
 
 
@@ -26,6 +22,12 @@ class PydanticAIWrapper(WrapperBase):
             model: Model identifier for OpenRouter (default: 'x-ai/grok-4.1-fast')
             temperature: Temperature for generation (0.0 to 1.0)
         """
+        # pydantic_ai is heavy, only import it once a wrapper is actually built
+        from pydantic_ai import Agent
+        from pydantic_ai.models.openai import OpenAIChatModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+        from pydantic_ai.settings import ModelSettings
+
         self._model = model
         self._temperature = temperature
         self._base_url = base_url
@@ -1,17 +1,25 @@
 from typing import List, Dict, AsyncIterator
+from contextlib import asynccontextmanager
 import os
 import asyncio
-import requests
 import sys
 import json
 from pathlib import Path
 import uuid
 import datetime
+import time
+from functools import partial
 
 from app.loggers.loggerfactory import LoggerFactory
-from app.models.logging_model import LoggingModel
+from app.models.logging_model import AIUsage, LoggingModel
 from app.models.ai_configuration_model import AIConfigurationModel
 from app.wrappers.wrapperbase import WrapperBase
+from app.services.token_estimator import estimate_message_tokens, trim_messages
+from app.services.similarity_cache import SimilarityCache, cacheable
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.request_context import add_timing, record_log, timing
+from app.services.adaptive_limiter import AdaptiveLimiters
+from app.services.content_filter import ContentBlocked, ContentFilter, PatternMatcher
 
 def unix_to_iso8601(timestamp):
   """Converts a Unix timestamp to an ISO 8601 formatted string."""
@@ -21,24 +29,66 @@ def unix_to_iso8601(timestamp):
   iso_string = dt_object.isoformat()
   return iso_string
 
-def build_log_entry(result: Dict, config: AIConfigurationModel, messages: List[Dict]) -> LoggingModel:
+def build_log_entry(result: Dict, config: AIConfigurationModel, messages: List[Dict], trimmed_tokens: int = 0,
+                    cache: str | None = None, session_id: uuid.UUID | None = None,
+                    content_filter: str | None = None) -> LoggingModel:
     log_entry = LoggingModel(
         request_id= uuid.uuid4(),
         provider=result.get("provider", "unknown"),
         model=config.model,
         endpoint=config.endpoint,
-        session_id= uuid.uuid4(), # TODO: fix this needs to be a lookup based on first prompt?
+        session_id=session_id or uuid.uuid4(), # TODO: only WebSocket conversations pass a real session so far
         user_id="TBD", # TODO: fix this needs to be passed in from caller
         timestamp=unix_to_iso8601(result.get("created", datetime.datetime.now().timestamp())),
         role=result['choices'][0]['message'].get('role', 'assistant'),
-        message=result['choices'][0]['message'].get('content', '')
-        # usage =result.get("usage", {}),
+        message=result['choices'][0]['message'].get('content', ''),
+        usage=result.get("usage"),
+        trimmed_tokens=trimmed_tokens,
+        cache=cache,
+        content_filter=content_filter
         # ai_configuration= config,
         # input_messages=messages
     )
     return log_entry
 
 
+def build_embedding_log_entry(config: AIConfigurationModel, count: int, prompt_tokens: int,
+                              cache: str | None = None) -> LoggingModel:
+    return LoggingModel(
+        provider="unknown",
+        model=config.embeddings.model,
+        endpoint=config.endpoint,
+        user_id="TBD",
+        timestamp=unix_to_iso8601(datetime.datetime.now().timestamp()),
+        role="assistant",
+        message=f"{count} embeddings",
+        usage=AIUsage(prompt_tokens=prompt_tokens, completion_tokens=0, total_tokens=prompt_tokens),
+        cache=cache
+    )
+
+
+async def iter_response_lines(response, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+    """
+    Yield the lines of a streamed requests response without blocking the event loop.
+
+    Each network read runs in the default executor and returns whatever has
+    already arrived, so a burst of events costs one thread hop, not one per line.
+    """
+    loop = asyncio.get_running_loop()
+    read = partial(response.raw.read1, chunk_size, decode_content=True)
+    pending = b""
+    while True:
+        data = await loop.run_in_executor(None, read)
+        if not data:
+            break
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
 class RequestsWrapper(WrapperBase):
     """
     Requests-based implementation of WrapperBase.
@@ -47,18 +97,21 @@ class RequestsWrapper(WrapperBase):
 
     def __init__(self,
                  config: AIConfigurationModel,
-                 base_url: str = 'https://openrouter.ai/api/v1'):
+                 base_url: str = 'https://openrouter.ai/api/v1',
+                 limiters: AdaptiveLimiters | None = None):
         """
         Initialize the Requests wrapper with OpenRouter.
 
         Args:
             base_url: Base URL for the API endpoint
+            limiters: Adaptive per-model concurrency limits for upstream calls, unlimited if omitted
             model: Model identifier for OpenRouter (default: 'x-ai/grok-4.1-fast')
             temperature: Temperature for generation (0.0 to 1.0)
             system_prompt: Default system prompt
         """
         self._base_url = base_url
         self._config = config
+        self._limiters = limiters
         self._logger = LoggerFactory.create(
             config.logger_type,
             config.logger_params
@@ -69,27 +122,75 @@ class RequestsWrapper(WrapperBase):
         if not self._api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
 
+        # Near-duplicate cache, only for configurations with a low enough temperature
+        self._similarity_cache = None
+        cache_config = config.similarity_cache
+        if cache_config is not None and config.temperature <= cache_config.max_temperature:
+            self._similarity_cache = SimilarityCache(
+                threshold=cache_config.threshold,
+                max_entries=cache_config.max_entries,
+                num_perm=cache_config.num_perm,
+                bands=cache_config.bands,
+                shingle_size=cache_config.shingle_size,
+                ttl=cache_config.ttl_seconds
+            )
+
+        # Blocklist, compiled once into an automaton however many patterns it has
+        self._content_filter = None
+        filter_config = config.content_filter
+        if filter_config is not None:
+            self._content_filter = ContentFilter(
+                PatternMatcher.load(filter_config.patterns, filter_config.patterns_file),
+                replacement=filter_config.replacement,
+                whole_words=filter_config.whole_words,
+                name=config.endpoint
+            )
 
-    async def generate_text(self, messages: List[Dict]):
+        # Micro-batcher for /embeddings, only for configurations with an embedding model
+        self._embedding_batcher = None
+        if config.embeddings is not None:
+            self._embedding_batcher = EmbeddingBatcher(
+                self._embed_batch,
+                max_batch_size=config.embeddings.max_batch_size,
+                max_wait=config.embeddings.max_wait_ms / 1000,
+                cache_entries=config.embeddings.cache_entries,
+                name=config.endpoint
+            )
+
+
+    async def generate_text(self, messages: List[Dict], parameters: Dict | None = None):
         """
         Generate text using requests library.
 
         Args:
             messages: List of message dictionaries with 'role' and 'content' keys
-            model: Optional model override
+            parameters: Sampling parameters the client asked for, subject to the configuration's policy
 
         Returns:
             Generated text response
         """
         # Replace system prompt if provided
         messages = self._replace_system_prompt(messages)
+        messages = self._filter_input(messages)
+        messages, trimmed_tokens = self._trim_context(messages)
+        parameters = self._config.parameters.apply(parameters or {}, self._config)
+
+        similarity_key = self._similarity_key(messages, parameters)
+        if similarity_key is not None:
+            cached = self._similarity_cache.lookup(*similarity_key)
+            if cached is not None:
+                result = {**cached, "created": int(time.time())}
+                # No tokens were spent upstream; logging the original usage would count them again
+                log_data = build_log_entry({**result, "usage": None}, self._config, messages, trimmed_tokens,
+                                           cache="similarity")
+                await self._log(log_data)
+                return result
 
         # Prepare request payload
         payload = {
             "model": self._config.model,
-            "messages": messages,
-            "temperature": self._config.temperature,
-            "top_p": self._config.top_p,
+            "messages": self._mark_cache_prefixes(messages),
+            **parameters,
             "stream": False 
         }
         # add optional keys 
@@ -99,50 +200,70 @@ class RequestsWrapper(WrapperBase):
             "Content-Type": "application/json"
         }
 
-        # Run synchronous requests call in executor to avoid blocking
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.post(
-                f"{self._base_url}/chat/completions",
-                json=payload,
-                headers=headers,
-                stream=False
-            )
-        )
+        async with self._upstream_slot(self._config.model):
+            response = await self._post(payload, headers, stream=False)
+            response.raise_for_status()
+            result = response.json()
 
-        response.raise_for_status()
-        result = response.json()
+        # Filtered before it is cached or logged
+        filter_outcome = self._filter_output(result)
+
+        if similarity_key is not None:
+            self._similarity_cache.store(*similarity_key, result)
 
         # Log the complete response
-        log_data = build_log_entry(result, self._config, messages)        
-        await self._logger.log(log_data)
+        log_data = build_log_entry(result, self._config, messages, trimmed_tokens, content_filter=filter_outcome)
+        await self._log(log_data)
 
         return result
 
 
-    async def generate_stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+    async def generate_stream(self, messages: List[Dict], session_id: uuid.UUID | None = None,
+                              parameters: Dict | None = None) -> AsyncIterator[str]:
         """
         Generate streaming text using requests library.
         Returns raw SSE format data for client processing.
 
         Args:
             messages: List of message dictionaries with 'role' and 'content' keys
+            session_id: Conversation the request belongs to, a new one if omitted
+            parameters: Sampling parameters the client asked for, subject to the configuration's policy
 
         Yields:
             Raw SSE formatted lines (data: {...})
         """
-        # Use provided parameters or fall back to instance defaults
+        async for line_str, _ in self.stream_chunks(messages, session_id=session_id, parameters=parameters):
+            yield line_str + '\n\n'
+
+
+    async def stream_chunks(self, messages: List[Dict], session_id: uuid.UUID | None = None,
+                            system_prompt_applied: bool = False,
+                            parameters: Dict | None = None) -> AsyncIterator[tuple[str, Dict | None]]:
+        """
+        Stream the upstream completion as parsed chunks and log it once complete.
 
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            session_id: Conversation the request belongs to, a new one if omitted
+            system_prompt_applied: The messages already start with this configuration's
+                system prompt (server-side conversations), so they are used without copying
+            parameters: Sampling parameters the client asked for, subject to the configuration's policy
+
+        Yields:
+            (raw SSE line, parsed chunk) pairs; the chunk is None for the final [DONE] line
+        """
         # Replace system prompt if provided
-        messages = self._replace_system_prompt(messages)
+        if not system_prompt_applied:
+            messages = self._replace_system_prompt(messages)
+        messages = self._filter_input(messages)
+        messages, trimmed_tokens = self._trim_context(messages)
+        parameters = self._config.parameters.apply(parameters or {}, self._config)
 
         # Prepare request payload
         payload = {
             "model": self._config.model,
-            "messages": messages,
-            "temperature": self._config.temperature,
-            "top_p": self._config.top_p,
+            "messages": self._mark_cache_prefixes(messages),
+            **parameters,
             "stream": True
         }
 
@@ -151,72 +272,225 @@ class RequestsWrapper(WrapperBase):
             "Content-Type": "application/json"
         }
 
-        # Run streaming request in executor
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.post(
-                f"{self._base_url}/chat/completions",
-                json=payload,
-                headers=headers,
-                stream=True
-            )
+        # The slot is held until the stream ends, as the upstream keeps generating until then
+        async with self._upstream_slot(self._config.model):
+            response = await self._post(payload, headers, stream=True)
+            try:
+                response.raise_for_status()
+
+                # Collect complete response for logging
+                complete_response = []
+                complete_data = None
+                stream_filter = self._content_filter.stream(self._config.content_filter.output_action == "terminate") \
+                    if self._content_filter is not None else None
+
+                async def log_complete():
+                    # Reconstruct complete response with all metadata
+                    if complete_data:
+                        complete_data['choices'][0]['message'] = {
+                            'role': 'assistant',
+                            'content': ''.join(complete_response)
+                        }
+                        # Remove delta from choices since we have the full message
+                        if 'delta' in complete_data['choices'][0]:
+                            del complete_data['choices'][0]['delta']
+
+                        # Log the data 
+                        log_data = build_log_entry(complete_data, self._config, messages, trimmed_tokens,
+                                                   session_id=session_id,
+                                                   content_filter=stream_filter.outcome if stream_filter else None)
+                        await self._log(log_data)
+
+                # Stream the raw response lines
+                async for line in iter_response_lines(response):
+                    if line:
+                        line_str = line.decode('utf-8')
+                        if line_str.startswith('data: '):
+                            data_str = line_str[6:]  # Remove 'data: ' prefix
+
+                            # Handle [DONE] message
+                            if data_str.strip() == '[DONE]':
+                                held = stream_filter.flush() if stream_filter is not None else ''
+                                if held and complete_data:
+                                    # The upstream sent no finish_reason to attach the held back text to
+                                    data = {**complete_data, 'choices': [{'index': 0, 'delta': {'content': held}}]}
+                                    data.pop('usage', None)
+                                    complete_response.append(held)
+                                    yield 'data: ' + json.dumps(data), data
+
+                                await log_complete()
+
+                                # Yield the [DONE] message to client
+                                yield line_str, None
+                                break
+
+                            try:
+                                data = json.loads(data_str)
+
+                                # Store the last complete data object for metadata
+                                if complete_data is None:
+                                    complete_data = data
+
+                                # Usage arrives on the final chunk when the upstream reports it
+                                if data.get('usage'):
+                                    complete_data['usage'] = data['usage']
+
+                                if 'choices' in data and len(data['choices']) > 0:
+                                    choice = data['choices'][0]
+                                    delta = choice.get('delta', {})
+
+                                    # Release only text that can no longer be part of a blocked phrase
+                                    if stream_filter is not None:
+                                        content = stream_filter.feed(delta.get('content') or '')
+                                        if choice.get('finish_reason') or stream_filter.terminated:
+                                            content += stream_filter.flush()
+                                        if stream_filter.terminated:
+                                            choice['finish_reason'] = 'content_filter'
+                                        if content != (delta.get('content') or ''):
+                                            delta['content'] = content
+                                            choice['delta'] = delta
+                                            line_str = 'data: ' + json.dumps(data)
+
+                                    # Collect content for logging
+                                    if delta.get('content'):
+                                        content_chunk = delta['content']
+                                        complete_response.append(content_chunk)
+
+                                # Yield the raw SSE line to client
+                                yield line_str, data
+
+                                if stream_filter is not None and stream_filter.terminated:
+                                    await log_complete()
+                                    yield 'data: [DONE]', None
+                                    break
+                            except json.JSONDecodeError:
+                                # Skip invalid JSON lines
+                                continue
+            finally:
+                # Return the upstream connection even when the client went away mid-stream
+                response.close()
+
+
+    async def generate_embeddings(self, texts: List[str]) -> Dict:
+        """
+        Embed texts with the configuration's embedding model.
+
+        Inputs are batched with those of concurrent requests and repeated
+        inputs are served from the cache; the request is logged with its share
+        of the batches' prompt tokens.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            OpenAI-compatible embeddings response
+        """
+        if self._embedding_batcher is None:
+            raise ValueError(f"Configuration {self._config.endpoint} has no embedding model")
+
+        with timing("embeddings"):
+            vectors, prompt_tokens, cached = await self._embedding_batcher.embed(texts)
+
+        log_data = build_embedding_log_entry(
+            self._config, len(texts), prompt_tokens, cache="embedding" if cached == len(texts) else None
         )
+        await self._log(log_data)
 
-        response.raise_for_status()
-
-        # Collect complete response for logging
-        complete_response = []
-        complete_data = None
-
-        # Stream the raw response lines
-        for line in response.iter_lines():
-            if line:
-                line_str = line.decode('utf-8')
-                if line_str.startswith('data: '):
-                    data_str = line_str[6:]  # Remove 'data: ' prefix
-
-                    # Handle [DONE] message
-                    if data_str.strip() == '[DONE]':
-                        # TODO this is where logging would go
-                        # Reconstruct complete response with all metadata
-                        if complete_data:
-                            complete_data['choices'][0]['message'] = {
-                                'role': 'assistant',
-                                'content': ''.join(complete_response)
-                            }
-                            # Remove delta from choices since we have the full message
-                            if 'delta' in complete_data['choices'][0]:
-                                del complete_data['choices'][0]['delta']
-
-                            # Log the data 
-                            log_data = build_log_entry(complete_data, self._config, messages)
-                            await self._logger.log(log_data)
-                            
-                        # Yield the [DONE] message to client
-                        yield line_str + '\n\n'
-                        break
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+            "model": self._config.embeddings.model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        }
 
-                    try:
-                        import json
-                        data = json.loads(data_str)
 
-                        # Store the last complete data object for metadata
-                        if complete_data is None:
-                            complete_data = data
+    async def _embed_batch(self, texts: List[str]) -> tuple[List[List[float]], int]:
+        """One upstream embeddings call for a batch collected by the EmbeddingBatcher."""
+        payload = {
+            "model": self._config.embeddings.model,
+            "input": texts
+        }
 
-                        # Collect content for logging
-                        if 'choices' in data and len(data['choices']) > 0:
-                            delta = data['choices'][0].get('delta', {})
-                            if 'content' in delta:
-                                content_chunk = delta['content']
-                                complete_response.append(content_chunk)
+        headers = {
+            "Authorization": f"Bearer {self._api_key}",
+            "Content-Type": "application/json"
+        }
 
-                        # Yield the raw SSE line to client
-                        yield line_str + '\n\n'
-                    except json.JSONDecodeError:
-                        # Skip invalid JSON lines
-                        continue
+        async with self._upstream_slot(self._config.embeddings.model):
+            response = await self._post(payload, headers, stream=False, path="/embeddings")
+            response.raise_for_status()
+            result = response.json()
+        data = sorted(result["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data], (result.get("usage") or {}).get("prompt_tokens", 0)
+
+
+    @asynccontextmanager
+    async def _upstream_slot(self, model: str):
+        """
+        Hold one of the model's adaptive concurrency slots, recording the wait
+        as "limit". Raises UpstreamBusy if none frees up before the queue deadline.
+        """
+        if self._limiters is None:
+            yield
+            return
+        limiter = self._limiters.get(model)
+        with timing("limit"):
+            await limiter.acquire()
+        try:
+            yield
+        finally:
+            limiter.release()
+
+
+    async def _post(self, payload: Dict, headers: Dict, stream: bool, path: str = "/chat/completions"):
+        """
+        POST to an upstream endpoint in the default executor, recording
+        how long the call waited for a thread ("queue") and how long the upstream
+        took to answer ("upstream", up to the response headers when streaming).
+        The answer time and whether the upstream was overloaded (429, 5xx or no
+        response) feed the model's adaptive concurrency limit.
+        """
+        # Deferred so importing the wrapper stays cheap at boot
+        import requests
+
+        submitted = time.perf_counter()
+        started = None
+
+        def post():
+            nonlocal started
+            started = time.perf_counter()
+            return requests.post(
+                f"{self._base_url}{path}",
+                json=payload,
+                headers=headers,
+                stream=stream
+            )
+
+        loop = asyncio.get_running_loop()
+        response = None
+        cancelled = False
+        try:
+            response = await loop.run_in_executor(None, post)
+            return response
+        except asyncio.CancelledError:
+            # The client went away; says nothing about the upstream
+            cancelled = True
+            raise
+        finally:
+            latency = None
+            if started is not None:
+                latency = time.perf_counter() - started
+                add_timing("queue", started - submitted)
+                add_timing("upstream", latency)
+            if self._limiters is not None and not cancelled:
+                failed = response is None or response.status_code == 429 or response.status_code >= 500
+                self._limiters.get(payload["model"]).observe(latency, failed)
+
+
+    async def _log(self, log_data: LoggingModel):
+        with timing("logging"):
+            await self._logger.log(log_data)
+        record_log(log_data)
 
 
     @property
@@ -225,6 +499,108 @@ class RequestsWrapper(WrapperBase):
         return self._config
 
 
+    async def close(self):
+        """Send pending embedding batches, then flush and close the configuration's logger."""
+        if self._embedding_batcher is not None:
+            await self._embedding_batcher.close()
+        await self._logger.close()
+
+
+    @property
+    def similarity_cache(self) -> SimilarityCache | None:
+        """Get the near-duplicate cache, if enabled for this configuration."""
+        return self._similarity_cache
+
+
+    @property
+    def embedding_batcher(self) -> EmbeddingBatcher | None:
+        """Get the embeddings micro-batcher, if this configuration has an embedding model."""
+        return self._embedding_batcher
+
+
+    def _similarity_key(self, messages: List[Dict], parameters: Dict) -> tuple[int, str] | None:
+        """
+        Key for the similarity cache: the exact preceding conversation and
+        sampling parameters plus the last user message, which is matched approximately.
+
+        Returns:
+            (context hash, last user message) or None when the cache does not apply
+        """
+        if self._similarity_cache is None or not messages or messages[-1].get('role') != 'user':
+            return None
+        text = messages[-1].get('content', '')
+        # A one-character difference in code changes the answer, however similar the prompts look
+        if not isinstance(text, str) or not cacheable(text):
+            return None
+        # A client may be allowed a higher temperature than the configuration's
+        if parameters.get("temperature", 0) > self._config.similarity_cache.max_temperature:
+            return None
+        context = hash((
+            tuple((msg.get('role'), msg.get('content')) for msg in messages[:-1]),
+            json.dumps(parameters, sort_keys=True)
+        ))
+        return context, text
+
+
+    def _filter_input(self, messages: List[Dict]) -> List[Dict]:
+        """
+        Apply the content filter's input_action to the request messages (the
+        system prompt is the configuration's own and is not checked).
+
+        Raises:
+            ContentBlocked: A message matched and input_action is block
+        """
+        if self._content_filter is None or self._config.content_filter.input_action == "allow":
+            return messages
+        block = self._config.content_filter.input_action == "block"
+        filtered = None
+        for i, msg in enumerate(messages):
+            content = msg.get('content')
+            if msg.get('role') == 'system' or not isinstance(content, str):
+                continue
+            redacted, outcome = self._content_filter.apply(content, source="input")
+            if outcome is None:
+                continue
+            if block:
+                raise ContentBlocked("A message contains blocked content")
+            if filtered is None:
+                filtered = messages.copy()
+            filtered[i] = {**msg, 'content': redacted}
+        return filtered if filtered is not None else messages
+
+
+    def _filter_output(self, result: Dict) -> str | None:
+        """Apply the content filter's output_action to a complete response in place."""
+        if self._content_filter is None:
+            return None
+        outcome = None
+        for choice in result.get('choices', []):
+            message = choice.get('message') or {}
+            if not isinstance(message.get('content'), str):
+                continue
+            terminate = self._config.content_filter.output_action == "terminate"
+            message['content'], choice_outcome = self._content_filter.apply(message['content'], terminate)
+            if choice_outcome == "terminated":
+                choice['finish_reason'] = 'content_filter'
+            outcome = outcome or choice_outcome
+        return outcome
+
+
+    def _trim_context(self, messages: List[Dict]) -> tuple[List[Dict], int]:
+        """
+        Apply the configuration's max_context_tokens budget, if any.
+
+        Args:
+            messages: List of message dictionaries with the system prompt applied
+
+        Returns:
+            Messages to send upstream and the estimated number of tokens dropped
+        """
+        if self._config.max_context_tokens is None:
+            return messages, 0
+        return trim_messages(messages, self._config.max_context_tokens)
+
+
     def _replace_system_prompt(self, messages: List[Dict]) -> List[Dict]:
         """
         Replace or insert the system prompt in the messages list.
@@ -247,3 +623,57 @@ class RequestsWrapper(WrapperBase):
         messages.insert(0, {"role": "system", "content": self._config.system_prompt})
         return messages
 
+
+    def _mark_cache_prefixes(self, messages: List[Dict]) -> List[Dict]:
+        """
+        Mark stable prompt prefixes with prompt-caching breakpoints, per the
+        configuration's prompt_caching settings.
+
+        The system prompt is marked so every request of the configuration reuses
+        it, and with history the final message is marked too, so the next turn
+        of the conversation reuses everything before it. A prefix shorter than
+        min_tokens is not marked, as providers do not cache it. Providers that
+        cache prefixes automatically ignore the markers.
+
+        Args:
+            messages: Messages to send upstream, left unchanged
+
+        Returns:
+            The messages, with marked ones copied and their content turned into text parts
+        """
+        caching = self._config.prompt_caching
+        if caching is None or not messages:
+            return messages
+        marked = set()
+        prefix_tokens = 0
+        for i, msg in enumerate(messages):
+            prefix_tokens += estimate_message_tokens(msg)
+            if prefix_tokens < caching.min_tokens:
+                continue
+            # The system prompt is only stable while nothing else precedes it
+            if caching.system_prompt and msg.get('role') == 'system' and i == 0:
+                marked.add(i)
+            if caching.history and i == len(messages) - 1:
+                marked.add(i)
+        if not marked:
+            return messages
+
+        cache_control = {"type": "ephemeral"}
+        if caching.ttl is not None:
+            cache_control["ttl"] = caching.ttl
+        messages = messages.copy()
+        for i in marked:
+            msg = messages[i]
+            content = msg.get('content')
+            if isinstance(content, str):
+                parts = [{"type": "text", "text": content, "cache_control": cache_control}]
+            elif isinstance(content, list):
+                parts = list(content)
+                for j in range(len(parts) - 1, -1, -1):
+                    if isinstance(parts[j], dict) and parts[j].get('type') == 'text':
+                        parts[j] = {**parts[j], "cache_control": cache_control}
+                        break
+            else:
+                continue
+            messages[i] = {**msg, 'content': parts}
+        return messages
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from app.services.adaptive_limiter import AdaptiveLimiter, UpstreamBusy
+from app.tools.stub_upstream import StubUpstream
+
+CLIENTS = 8
+BODY = {"model": "stub", "messages": [{"role": "user", "content": "Explain generators"}], "stream": False}
+
+
+@pytest.fixture
+def stub():
+    with StubUpstream(tokens=5, latency=0.02) as upstream:
+        yield upstream
+
+
+async def call(limiter: AdaptiveLimiter, url: str):
+    """One upstream request the way RequestsWrapper makes it: hold a slot and report the outcome."""
+    await limiter.acquire()
+    try:
+        started = time.perf_counter()
+        response = await asyncio.to_thread(requests.post, f"{url}/chat/completions", json=BODY)
+        failed = response.status_code == 429 or response.status_code >= 500
+        limiter.observe(time.perf_counter() - started, failed)
+    finally:
+        limiter.release()
+
+
+async def load(limiter: AdaptiveLimiter, url: str, seconds: float):
+    """Keep CLIENTS closed-loop clients busy for the given time."""
+    deadline = time.monotonic() + seconds
+
+    async def client():
+        while time.monotonic() < deadline:
+            try:
+                await call(limiter, url)
+            except UpstreamBusy:
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(client() for _ in range(CLIENTS)))
+
+
+def test_limit_shrinks_while_degraded_and_recovers(stub):
+    async def scenario():
+        limiter = AdaptiveLimiter("stub-recovery", initial_limit=CLIENTS, max_limit=2 * CLIENTS, queue_timeout=5.0)
+
+        await load(limiter, stub.base_url, 1.0)
+        healthy = limiter.limit
+
+        # Full speed for 2 requests, slower past that and 429 past 4
+        stub.control({"capacity": 2})
+        await load(limiter, stub.base_url, 1.5)
+        degraded = limiter.limit
+
+        stub.control({"capacity": 0})
+        await load(limiter, stub.base_url, 1.5)
+        recovered = limiter.limit
+        return healthy, degraded, recovered
+
+    healthy, degraded, recovered = asyncio.run(scenario())
+    assert healthy >= CLIENTS
+    # AIMD settles around the 429 threshold (twice the capacity) rather than below it
+    assert degraded < 0.75 * healthy
+    assert recovered >= CLIENTS
+
+
+def test_queued_request_past_deadline_is_rejected(stub):
+    async def scenario():
+        limiter = AdaptiveLimiter("stub-deadline", initial_limit=1, max_limit=1, queue_timeout=0.1)
+        stub.control({"latency_ms": 500})
+        holder = asyncio.create_task(call(limiter, stub.base_url))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(UpstreamBusy):
+            await call(limiter, stub.base_url)
+        waited = time.monotonic() - started
+        await holder
+        return waited, limiter.in_flight
+
+    waited, in_flight = asyncio.run(scenario())
+    assert 0.1 <= waited < 0.4
+    assert in_flight == 0
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from app.services.content_filter import ContentFilter, PatternMatcher
+
+PATTERNS = ["ab", "abc", "bca", "cab"]
+
+
+def chunked(text: str, rng: random.Random):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 4)
+        yield text[position:position + size]
+        position += size
+
+
+def streamed(content_filter: ContentFilter, text: str, rng: random.Random, terminate: bool = False) -> str:
+    stream = content_filter.stream(terminate)
+    return "".join(stream.feed(chunk) for chunk in chunked(text, rng)) + stream.flush()
+
+
+@pytest.mark.parametrize("whole_words", [False, True])
+@pytest.mark.parametrize("terminate", [False, True])
+def test_stream_matches_whole_text(whole_words, terminate):
+    content_filter = ContentFilter(PatternMatcher(PATTERNS), replacement="#", whole_words=whole_words)
+    rng = random.Random(42)
+    for _ in range(20000):
+        text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 12)))
+        expected, _ = content_filter.apply(text, terminate=terminate)
+        assert streamed(content_filter, text, rng, terminate) == expected, text
+
+
+@pytest.mark.parametrize("text, expected", [("bcaab", "##"), ("abab", "##"), ("abca", "#")])
+def test_touching_matches_are_replaced_separately(text, expected):
+    content_filter = ContentFilter(PatternMatcher(PATTERNS), replacement="#", whole_words=False)
+    assert content_filter.apply(text)[0] == expected
+    assert streamed(content_filter, text, random.Random(0)) == expected
@@ -0,0 +1,76 @@
+import pytest
+
+from app.models.ai_configuration_model import AIConfigurationModel, PromptCachingModel
+from app.models.logging_model import AIUsage
+from app.tools.stub_upstream import StubUpstream
+from app.wrappers.requests_wrapper import RequestsWrapper
+
+SYSTEM_PROMPT = "You are a patient Python tutor. " * 40
+
+
+@pytest.fixture
+def stub():
+    with StubUpstream() as upstream:
+        yield upstream
+
+
+def wrapper(monkeypatch, tmp_path, **caching) -> RequestsWrapper:
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    config = AIConfigurationModel(
+        api_key="test", model="stub", description="Prompt caching test", system_prompt=SYSTEM_PROMPT,
+        logger_type="path", logger_params={"path": str(tmp_path)},
+        prompt_caching=PromptCachingModel(**caching),
+    )
+    return RequestsWrapper(config)
+
+
+def conversation(*turns: str):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for i, turn in enumerate(turns):
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": turn})
+    return messages
+
+
+def marked_indexes(messages):
+    return [i for i, msg in enumerate(messages)
+            if isinstance(msg["content"], list) and any("cache_control" in part for part in msg["content"])]
+
+
+def test_system_prompt_is_marked_and_reused(monkeypatch, tmp_path, stub):
+    provider = wrapper(monkeypatch, tmp_path, min_tokens=10)
+    first = provider._mark_cache_prefixes(conversation("What is a generator?"))
+    assert marked_indexes(first) == [0]
+    assert stub.prompt_cache({"messages": first}) == 0
+
+    second = provider._mark_cache_prefixes(conversation("What is a decorator?"))
+    assert stub.prompt_cache({"messages": second}) == stub.message_tokens(second[0])
+
+
+def test_history_marks_the_end_of_the_conversation(monkeypatch, tmp_path, stub):
+    provider = wrapper(monkeypatch, tmp_path, min_tokens=10, history=True, ttl="1h")
+    first = provider._mark_cache_prefixes(conversation("What is a generator?"))
+    assert marked_indexes(first) == [0, 1]
+    assert first[1]["content"][-1]["cache_control"] == {"type": "ephemeral", "ttl": "1h"}
+    stub.prompt_cache({"messages": first})
+
+    second = provider._mark_cache_prefixes(conversation("What is a generator?", "A lazy iterator.", "Show one"))
+    assert marked_indexes(second) == [0, 3]
+    cached = stub.prompt_cache({"messages": second})
+    assert cached == sum(stub.message_tokens(msg) for msg in first)
+
+
+def test_prefix_below_min_tokens_is_not_marked(monkeypatch, tmp_path, stub):
+    provider = wrapper(monkeypatch, tmp_path, min_tokens=100_000, history=True)
+    messages = conversation("What is a generator?")
+    assert provider._mark_cache_prefixes(messages) is messages
+    assert stub.prompt_cache({"messages": messages}) == 0
+
+
+def test_cached_tokens_are_parsed_into_usage(monkeypatch, tmp_path, stub):
+    provider = wrapper(monkeypatch, tmp_path, min_tokens=10)
+    body = {"messages": provider._mark_cache_prefixes(conversation("What is a generator?"))}
+    stub.prompt_cache(body)
+    cached = stub.prompt_cache(body)
+    assert cached > 0
+    usage = AIUsage.model_validate(stub.completion(body, cached)["usage"])
+    assert usage.cached_tokens == cached
@@ -0,0 +1,37 @@
+import pytest
+
+from app.services.similarity_cache import SimilarityCache, cacheable, normalize
+
+CODE_PAIRS = [
+    ("what does my_list[1:] return", "what does my_list[:1] return"),
+    ("what is 2**10", "what is 2*10"),
+    ("why is None == False", "why is None != False"),
+]
+
+
+@pytest.mark.parametrize("first, second", CODE_PAIRS)
+def test_code_characters_are_kept(first, second):
+    assert normalize(first) != normalize(second)
+
+
+@pytest.mark.parametrize("prompt", [prompt for pair in CODE_PAIRS for prompt in pair] + [
+    "what does `zip` do", "what is x - 1", "how do I use a dict {}",
+])
+def test_prompts_with_code_are_not_cacheable(prompt):
+    assert not cacheable(prompt)
+
+
+def test_prose_is_cacheable():
+    assert cacheable("What is a list comprehension?")
+    assert cacheable("What's the difference between a tuple and a list?")
+
+
+def test_case_whitespace_and_trailing_punctuation_are_folded():
+    assert normalize("  What is a   list\ncomprehension?! ") == "what is a list comprehension"
+
+
+def test_near_duplicate_hits():
+    cache = SimilarityCache()
+    cache.store(0, "What is a list comprehension?", "answer")
+    assert cache.lookup(0, "what is a  list comprehension") == "answer"
+    assert cache.lookup(1, "what is a list comprehension") is None